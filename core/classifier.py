@@ -1,8 +1,13 @@
 # core/classifier.py
+import os
+import stat
+import time
 import logging
 from pathlib import Path
 from PyQt5.QtCore import QObject, pyqtSignal
 
+from .rule_engine import CompiledRules, DecisionCache, FileContext, RuleProfile
+
 
 class FileClassifier(QObject):
     file_classified = pyqtSignal(str, str)
@@ -14,61 +19,148 @@ class FileClassifier(QObject):
         self.categories = self.config.get('categories', {})
         self.exceptions = self.config.get('exceptions', [])
         self.advanced_rules = self.config.get('advanced_rules', [])
+        self._build_category_index()
+        # Правила компилируются при первой проверке и после reload_rules()
+        self._compiled_rules = None
+        self.rules_generation = 0
+        # Повторные проходы по неизмененному рабочему столу берут решения отсюда
+        self.decision_cache = DecisionCache()
+
+    def reload_rules(self) -> None:
+        """
+        Перечитывает правила, категории и исключения из конфигурации и сбрасывает
+        скомпилированные правила и кэш решений; вызывается после любого их изменения.
+        """
+        self.categories = self.config.get('categories', {})
+        self.exceptions = self.config.get('exceptions', [])
+        self.advanced_rules = self.config.get('advanced_rules', [])
+        self._build_category_index()
+        self._compiled_rules = None
+        self.rules_generation += 1
+        self.decision_cache.clear()
+
+    def _build_category_index(self) -> None:
+        """
+        Обратный индекс расширение -> категория. Расширения могут быть составными ('.tar.gz');
+        если расширение указано в нескольких категориях, выигрывает первая, как и при переборе списков.
+        """
+        index = {}
+        for category, extensions in self.categories.items():
+            for ext in extensions:
+                index.setdefault(ext.lower(), category)
+        self.category_index = index
+        self._exception_names = frozenset(self.exceptions)
+
+    def compiled_rules(self) -> CompiledRules:
+        # Ссылка берется один раз: reload_rules из потока интерфейса может сбросить ее посреди вызова
+        compiled = self._compiled_rules
+        if compiled is None:
+            # Компилируется копия списка, а не сам список из конфигурации, который правит интерфейс
+            rules = list(self.advanced_rules)
+            compiled = self._compiled_rules = CompiledRules(rules)
+            self.logger.info(f"Правила скомпилированы: активных {compiled.count} из {len(rules)}.")
+        return compiled
+
+    def match_rule(self, ctx: FileContext):
+        """Первое сработавшее правило (CompiledRule) для файла или None; решение кэшируется."""
+        compiled = self.compiled_rules()
+        key = DecisionCache.key(ctx, self.rules_generation, compiled.time_dependent)
+        if key is not None:
+            rule = self.decision_cache.get(key)
+            if rule is not DecisionCache.MISSING:
+                return rule
+        rule = compiled.match(ctx)
+        if key is not None:
+            self.decision_cache.put(key, rule)
+        return rule
+
+    def classify_many(self, records) -> list:
+        """
+        Пакетная проверка продвинутых правил. records — os.DirEntry (stat берется из записи каталога),
+        пути или пары (путь, os.stat_result). Возвращает для каждой записи сработавшее правило
+        (CompiledRule с его именем и действием) или None. Индексы в advanced_rules не возвращаются:
+        список может измениться из интерфейса, пока фоновый проход еще работает.
+        """
+        compiled = self.compiled_rules()
+        contexts = [self._record_context(record) for record in records]
+        results = [None] * len(contexts)
+        pending = []
+        for i, ctx in enumerate(contexts):
+            key = DecisionCache.key(ctx, self.rules_generation, compiled.time_dependent)
+            rule = self.decision_cache.get(key) if key is not None else DecisionCache.MISSING
+            if rule is DecisionCache.MISSING:
+                pending.append((i, key))
+            else:
+                results[i] = rule
+
+        matched = compiled.match_many([contexts[i] for i, _ in pending])
+        for (i, key), rule in zip(pending, matched):
+            results[i] = rule
+            if key is not None:
+                self.decision_cache.put(key, rule)
+
+        for ctx, rule in zip(contexts, results):
+            if rule is not None:
+                self.logger.info(f"Файл '{ctx.name}' соответствует продвинутому правилу '{rule.name}'.")
+        return results
+
+    def simulate(self, records) -> RuleProfile:
+        """
+        Пробный прогон правил по файлам (записи как в classify_many) без каких-либо действий.
+        Правила компилируются отдельно с замером условий; кэш решений не используется и не меняется.
+        """
+        profile = RuleProfile(self.advanced_rules)
+        compiled = CompiledRules(self.advanced_rules, profile=profile)
+        contexts = [self._record_context(record) for record in records]
+        start = time.perf_counter()
+        compiled.simulate(contexts, profile)
+        profile.seconds = time.perf_counter() - start
+        return profile
+
+    @staticmethod
+    def _record_context(record) -> FileContext:
+        if isinstance(record, os.DirEntry):
+            try:
+                return FileContext(record.path, record.stat())
+            except OSError:
+                return FileContext(record.path)
+        if isinstance(record, tuple):
+            return FileContext(*record)
+        return FileContext(record)
 
     def check_advanced_rules(self, file_path: Path):
         """
         Проверяет файл по списку продвинутых правил.
         Возвращает действие (например, путь для перемещения), если правило сработало.
         """
-        for rule in self.advanced_rules:
-            if not rule.get("enabled", False):
-                continue
-
-            conditions = rule.get("conditions", [])
-            if not conditions:
-                continue
-
-            # Проверяем, выполняются ли ВСЕ условия для данного правила
-            is_match = all(self._check_condition(file_path, cond) for cond in conditions)
-
-            if is_match:
-                self.logger.info(f"Файл '{file_path.name}' соответствует продвинутому правилу '{rule.get('name')}'.")
-                return rule.get("action")
-
-        return None
-
-    def _check_condition(self, file_path: Path, condition: dict):
-        """Проверяет одно конкретное условие для файла."""
-        cond_type = condition.get("type")
-        cond_value = condition.get("value")
-
-        if cond_type == "name_contains":
-            return cond_value.lower() in file_path.name.lower()
-        if cond_type == "extension_is":
-            return file_path.suffix.lower() == cond_value.lower()
-        # Здесь в будущем можно добавить другие типы условий:
-        # if cond_type == "size_greater_than": ...
-        # if cond_type == "older_than": ...
-
-        return False
+        rule = self.match_rule(FileContext(file_path))
+        if rule is None:
+            return None
+        self.logger.info(f"Файл '{file_path.name}' соответствует продвинутому правилу '{rule.name}'.")
+        return rule.action
 
-    def classify_by_category(self, file_path: Path):
+    def classify_by_category(self, file_path: Path, stat_result=None):
         """
         Определяет категорию для файла по старой логике (расширениям).
+        stat_result можно передать, если он уже получен (например, из DirEntry), — тогда обращений к диску нет.
+        Самое длинное расширение проверяется первым: 'a.tar.gz' ищется как '.tar.gz', затем как '.gz'.
         """
-        if not file_path.exists():
-            return None
+        if stat_result is None:
+            try:
+                stat_result = os.stat(file_path)
+            except OSError:
+                return None
 
-        if file_path.is_dir():
+        if stat.S_ISDIR(stat_result.st_mode):
             return "Папки"  # Папки не обрабатываются
 
-        if file_path.name in self.exceptions:
+        ctx = FileContext(file_path, stat_result)
+        if ctx.name in self._exception_names:
             return None  # Исключение - не трогать
 
-        ext = file_path.suffix.lower()
-
-        for category, extensions in self.categories.items():
-            if ext in extensions:
+        for ext in ctx.suffixes:
+            category = self.category_index.get(ext)
+            if category is not None:
                 return category
 
         return "Другое"
\ No newline at end of file
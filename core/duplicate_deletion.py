@@ -0,0 +1,104 @@
+# core/duplicate_deletion.py
+import os
+import logging
+from PyQt5.QtCore import QObject, pyqtSignal
+from send2trash import send2trash
+
+from .scan_checkpoint import ScanControl
+
+# Сколько файлов передавать в корзину за один вызов
+TRASH_BATCH_SIZE = 200
+
+
+def changed_since_scan(path: str, meta) -> str:
+    """
+    Сверяет файл с (размер, mtime_ns) из поиска. Возвращает причину пропуска или пустую строку.
+    Без сохраненных данных файл считается неизменным.
+    """
+    try:
+        st = os.stat(path, follow_symlinks=False)
+    except FileNotFoundError:
+        return "файл уже удален"
+    except OSError as e:
+        return f"нет доступа ({e})"
+    if meta is not None and (st.st_size, st.st_mtime_ns) != tuple(meta):
+        return "файл изменился после поиска"
+    return ""
+
+
+class DeletionJob(QObject):
+    """
+    Фоновое перемещение файлов в корзину. Запускается в отдельном QThread через run().
+    Файлы, изменившиеся после поиска, пропускаются; остальные уходят в корзину пачками.
+    """
+    progress_updated = pyqtSignal(int)
+    status_updated = pyqtSignal(str)
+    # {'deleted': [пути], 'skipped': [(путь, причина)], 'errors': [(путь, ошибка)], 'cancelled': bool}
+    deletion_finished = pyqtSignal(dict)
+
+    def __init__(self, paths: list, file_meta: dict = None, batch_size: int = TRASH_BATCH_SIZE):
+        super().__init__()
+        self.logger = logging.getLogger(__name__)
+        self.paths = list(paths)
+        self.file_meta = file_meta or {}
+        self.batch_size = batch_size
+        self.control = ScanControl()
+        # Старые версии send2trash принимают только один путь; определяется при первой пачке
+        self._batches_supported = True
+
+    def cancel(self) -> None:
+        self.control.cancel()
+
+    def run(self):
+        result = {'deleted': [], 'skipped': [], 'errors': [], 'cancelled': False}
+        total = len(self.paths)
+        try:
+            for start in range(0, total, self.batch_size):
+                if self.control.is_cancelled:
+                    result['cancelled'] = True
+                    break
+                batch = []
+                for path in self.paths[start:start + self.batch_size]:
+                    reason = changed_since_scan(path, self.file_meta.get(path))
+                    if reason:
+                        result['skipped'].append((path, reason))
+                    else:
+                        batch.append(path)
+                self._trash_batch(batch, result)
+                done = min(start + self.batch_size, total)
+                self.status_updated.emit(f"Перемещено в корзину {len(result['deleted'])} из {total}...")
+                self.progress_updated.emit(int(done / total * 100))
+        except Exception as e:
+            self.logger.error(f"Ошибка удаления дубликатов: {e}", exc_info=True)
+            result['errors'].append(("", str(e)))
+        finally:
+            self.logger.info(f"Удаление дубликатов: в корзине {len(result['deleted'])}, "
+                             f"пропущено {len(result['skipped'])}, ошибок {len(result['errors'])}.")
+            self.deletion_finished.emit(result)
+
+    def _trash_batch(self, batch: list, result: dict):
+        if not batch:
+            return
+        if self._batches_supported and len(batch) > 1:
+            try:
+                send2trash(batch)
+                result['deleted'].extend(batch)
+                return
+            except TypeError:
+                self._batches_supported = False
+            except Exception as e:
+                # Пачка прервалась на каком-то файле; оставшиеся досылаем по одному, чтобы знать, какой сбойный
+                self.logger.warning(f"Пачка файлов не перемещена целиком, переходим к поштучному режиму: {e}")
+        for path in batch:
+            if self.control.is_cancelled:
+                result['cancelled'] = True
+                return
+            if not os.path.lexists(path):
+                # Успел уйти в корзину в составе прерванной пачки
+                result['deleted'].append(path)
+                continue
+            try:
+                send2trash(path)
+                result['deleted'].append(path)
+            except Exception as e:  # send2trash может вызвать разные ошибки
+                result['errors'].append((path, str(e)))
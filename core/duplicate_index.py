@@ -0,0 +1,197 @@
+# core/duplicate_index.py
+import os
+import stat
+import time
+import logging
+import threading
+
+from .duplicates import DuplicateFinder, FileRecord, walk_files, with_identity
+from .scan_checkpoint import ScanCancelled
+
+# Как часто (в секундах) сбрасывать в кеш хеши, вычисленные по событиям наблюдателя
+FLUSH_INTERVAL = 30
+
+
+class DuplicateIndex:
+    """
+    Живой индекс дубликатов для отслеживаемой папки: размер -> пути и хеш -> пути.
+    Строится один раз, дальше обновляется событиями наблюдателя (создание, перемещение, удаление).
+    Хеш вычисляется только тогда, когда у файла появляется сосед того же размера.
+    Методы вызываются из потока наблюдателя, чтение результатов — из GUI, поэтому словари
+    под блокировкой; файлы хешируются вне ее, чтобы чтение из GUI не ждало хеширования.
+    """
+
+    def __init__(self, finder: DuplicateFinder = None):
+        self.logger = logging.getLogger(__name__)
+        self.finder = finder if finder is not None else DuplicateFinder()
+        self._lock = threading.RLock()
+        self._records = {}   # path -> FileRecord
+        self._by_size = {}   # size -> set(paths)
+        self._hash_of = {}   # path -> 'алгоритм:хеш'
+        self._by_hash = {}   # 'алгоритм:хеш' -> set(paths)
+        self._last_flush = time.monotonic()
+        self.ready = False
+
+    def cancel(self) -> None:
+        """Прерывает построение индекса (например, при выходе из приложения); из любого потока."""
+        self.finder.cancel()
+
+    def build(self, root: str, recursive: bool = False) -> None:
+        """Полностью перестраивает индекс по содержимому папки; до готовности GUI видит прежний индекс."""
+        control = self.finder.control
+        self.finder.hash_cache.open()
+        records, by_size, hash_of = {}, {}, {}
+        try:
+            for record in walk_files(root, self.logger, recursive=recursive):
+                if control.is_cancelled:
+                    raise ScanCancelled()
+                records[record.path] = record
+                by_size.setdefault(record.size, set()).add(record.path)
+            for paths in by_size.values():
+                if len(paths) > 1:
+                    for path in paths:
+                        if control.is_cancelled:
+                            raise ScanCancelled()
+                        file_hash = self.finder.hash_record(records[path])
+                        if file_hash:
+                            hash_of[path] = file_hash
+        except ScanCancelled:
+            self.logger.info(f"Построение индекса дубликатов для '{root}' прервано.")
+            return
+        finally:
+            self.flush()
+
+        by_hash = {}
+        for path, file_hash in hash_of.items():
+            by_hash.setdefault(file_hash, set()).add(path)
+        with self._lock:
+            self._records, self._by_size, self._hash_of, self._by_hash = records, by_size, hash_of, by_hash
+            self.ready = True
+        self.logger.info(f"Индекс дубликатов построен для '{root}': файлов {len(records)}.")
+
+    def add_path(self, path: str, known_hash: str = None) -> None:
+        """
+        Добавляет или обновляет файл (событие создания или изменения).
+        known_hash передается при перемещении, когда содержимое заведомо не менялось.
+        """
+        path = os.fspath(path)
+        try:
+            st = os.stat(path, follow_symlinks=False)
+        except OSError:
+            self.remove_path(path)
+            return
+        if not stat.S_ISREG(st.st_mode):
+            return
+        record = with_identity(FileRecord(path, st.st_size, st.st_dev, st.st_ino, st.st_mtime_ns))
+        with self._lock:
+            self._discard(path)
+            self._records[path] = record
+            if known_hash:
+                self._set_hash(path, known_hash)
+            same_size = self._by_size.setdefault(record.size, set())
+            same_size.add(path)
+            unhashed = [self._records[other] for other in same_size
+                        if len(same_size) > 1 and other not in self._hash_of]
+
+        try:
+            hashes = [(other, self.finder.hash_record(other)) for other in unhashed]
+        except ScanCancelled:
+            # Наблюдатель останавливается: файлы останутся без хеша до следующего построения
+            return
+        with self._lock:
+            for other, file_hash in hashes:
+                # Пока файл хешировался, он мог измениться или исчезнуть — тогда хеш уже не его
+                if file_hash and self._records.get(other.path) == other and other.path not in self._hash_of:
+                    self._set_hash(other.path, file_hash)
+        self._flush_if_due()
+
+    def flush(self) -> None:
+        """Сбрасывает вычисленные хеши в постоянный кеш."""
+        self.finder.hash_cache.flush()
+        self._last_flush = time.monotonic()
+
+    def _flush_if_due(self) -> None:
+        # Сброс кеша с вытеснением старых записей — запрос к базе, поэтому не на каждое событие
+        if time.monotonic() - self._last_flush >= FLUSH_INTERVAL:
+            self.flush()
+
+    def remove_path(self, path: str) -> None:
+        with self._lock:
+            self._discard(os.fspath(path))
+
+    def move_path(self, src_path: str, dest_path: str) -> None:
+        """Перемещение внутри папки: содержимое то же, поэтому хеш переносится без повторного чтения."""
+        src_path, dest_path = os.fspath(src_path), os.fspath(dest_path)
+        with self._lock:
+            file_hash = self._hash_of.get(src_path)
+            self._discard(src_path)
+        self.add_path(dest_path, known_hash=file_hash)
+
+    def duplicates(self) -> dict:
+        """Группы с одинаковым содержимым в формате DuplicateFinder.duplicates_found: по одному пути на inode."""
+        with self._lock:
+            result = {}
+            for file_hash, paths in self._by_hash.items():
+                representatives = self._one_path_per_inode(paths)
+                if len(representatives) > 1:
+                    result[file_hash] = sorted(representatives.values())
+            return result
+
+    def hardlink_sets(self) -> dict:
+        with self._lock:
+            by_inode = {}
+            for record in self._records.values():
+                if record.ino:
+                    by_inode.setdefault(f"{record.dev}:{record.ino}", []).append(record.path)
+            return {key: sorted(paths) for key, paths in by_inode.items() if len(paths) > 1}
+
+    def group_sizes(self) -> dict:
+        """Размер файла для каждой группы из duplicates()."""
+        with self._lock:
+            return {file_hash: self._records[next(iter(paths))].size
+                    for file_hash, paths in self._by_hash.items() if paths}
+
+    def file_meta(self) -> dict:
+        """(размер, mtime_ns) всех проиндексированных файлов, как DuplicateFinder.file_meta."""
+        with self._lock:
+            return {path: (record.size, record.mtime_ns) for path, record in self._records.items()}
+
+    def stats(self) -> dict:
+        with self._lock:
+            reclaimable = 0
+            for paths in self._by_hash.values():
+                representatives = self._one_path_per_inode(paths)
+                if len(representatives) > 1:
+                    size = self._records[next(iter(paths))].size
+                    reclaimable += size * (len(representatives) - 1)
+            return {'files': len(self._records), 'reclaimable_bytes': reclaimable}
+
+    def _one_path_per_inode(self, paths) -> dict:
+        representatives = {}
+        for path in sorted(paths):
+            record = self._records[path]
+            key = (record.dev, record.ino) if record.ino else (None, path)
+            representatives.setdefault(key, path)
+        return representatives
+
+    def _set_hash(self, path: str, file_hash: str) -> None:
+        self._hash_of[path] = file_hash
+        self._by_hash.setdefault(file_hash, set()).add(path)
+
+    def _discard(self, path: str) -> bool:
+        record = self._records.pop(path, None)
+        if record is None:
+            return False
+        same_size = self._by_size.get(record.size)
+        if same_size is not None:
+            same_size.discard(path)
+            if not same_size:
+                del self._by_size[record.size]
+        file_hash = self._hash_of.pop(path, None)
+        if file_hash:
+            same_hash = self._by_hash.get(file_hash)
+            if same_hash is not None:
+                same_hash.discard(path)
+                if not same_hash:
+                    del self._by_hash[file_hash]
+        return True
@@ -0,0 +1,153 @@
+# core/duplicate_linking.py
+import os
+import sys
+import uuid
+import shutil
+import logging
+from PyQt5.QtCore import QObject, pyqtSignal
+
+from .duplicate_deletion import changed_since_scan
+from .scan_checkpoint import ScanControl
+
+# ioctl FICLONE из linux/fs.h: копия с общими блоками (btrfs, XFS с reflink=1, bcachefs)
+FICLONE = 0x40049409
+
+LINK_AUTO = 'auto'
+LINK_REFLINK = 'reflink'
+LINK_HARDLINK = 'hardlink'
+
+
+def _temp_name(path: str) -> str:
+    """Временное имя рядом с файлом: rename в пределах папки атомарен."""
+    directory, name = os.path.split(path)
+    return os.path.join(directory, f".{name}.{uuid.uuid4().hex[:8]}.dedupe-tmp")
+
+
+def clone_file(src: str, dst: str) -> None:
+    """Создает dst как reflink-копию src. Бросает OSError, если ФС это не поддерживает."""
+    if not sys.platform.startswith('linux'):
+        raise OSError(f"reflink не поддерживается на {sys.platform}")
+    import fcntl
+    with open(src, 'rb') as src_file, open(dst, 'xb') as dst_file:
+        try:
+            fcntl.ioctl(dst_file.fileno(), FICLONE, src_file.fileno())
+        except OSError:
+            dst_file.close()
+            os.unlink(dst)
+            raise
+
+
+def replace_with_link(canonical: str, target: str, mode: str = LINK_AUTO) -> str:
+    """
+    Атомарно заменяет target ссылкой на canonical: ссылка создается под временным именем
+    и переименовывается поверх target, так что путь ни в какой момент не пропадает.
+    Возвращает использованный способ (LINK_REFLINK или LINK_HARDLINK).
+    """
+    canonical_st = os.stat(canonical)
+    target_st = os.stat(target, follow_symlinks=False)
+    if (canonical_st.st_dev, canonical_st.st_ino) == (target_st.st_dev, target_st.st_ino):
+        raise ValueError("файл уже является жесткой ссылкой на оригинал")
+    if canonical_st.st_dev != target_st.st_dev:
+        raise ValueError("файлы находятся на разных томах")
+
+    tmp_path = _temp_name(target)
+    method = None
+    if mode in (LINK_AUTO, LINK_REFLINK):
+        try:
+            clone_file(canonical, tmp_path)
+            # У reflink-копии свои метаданные: сохраняем права и время замененного файла
+            shutil.copystat(target, tmp_path)
+            method = LINK_REFLINK
+        except OSError:
+            if mode == LINK_REFLINK:
+                raise
+    if method is None:
+        os.link(canonical, tmp_path)
+        method = LINK_HARDLINK
+    try:
+        os.replace(tmp_path, target)
+    except OSError:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+    return method
+
+
+def break_link(path: str) -> None:
+    """Отмена замены: на месте ссылки снова создается независимая копия (тоже через временное имя)."""
+    tmp_path = _temp_name(path)
+    shutil.copy2(path, tmp_path)
+    try:
+        os.replace(tmp_path, path)
+    except OSError:
+        os.unlink(tmp_path)
+        raise
+
+
+class LinkJob(QObject):
+    """
+    Фоновая замена лишних копий ссылками на одну каноническую копию группы.
+    Все пути сохраняются, место освобождается. Запускается в отдельном QThread через run().
+    """
+    progress_updated = pyqtSignal(int)
+    status_updated = pyqtSignal(str)
+    # Запись для UndoManager: {'type': 'dedupe_link', 'linked_files': [...]}
+    operation_logged = pyqtSignal(dict)
+    # {'linked': [пути], 'skipped': [(путь, причина)], 'errors': [(путь, ошибка)],
+    #  'reclaimed_bytes': int, 'cancelled': bool}
+    linking_finished = pyqtSignal(dict)
+
+    def __init__(self, groups: list, file_meta: dict = None, mode: str = LINK_AUTO):
+        """groups: [(канонический путь, [пути для замены])]."""
+        super().__init__()
+        self.logger = logging.getLogger(__name__)
+        self.groups = groups
+        self.file_meta = file_meta or {}
+        self.mode = mode
+        self.control = ScanControl()
+
+    def cancel(self) -> None:
+        self.control.cancel()
+
+    def run(self):
+        result = {'linked': [], 'skipped': [], 'errors': [], 'reclaimed_bytes': 0, 'cancelled': False}
+        linked_files = []
+        total = sum(len(targets) for _, targets in self.groups)
+        done = 0
+        try:
+            for canonical, targets in self.groups:
+                reason = changed_since_scan(canonical, self.file_meta.get(canonical))
+                for target in targets:
+                    if self.control.is_cancelled:
+                        result['cancelled'] = True
+                        break
+                    done += 1
+                    target_reason = reason or changed_since_scan(target, self.file_meta.get(target))
+                    if target_reason:
+                        result['skipped'].append((target, target_reason))
+                        continue
+                    try:
+                        size = os.path.getsize(target)
+                        method = replace_with_link(canonical, target, self.mode)
+                    except (OSError, ValueError) as e:
+                        result['errors'].append((target, str(e)))
+                        continue
+                    result['linked'].append(target)
+                    result['reclaimed_bytes'] += size
+                    linked_files.append({'path': target, 'canonical': canonical, 'method': method})
+                    self.logger.info(f"'{target}' заменен ссылкой ({method}) на '{canonical}'")
+                if result['cancelled']:
+                    break
+                self.status_updated.emit(f"Заменено ссылками {len(result['linked'])} из {total}...")
+                self.progress_updated.emit(int(done / total * 100) if total else 100)
+        except Exception as e:
+            self.logger.error(f"Ошибка замены дубликатов ссылками: {e}", exc_info=True)
+            result['errors'].append(("", str(e)))
+        finally:
+            if linked_files:
+                self.operation_logged.emit({'type': 'dedupe_link', 'linked_files': linked_files})
+            self.logger.info(f"Замена ссылками: заменено {len(result['linked'])}, "
+                             f"пропущено {len(result['skipped'])}, ошибок {len(result['errors'])}.")
+            self.linking_finished.emit(result)
@@ -0,0 +1,127 @@
+# core/duplicate_report.py
+"""
+Поиск дубликатов без графического интерфейса с потоковой выгрузкой отчета.
+
+Запуск: python -m core.duplicates scan <папка> [<папка> ...] [--format ndjson|csv] [--output файл]
+
+Группы записываются сразу, как только их подтверждает полный хеш, поэтому отчет по большому
+серверному ресурсу можно обрабатывать, не дожидаясь конца поиска. В конце NDJSON идет строка
+с итогами ("type": "totals"); для CSV итоги выводятся в stderr.
+Ctrl+C останавливает поиск с сохранением состояния: повторный запуск с теми же папками продолжит его.
+"""
+import argparse
+import csv
+import json
+import logging
+import signal
+import sys
+
+from .duplicates import DuplicateFinder
+from .hashers import DEFAULT_FULL_ALGORITHM, FAST_ALGORITHM, available_hashers
+
+REPORT_FORMATS = ('ndjson', 'csv')
+
+
+class NdjsonReportWriter:
+    """По строке JSON на группу, последней — итоги."""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.groups = 0
+
+    def write_group(self, key: str, size: int, paths: list) -> None:
+        self.groups += 1
+        algorithm, _, file_hash = key.partition(':')
+        record = {'type': 'group', 'group': self.groups, 'algorithm': algorithm, 'hash': file_hash,
+                  'size': size, 'count': len(paths), 'reclaimable_bytes': size * (len(paths) - 1),
+                  'paths': paths}
+        self.stream.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self.stream.flush()
+
+    def write_totals(self, totals: dict) -> None:
+        self.stream.write(json.dumps({'type': 'totals', **totals}, ensure_ascii=False) + "\n")
+        self.stream.flush()
+
+
+class CsvReportWriter:
+    """Строка на файл: номер группы, хеш, размер, путь. Итоги уходят в stderr, чтобы не ломать таблицу."""
+    HEADER = ['group', 'algorithm', 'hash', 'size', 'path']
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.writer = csv.writer(stream)
+        self.writer.writerow(self.HEADER)
+        self.groups = 0
+
+    def write_group(self, key: str, size: int, paths: list) -> None:
+        self.groups += 1
+        algorithm, _, file_hash = key.partition(':')
+        self.writer.writerows([self.groups, algorithm, file_hash, size, path] for path in paths)
+        self.stream.flush()
+
+    def write_totals(self, totals: dict) -> None:
+        sys.stderr.write(" ".join(f"{name}={value}" for name, value in totals.items()) + "\n")
+
+
+REPORT_WRITERS = {'ndjson': NdjsonReportWriter, 'csv': CsvReportWriter}
+
+
+def scan(roots: list, writer, finder: DuplicateFinder = None, resume: bool = True) -> int:
+    """
+    Ищет дубликаты в roots и пишет группы в writer по мере подтверждения.
+    Возвращает код выхода: 0 — готово, 1 — ошибка, 130 — остановлено (состояние сохранено).
+    """
+    finder = finder if finder is not None else DuplicateFinder()
+    outcome = {}
+    finder.group_confirmed.connect(writer.write_group)
+    # Итоги этапов приходят только при успешном завершении, в отличие от пустого duplicates_found при ошибке
+    finder.tier_stats_updated.connect(lambda stats: outcome.setdefault('done', True))
+    finder.scan_cancelled.connect(lambda label: outcome.setdefault('cancelled', True))
+
+    # Ctrl+C не прерывает поиск исключением, а просит его остановиться с сохранением состояния
+    previous_handler = signal.signal(signal.SIGINT, lambda signum, frame: finder.cancel())
+    try:
+        finder.find_duplicates(roots, resume_from_checkpoint=resume)
+    finally:
+        signal.signal(signal.SIGINT, previous_handler)
+
+    if outcome.get('cancelled'):
+        return 130
+    stats = finder.tier_stats
+    totals = {'roots': roots, 'files': stats.get('files', 0), 'groups': writer.groups,
+              'duplicates': stats.get('duplicates', 0), 'reclaimable_bytes': stats.get('reclaimable_bytes', 0),
+              'hardlink_sets': len(finder.hardlink_sets), 'cache_hits': stats.get('cache_hits', 0),
+              'algorithm': finder.full_algorithm}
+    writer.write_totals(totals)
+    return 0 if outcome.get('done') else 1
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m core.duplicates",
+                                     description="Поиск дубликатов файлов без графического интерфейса.")
+    commands = parser.add_subparsers(dest='command', required=True)
+    scan_parser = commands.add_parser('scan', help="найти дубликаты в папках и вывести отчет")
+    scan_parser.add_argument('roots', nargs='+', help="папки для поиска (дубликаты между ними тоже ищутся)")
+    scan_parser.add_argument('--format', choices=REPORT_FORMATS, default='ndjson', help="формат отчета")
+    scan_parser.add_argument('--output', '-o', help="файл отчета (по умолчанию stdout)")
+    scan_parser.add_argument('--algorithm', choices=available_hashers(), default=DEFAULT_FULL_ALGORITHM,
+                             help="алгоритм полного хеша")
+    scan_parser.add_argument('--workers', type=int, help="число потоков хеширования (по умолчанию по типу диска)")
+    scan_parser.add_argument('--no-resume', action='store_true', help="не продолжать прерванный поиск")
+    scan_parser.add_argument('--verbose', '-v', action='store_true', help="подробный журнал в stderr")
+    args = parser.parse_args(argv)
+
+    # core.utils при импорте уже настроил журнал (файл + консоль); в консоль без -v идут только предупреждения
+    console_level = logging.INFO if args.verbose else logging.WARNING
+    for handler in logging.getLogger().handlers:
+        if type(handler) is logging.StreamHandler:
+            handler.setLevel(console_level)
+            handler.setStream(sys.stderr)
+
+    finder = DuplicateFinder(workers=args.workers, full_algorithm=args.algorithm, partial_algorithm=FAST_ALGORITHM)
+    stream = open(args.output, 'w', encoding='utf-8', newline='') if args.output else sys.stdout
+    try:
+        return scan(args.roots, REPORT_WRITERS[args.format](stream), finder, resume=not args.no_resume)
+    finally:
+        if stream is not sys.stdout:
+            stream.close()
@@ -1,90 +1,768 @@
 # core/duplicates.py
 import os
-import hashlib
+import stat
+import struct
+import itertools
 import logging
-from collections import defaultdict
+import threading
+from collections import defaultdict, deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from PyQt5.QtCore import QObject, pyqtSignal
+from .hash_cache import HashCache
+from .hashers import get_hasher, DEFAULT_FULL_ALGORITHM, FAST_ALGORITHM
+from .hash_io import compare_files_lockstep, hash_file, read_into_hasher
+from .image_similarity import IMAGE_EXTENSIONS, IMAGE_HASHERS, ImageHashIndex, PIL_AVAILABLE
+from .scan_checkpoint import ScanCancelled, ScanCheckpoint, ScanControl
+
+try:
+    import win32file
+    import pywintypes
+
+    WIN32FILE_AVAILABLE = True
+except ImportError:
+    WIN32FILE_AVAILABLE = False
+
+# Размер блока, читаемого с начала и с конца файла на этапе быстрой проверки
+PARTIAL_CHUNK_SIZE = 4096
+# Для файлов больше этого порога дополнительно читаются блоки из середины
+SAMPLE_THRESHOLD = 1024 * 1024
+SAMPLE_COUNT = 3
+
+# Группы из не более чем стольких файлов сравниваются побайтно в одновременном чтении, а не хешируются:
+# расхождение обнаруживается на первом отличающемся блоке, а не после чтения файлов целиком
+LOCKSTEP_MAX_FILES = 3
+# Файлы не больше этого размера уже прочитаны целиком на этапе быстрой проверки
+LOCKSTEP_MIN_SIZE = PARTIAL_CHUNK_SIZE * 2
+
+# Число потоков хеширования: SSD выдерживает много параллельных чтений, HDD — нет
+SSD_WORKERS = 8
+HDD_WORKERS = 2
+DEFAULT_WORKERS = 4
+
+# Запрос к тому Windows: «есть ли у устройства штраф за позиционирование головки» (т.е. это HDD)
+IOCTL_STORAGE_QUERY_PROPERTY = 0x2D1400
+STORAGE_DEVICE_SEEK_PENALTY_PROPERTY = 7
+PROPERTY_STANDARD_QUERY = 0
+
+# Как часто (в файлах) сообщать о ходе обхода дерева
+WALK_STATUS_EVERY = 500
+
+# Компактная запись о файле (path — строка); (dev, ino, size, mtime_ns) служит ключом кеша хешей
+FileRecord = namedtuple('FileRecord', ['path', 'size', 'dev', 'ino', 'mtime_ns'])
 
 
 class DuplicateFinder(QObject):
     # --- ДОБАВЛЕН НОВЫЙ СИГНАЛ ---
     status_updated = pyqtSignal(str)
     duplicates_found = pyqtSignal(dict)
+    # Наборы жестких ссылок на один inode: {"dev:ino": [paths]}; место они не занимают повторно
+    hardlinks_found = pyqtSignal(dict)
     progress_updated = pyqtSignal(int)
+    # Индекс перцептивных хешей (ImageHashIndex) для поиска похожих изображений
+    similar_images_found = pyqtSignal(object)
+    # Статистика по этапам: сколько кандидатов отсеял каждый этап
+    tier_stats_updated = pyqtSignal(dict)
+    # Поиск прерван (отмена или закрытие приложения); состояние сохранено для продолжения
+    scan_cancelled = pyqtSignal(str)
+    # Группа подтверждена полным хешем (ключ 'алгоритм:хеш', размер файла, пути) — до конца поиска
+    group_confirmed = pyqtSignal(str, object, list)
 
-    def __init__(self):
+    def __init__(self, hash_cache: HashCache = None, workers: int = None,
+                 ssd_workers: int = SSD_WORKERS, hdd_workers: int = HDD_WORKERS,
+                 full_algorithm: str = DEFAULT_FULL_ALGORITHM, partial_algorithm: str = FAST_ALGORITHM,
+                 lockstep_max_files: int = LOCKSTEP_MAX_FILES):
         super().__init__()
         self.logger = logging.getLogger(__name__)
+        self.hash_cache = hash_cache if hash_cache is not None else HashCache()
+        # Проверяем имена сразу, чтобы ошибка конфигурации не всплыла посреди поиска
+        get_hasher(full_algorithm)
+        get_hasher(partial_algorithm)
+        self.full_algorithm = full_algorithm
+        self.partial_algorithm = partial_algorithm
+        # 0 отключает побайтное сравнение: все группы хешируются
+        self.lockstep_max_files = lockstep_max_files
+        # workers задает число потоков явно; иначе оно выбирается по типу диска при каждом поиске
+        self.workers = workers
+        self.ssd_workers = ssd_workers
+        self.hdd_workers = hdd_workers
+        self._active_workers = 1
+        self._stats_lock = threading.Lock()
+        self.tier_stats = {}
+        self.hardlink_sets = {}
+        # Размер файла для каждой группы результата: {ключ группы: байт}
+        self.group_sizes = {}
+        # (размер, mtime_ns) каждого файла из результата на момент поиска: перед удалением
+        # файл сверяется с ними, чтобы не удалить то, что изменилось после поиска
+        self.file_meta = {}
+        self.control = ScanControl()
+        self._checkpoint = None
+        self._first_by_size = {}
+        self._size_buckets = {}
+        self._walk_total = 0
+
+    def cancel(self) -> None:
+        """Прерывает текущий поиск; можно вызывать из любого потока."""
+        self.control.cancel()
+
+    def pause(self) -> None:
+        self.control.pause()
+
+    def resume(self) -> None:
+        self.control.resume()
+
+    def has_checkpoint(self, folder_path) -> bool:
+        """Есть ли сохраненное состояние прерванного поиска для этой папки."""
+        return self._make_checkpoint(folder_path).exists()
+
+    def _make_checkpoint(self, folder_path) -> ScanCheckpoint:
+        return ScanCheckpoint(_as_roots(folder_path), {'full': self.full_algorithm, 'partial': self.partial_algorithm})
 
-    def find_duplicates(self, folder_path: str) -> None:
+    def find_duplicates(self, folder_path, resume_from_checkpoint: bool = True) -> None:
+        """
+        Ищет дубликаты в папке или в списке папок (дубликаты между ними тоже находятся). Поиск можно отменить (cancel) или приостановить (pause/resume);
+        раз в CHECKPOINT_INTERVAL секунд и при отмене состояние сохраняется в DATA_DIR,
+        и следующий вызов для той же папки продолжает работу с места остановки.
+        """
+        self.control.reset()
         try:
-            duplicates = defaultdict(list)
-            files_by_size = defaultdict(list)
-            start_path = Path(folder_path)
+            roots = _as_roots(folder_path)
+            self.tier_stats = {'files': 0, 'size': 0, 'hardlinks': 0, 'partial': 0, 'full': 0, 'duplicates': 0,
+                               'reclaimable_bytes': 0, 'cache_hits': 0, 'compared_groups': 0,
+                               'algorithm': self.full_algorithm, 'partial_algorithm': self.partial_algorithm}
+            self.hardlink_sets = {}
+            self.group_sizes = {}
+            self.file_meta = {}
 
-            if not start_path.is_dir():
-                self.logger.error(f"Путь для поиска дубликатов не является директорией: {folder_path}")
+            not_dirs = [root for root in roots if not os.path.isdir(root)]
+            if not_dirs:
+                self.logger.error(f"Путь для поиска дубликатов не является директорией: {', '.join(not_dirs)}")
                 self.duplicates_found.emit({})
                 return
 
-            all_files = [p for p in start_path.rglob('*') if p.is_file()]
-            total_files = len(all_files)
+            self._checkpoint = self._make_checkpoint(roots)
+            state = self._checkpoint.load() if resume_from_checkpoint else None
+            if state:
+                self.logger.info(f"Продолжение прерванного поиска в '{os.pathsep.join(roots)}' (этап {state['phase']}).")
+
+            # Этап 1: Потоковая группировка по размеру во время обхода
+            if state and state['phase'] == 'hash':
+                saved = [rec for _, group in state['groups'] for rec in group]
+                size_groups, total_files = self._group_by_size(
+                    refresh_records(saved), state['total_files'] - len(saved))
+            else:
+                size_groups, total_files = self._walk_and_group(roots, state)
+            self.tier_stats['files'] = total_files
+            self.progress_updated.emit(40)
             if total_files == 0:
-                self.duplicates_found.emit({})
+                self._finish_scan({})
                 return
 
-            # Этап 1: Группировка по размеру
-            for i, filepath in enumerate(all_files):
-                # --- ОТПРАВКА СИГНАЛА ---
-                self.status_updated.emit(f"Анализ размера: {filepath.name}")
-                try:
-                    file_size = filepath.stat().st_size
-                    files_by_size[file_size].append(filepath)
-                except OSError as e:
-                    self.logger.warning(f"Не удалось получить размер файла {filepath.name}: {e}")
-                self.progress_updated.emit(int((i + 1) / total_files * 50))
-
-            # Этап 2: Проверка хешей
-            size_groups = [files for files in files_by_size.values() if len(files) > 1]
-            total_groups = len(size_groups)
-            if total_groups == 0:
-                self.duplicates_found.emit({})
-                return
+            if size_groups:
+                self._checkpoint.save({
+                    'phase': 'hash', 'total_files': total_files,
+                    'groups': [(size, [list(r) for r in group]) for size, group in size_groups]})
 
-            processed_files_in_groups = 0
-            for group_idx, files in enumerate(size_groups):
-                hashes = defaultdict(list)
-                for filepath in files:
-                    # --- ОТПРАВКА СИГНАЛА ---
-                    self.status_updated.emit(f"Вычисление хеша: {filepath.name}")
-                    try:
-                        file_hash = self._calculate_hash(filepath)
-                        if file_hash:
-                            hashes[file_hash].append(str(filepath))
-                    except OSError as e:
-                        self.logger.warning(f"Не удалось вычислить хеш для {filepath.name}: {e}")
+            self.tier_stats['size'] = total_files - sum(len(records) for _, records in size_groups)
+            # Жесткие ссылки на один inode хешируем один раз и не считаем копиями
+            size_groups = self._collapse_hardlinks(size_groups)
+            if not size_groups:
+                self._finish_scan({})
+                return
 
-                for hash_value, hash_files in hashes.items():
-                    if len(hash_files) > 1:
-                        duplicates[hash_value] = hash_files
+            self._active_workers = self.workers or self._workers_for_roots(roots)
+            self.logger.info(f"Хеширование в {self._active_workers} потоков.")
+            self.hash_cache.open()
+            try:
+                # Этап 2: Хеш начала, конца и нескольких блоков из середины файла
+                partial_groups = self._refine_groups(
+                    size_groups, 'partial', "Быстрая проверка", self._partial_hash_for_group, 40, 70)
+                if not partial_groups:
+                    self._finish_scan({})
+                    return
 
-                self.progress_updated.emit(50 + int((group_idx + 1) / total_groups * 50))
+                # Этап 3: Полный хеш или побайтное сравнение (для малых групп) оставшихся файлов
+                hash_groups, compare_groups = [], []
+                for group in partial_groups:
+                    (compare_groups if self._prefer_lockstep(*group) else hash_groups).append(group)
+                split = 70 + int(30 * len(hash_groups) / len(partial_groups))
+                full_groups = self._refine_groups(
+                    hash_groups, 'full', "Вычисление хеша", self._full_hash_for_group, 70, split,
+                    on_group=self._confirm_group)
+                full_groups += self._compare_groups(compare_groups, split, 100)
+            finally:
+                self.hash_cache.flush()
 
-            self.duplicates_found.emit(dict(duplicates))
+            # Ключ результата содержит имя алгоритма, чтобы хеши разных алгоритмов нельзя было спутать
+            duplicates = {self._result_key(size, file_key): [r.path for r in records]
+                          for (size, file_key), records in full_groups}
+            self.group_sizes = {self._result_key(size, file_key): size for (size, file_key), _ in full_groups}
+            self.file_meta = {r.path: (r.size, r.mtime_ns) for _, records in full_groups for r in records}
+            # Освободить можно все физические копии, кроме одной в каждой группе
+            self.tier_stats['reclaimable_bytes'] = sum(
+                size * (len(records) - 1) for (size, _), records in full_groups)
+            self._finish_scan(duplicates)
+        except ScanCancelled:
+            label = os.pathsep.join(_as_roots(folder_path))
+            self.logger.info(f"Поиск дубликатов в '{label}' прерван, состояние сохранено.")
+            self.scan_cancelled.emit(label)
         except Exception as e:
             self.logger.error(f"Ошибка при поиске дубликатов: {e}", exc_info=True)
             self.duplicates_found.emit({})
+        finally:
+            self._first_by_size = {}
+            self._size_buckets = {}
+
+    def find_similar_images(self, folder_path: str, method: str = 'dhash') -> None:
+        """
+        Ищет похожие (не обязательно побайтно одинаковые) изображения: уменьшенные,
+        пережатые копии. Хеши считаются параллельно и кешируются, результат — ImageHashIndex,
+        из которого кластеры получаются для любого порога схожести.
+        """
+        index = ImageHashIndex(method)
+        self.control.reset()
+        self._checkpoint = None
+        try:
+            if not PIL_AVAILABLE:
+                self.logger.warning("Поиск похожих изображений недоступен: библиотека Pillow не найдена.")
+                self.similar_images_found.emit(index)
+                return
+            hash_fn = IMAGE_HASHERS[method]
+            start_path = Path(folder_path)
+            if not start_path.is_dir():
+                self.logger.error(f"Путь для поиска похожих изображений не является директорией: {folder_path}")
+                self.similar_images_found.emit(index)
+                return
+
+            images = [with_identity(r) for r in walk_files(str(start_path), self.logger)
+                      if os.path.splitext(r.path)[1].lower() in IMAGE_EXTENSIONS]
+            total = len(images)
+            self.tier_stats = {'files': total, 'cache_hits': 0}
+
+            def compute(path):
+                try:
+                    return f"{hash_fn(path):016x}"
+                except Exception as e:  # Pillow выбрасывает разные ошибки на поврежденных файлах
+                    self.logger.warning(f"Не удалось вычислить перцептивный хеш {os.path.basename(path)}: {e}")
+                    return None
+
+            self._active_workers = self.workers or self._workers_for_path(start_path)
+            self.hash_cache.open()
+            try:
+                results = self._map_ordered(
+                    lambda r: (r, self._cached_hash(r, f"image:{method}", compute)), images)
+                for i, (record, image_hash) in enumerate(results):
+                    self.status_updated.emit(f"Анализ изображения: {os.path.basename(record.path)}")
+                    self._hashing_tick()
+                    if image_hash:
+                        index.add(record.path, int(image_hash, 16))
+                    self.progress_updated.emit(int((i + 1) / total * 100))
+            finally:
+                self.hash_cache.flush()
+
+            self.logger.info(f"Перцептивные хеши ({method}) вычислены для {len(index.hashes)} изображений, "
+                             f"из кеша: {self.tier_stats['cache_hits']}.")
+            self.progress_updated.emit(100)
+            self.similar_images_found.emit(index)
+        except ScanCancelled:
+            self.logger.info(f"Поиск похожих изображений в '{folder_path}' прерван.")
+            self.scan_cancelled.emit(str(folder_path))
+        except Exception as e:
+            self.logger.error(f"Ошибка при поиске похожих изображений: {e}", exc_info=True)
+            self.similar_images_found.emit(index)
+
+    def _walk_and_group(self, roots: list, state: dict = None):
+        """Обход деревьев с группировкой по размеру; при state продолжает сохраненный обход."""
+        pending = list(state['pending_dirs']) if state else list(roots)
+        saved, seen = [], 0
+        if state:
+            # Уже собранные записи перепроверяются: файлы могли измениться, пока поиск стоял
+            saved = state['singles'] + [rec for _, group in state['groups'] for rec in group]
+            seen = state['total_files'] - len(saved)
+
+        def on_dir_done():
+            # На границе папки состояние согласовано: все ее файлы учтены, подпапки в очереди
+            if self.control.is_cancelled or self._checkpoint.due():
+                self._checkpoint.save({
+                    'phase': 'walk', 'pending_dirs': list(pending), 'total_files': self._walk_total,
+                    'singles': [list(r) for r in self._first_by_size.values()],
+                    'groups': [(size, [list(r) for r in group]) for size, group in self._size_buckets.items()]})
+            if self.control.is_cancelled:
+                raise ScanCancelled()
+
+        records = itertools.chain(refresh_records(saved),
+                                  walk_files(roots[0], self.logger, pending=pending, on_dir_done=on_dir_done))
+        return self._group_by_size(records, seen)
+
+    def _group_by_size(self, records, total_files: int = 0):
+        """
+        Группирует поток записей по размеру, не накапливая список всех файлов.
+        Для размера, встреченного один раз, хранится одна запись; список заводится только со второй.
+        Возвращает ([(size, [records])] для групп из 2+ файлов, общее число файлов).
+        """
+        first_by_size = self._first_by_size = {}
+        groups = self._size_buckets = {}
+        self._walk_total = total_files
+        for record in records:
+            self._walk_total += 1
+            if self._walk_total % WALK_STATUS_EVERY == 0:
+                self.status_updated.emit(f"Анализ размера: просмотрено файлов {self._walk_total}")
+                self.control.wait_if_paused()
+            group = groups.get(record.size)
+            if group is not None:
+                group.append(record)
+            elif record.size in first_by_size:
+                groups[record.size] = [first_by_size.pop(record.size), record]
+            else:
+                first_by_size[record.size] = record
+        # На Windows DirEntry.stat() не заполняет st_dev/st_ino, дозапрашиваем их только для кандидатов
+        size_groups = [(size, [with_identity(r) for r in group]) for size, group in groups.items()]
+        return size_groups, self._walk_total
+
+    def _collapse_hardlinks(self, size_groups):
+        """
+        Сводит записи с одинаковыми (st_dev, st_ino) к одной, чтобы каждый физический файл
+        хешировался один раз. Наборы ссылок сохраняются в self.hardlink_sets.
+        В результате в группе остается по одному пути на inode; группы из одного inode отбрасываются.
+        """
+        collapsed = []
+        for size, records in size_groups:
+            by_inode = {}
+            for record in records:
+                # Без номера inode (не удалось получить) файл считается отдельным
+                key = (record.dev, record.ino) if record.ino else (None, record.path)
+                by_inode.setdefault(key, []).append(record)
+
+            for (dev, ino), links in by_inode.items():
+                if len(links) > 1:
+                    self.hardlink_sets[f"{dev}:{ino}"] = [r.path for r in links]
+                    self.tier_stats['hardlinks'] += len(links) - 1
+
+            if len(by_inode) > 1:
+                collapsed.append((size, [links[0] for links in by_inode.values()]))
+
+        if self.hardlink_sets:
+            self.logger.info(f"Найдено наборов жестких ссылок: {len(self.hardlink_sets)}, "
+                             f"лишних путей к тем же данным: {self.tier_stats['hardlinks']}.")
+        return collapsed
+
+    def _refine_groups(self, groups, tier_name, status_text, key_fn, progress_start, progress_end, on_group=None):
+        """
+        Разбивает каждую группу кандидатов по ключу key_fn(record, group_key).
+        Возвращает только подгруппы из двух и более файлов; ключ подгруппы — (size, новый ключ).
+        on_group(key, records) вызывается для каждой подгруппы сразу, как только она готова.
+        Количество отсеянных файлов записывается в self.tier_stats[tier_name].
+        """
+        refined = []
+        removed = 0
+        total_groups = len(groups)
+        jobs = ((group_idx, group_key, record)
+                for group_idx, (group_key, records) in enumerate(groups) for record in records)
+
+        def run_job(job):
+            group_idx, group_key, record = job
+            return group_idx, group_key, record, key_fn(record, group_key)
+
+        def close_group(group_idx, group_key, buckets):
+            nonlocal removed
+            for file_key, bucket in buckets.items():
+                if len(bucket) > 1:
+                    refined.append(((self._group_size(group_key), file_key), bucket))
+                    if on_group is not None:
+                        on_group(refined[-1][0], bucket)
+                else:
+                    removed += 1
+            self.progress_updated.emit(
+                progress_start + int((group_idx + 1) / total_groups * (progress_end - progress_start)))
+
+        # Результаты приходят в порядке отправки, поэтому сигналы идут так же, как при последовательном проходе
+        current_idx, current_key, buckets = None, None, defaultdict(list)
+        for group_idx, group_key, record, file_key in self._map_ordered(run_job, jobs):
+            if group_idx != current_idx:
+                if current_idx is not None:
+                    close_group(current_idx, current_key, buckets)
+                current_idx, current_key, buckets = group_idx, group_key, defaultdict(list)
+            self.status_updated.emit(f"{status_text}: {os.path.basename(record.path)}")
+            self._hashing_tick()
+            if file_key:
+                buckets[file_key].append(record)
+            else:
+                removed += 1
+        if current_idx is not None:
+            close_group(current_idx, current_key, buckets)
+
+        self.tier_stats[tier_name] = removed
+        self.logger.info(f"Этап '{tier_name}': отсеяно кандидатов {removed}, осталось групп {len(refined)}.")
+        return refined
+
+    def _prefer_lockstep(self, group_key, records) -> bool:
+        """
+        Побайтное сравнение выгоднее хеширования для групп из 2-3 файлов, которые не прочитаны целиком
+        на этапе быстрой проверки. Если полные хеши уже в кеше, хеширование бесплатно и остается им.
+        """
+        if len(records) > self.lockstep_max_files or group_key[0] <= LOCKSTEP_MIN_SIZE:
+            return False
+        kind = f"full:{self.full_algorithm}"
+        return not any(self.hash_cache.get(record, kind) for record in records)
+
+    def _compare_groups(self, groups, progress_start, progress_end):
+        """
+        Делит группы одновременным побайтным чтением файлов (compare_files_lockstep).
+        Прочитанное попутно хешируется полным алгоритмом (один экземпляр данных на выжившую группу):
+        без хеша у группы не было бы устойчивого ключа 'алгоритм:хеш' для результата и отчета,
+        а повторный поиск не мог бы взять его из кеша и снова читал бы файлы целиком.
+        Если файл прочитать не удалось, группа делится по полному хешу, как обычно.
+        """
+        refined = []
+        removed = 0
+        total_groups = len(groups)
+        kind = f"full:{self.full_algorithm}"
 
-    def _calculate_hash(self, filepath: Path, block_size=65536) -> str:
-        hasher = hashlib.md5()
+        def run_job(group):
+            group_key, records = group
+            try:
+                matches = compare_files_lockstep([r.path for r in records], group_key[0],
+                                                 lambda: get_hasher(self.full_algorithm), control=self.control)
+            except OSError as e:
+                self.logger.warning(f"Побайтное сравнение не удалось ({e}), группа будет захеширована.")
+                buckets = defaultdict(list)
+                for i, record in enumerate(records):
+                    file_hash = self._full_hash_for_group(record, group_key)
+                    if file_hash:
+                        buckets[file_hash].append(i)
+                return group, [(indices, file_hash) for file_hash, indices in buckets.items() if len(indices) > 1]
+            for indices, file_hash in matches:
+                for i in indices:
+                    self.hash_cache.put(records[i], kind, file_hash)
+            return group, matches
+
+        for group_idx, ((group_key, records), matches) in enumerate(self._map_ordered(run_job, groups)):
+            self.status_updated.emit(f"Побайтное сравнение: {os.path.basename(records[0].path)}")
+            self._hashing_tick()
+            kept = 0
+            for indices, file_hash in matches:
+                bucket = [records[i] for i in indices]
+                kept += len(bucket)
+                refined.append(((group_key[0], file_hash), bucket))
+                self._confirm_group(refined[-1][0], bucket)
+            removed += len(records) - kept
+            self.progress_updated.emit(
+                progress_start + int((group_idx + 1) / total_groups * (progress_end - progress_start)))
+
+        if groups:
+            self.tier_stats['full'] += removed
+            self.tier_stats['compared_groups'] = total_groups
+            self.logger.info(f"Побайтное сравнение: групп {total_groups}, отсеяно кандидатов {removed}, "
+                             f"подтверждено групп {len(refined)}.")
+        return refined
+
+    def _result_key(self, size: int, file_hash: str) -> str:
+        """Ключ группы в результате: 'алгоритм:хеш'."""
+        return f"{self.full_algorithm}:{file_hash}"
+
+    def _confirm_group(self, key, records) -> None:
+        size, file_key = key
+        self.group_confirmed.emit(self._result_key(size, file_key), size, [r.path for r in records])
+
+    def _hashing_tick(self) -> None:
+        """Пауза/отмена во время хеширования; вычисленные хеши периодически сбрасываются в кеш."""
+        self.control.wait_if_paused()
+        if self.control.is_cancelled or (self._checkpoint is not None and self._checkpoint.due()):
+            self.hash_cache.flush()
+            if self._checkpoint is not None:
+                self._checkpoint.touch()
+        if self.control.is_cancelled:
+            raise ScanCancelled()
+
+    def _map_ordered(self, fn, items):
+        """
+        Применяет fn к items в пуле из self._active_workers потоков и отдает результаты по порядку.
+        В работе одновременно не больше workers * 4 задач, чтобы не держать в памяти всю очередь.
+        Задача проверяет паузу и отмену перед началом (а хеширование — между блоками), поэтому
+        на паузе потоки не читают диск, а при отмене очередь не дорабатывается до конца.
+        """
+        workers = self._active_workers
+        if workers <= 1:
+            yield from map(fn, items)
+            return
+
+        def guarded(item):
+            self.control.check()
+            return fn(item)
+
+        window = deque()
+        pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="dup-hash")
         try:
-            with open(filepath, 'rb') as f:
-                buf = f.read(block_size)
-                while len(buf) > 0:
-                    hasher.update(buf)
-                    buf = f.read(block_size)
+            for item in items:
+                window.append(pool.submit(guarded, item))
+                if len(window) >= workers * 4:
+                    yield window.popleft().result()
+            while window:
+                yield window.popleft().result()
+        finally:
+            # Сюда попадаем и при отмене (исключение у потребителя закрывает генератор):
+            # еще не начатые задачи снимаются, начатые останавливаются на ближайшей проверке
+            for future in window:
+                future.cancel()
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    def _workers_for_path(self, path: Path) -> int:
+        rotational = is_rotational(path)
+        if rotational is None:
+            return DEFAULT_WORKERS
+        return self.hdd_workers if rotational else self.ssd_workers
+
+    def _workers_for_roots(self, roots: list) -> int:
+        """
+        Число потоков для поиска по нескольким папкам: пул общий, поэтому оно выбирается по самому
+        медленному диску — иначе HDD, искавшийся вместе с SSD, получил бы параллельность SSD.
+        """
+        return min(self._workers_for_path(Path(root)) for root in roots)
+
+    @staticmethod
+    def _group_size(group_key) -> int:
+        return group_key[0] if isinstance(group_key, tuple) else group_key
+
+    def _finish_scan(self, duplicates: dict):
+        if self._checkpoint is not None:
+            self._checkpoint.delete()
+        self.tier_stats['duplicates'] = sum(len(files) for files in duplicates.values())
+        self.logger.info(
+            f"Поиск дубликатов завершен. Файлов: {self.tier_stats['files']}, "
+            f"отсеяно по размеру: {self.tier_stats['size']}, "
+            f"жестких ссылок: {self.tier_stats['hardlinks']}, "
+            f"по быстрой проверке: {self.tier_stats['partial']}, "
+            f"по полному хешу и сравнению: {self.tier_stats['full']}, "
+            f"хешей из кеша: {self.tier_stats['cache_hits']}, "
+            f"можно освободить байт: {self.tier_stats['reclaimable_bytes']}.")
+        self.tier_stats_updated.emit(dict(self.tier_stats))
+        self.hardlinks_found.emit(dict(self.hardlink_sets))
+        self.progress_updated.emit(100)
+        self.duplicates_found.emit(duplicates)
+
+    def hash_record(self, record: FileRecord) -> str:
+        """Полный хеш файла с учетом постоянного кеша; ключ имеет вид 'алгоритм:хеш'."""
+        file_hash = self._cached_hash(record, f"full:{self.full_algorithm}", self._calculate_hash)
+        return f"{self.full_algorithm}:{file_hash}" if file_hash else None
+
+    def _cached_hash(self, record: FileRecord, kind: str, compute_fn) -> str:
+        """
+        Берет хеш из постоянного кеша или вычисляет его и сохраняет в кеш.
+        kind включает имя алгоритма ('full:blake2b'), так что записи разных алгоритмов не пересекаются.
+        """
+        value = self.hash_cache.get(record, kind)
+        if value:
+            with self._stats_lock:
+                self.tier_stats['cache_hits'] = self.tier_stats.get('cache_hits', 0) + 1
+            return value
+        value = compute_fn(record.path)
+        self.hash_cache.put(record, kind, value)
+        return value
+
+    def _partial_hash_for_group(self, record: FileRecord, file_size: int) -> str:
+        return self._cached_hash(record, f"partial:{self.partial_algorithm}",
+                                 lambda path: self._calculate_partial_hash(path, file_size))
+
+    def _calculate_partial_hash(self, filepath: str, file_size: int) -> str:
+        """
+        Хеширует первые и последние PARTIAL_CHUNK_SIZE байт файла, а для больших файлов —
+        еще SAMPLE_COUNT блоков, равномерно распределенных по середине.
+        Небольшие файлы читаются целиком, поэтому при одинаковых алгоритмах частичный хеш совпадает с полным.
+        """
+        hasher = get_hasher(self.partial_algorithm)
+        try:
+            with open(filepath, 'rb', buffering=0) as f:
+                if file_size <= PARTIAL_CHUNK_SIZE * 2:
+                    read_into_hasher(f, hasher, PARTIAL_CHUNK_SIZE * 2)
+                    return hasher.hexdigest()
+
+                read_into_hasher(f, hasher, PARTIAL_CHUNK_SIZE)
+                if file_size > SAMPLE_THRESHOLD:
+                    step = file_size // (SAMPLE_COUNT + 1)
+                    for i in range(1, SAMPLE_COUNT + 1):
+                        f.seek(step * i)
+                        read_into_hasher(f, hasher, PARTIAL_CHUNK_SIZE)
+                f.seek(file_size - PARTIAL_CHUNK_SIZE)
+                read_into_hasher(f, hasher, PARTIAL_CHUNK_SIZE)
             return hasher.hexdigest()
         except (IOError, OSError) as e:
-            self.logger.warning(f"Не удалось прочитать файл для хеширования {filepath.name}: {e}")
-            return None
\ No newline at end of file
+            self.logger.warning(f"Не удалось прочитать файл для быстрой проверки {os.path.basename(filepath)}: {e}")
+            return None
+
+    def _full_hash_for_group(self, record: FileRecord, group_key) -> str:
+        file_size, partial_hash = group_key
+        # Небольшой файл уже прочитан целиком на предыдущем этапе тем же алгоритмом
+        if file_size <= PARTIAL_CHUNK_SIZE * 2 and self.partial_algorithm == self.full_algorithm:
+            return partial_hash
+        return self._cached_hash(record, f"full:{self.full_algorithm}", self._calculate_hash)
+
+    def _calculate_hash(self, filepath: str, block_size: int = None) -> str:
+        """Полный хеш файла; размер блока по умолчанию подбирается под устройство."""
+        try:
+            return hash_file(filepath, get_hasher(self.full_algorithm), block_size, self.control).hexdigest()
+        except (IOError, OSError, ValueError) as e:
+            self.logger.warning(f"Не удалось прочитать файл для хеширования {os.path.basename(filepath)}: {e}")
+            return None
+
+
+class DuplicateScanJob(QObject):
+    """
+    Поиск дубликатов в фоне. Запускается в отдельном QThread через run(); ход и результат
+    приходят сигналами finder, пауза и отмена — через finder.pause/resume/cancel из любого потока.
+    С image_method (ключ IMAGE_HASHERS) ищутся похожие изображения (find_similar_images).
+    """
+    finished = pyqtSignal()
+
+    def __init__(self, finder: DuplicateFinder, folder_path, resume_from_checkpoint: bool = True,
+                 image_method: str = None):
+        super().__init__()
+        self.finder = finder
+        self.folder_path = folder_path
+        self.resume_from_checkpoint = resume_from_checkpoint
+        self.image_method = image_method
+
+    def run(self):
+        try:
+            if self.image_method:
+                self.finder.find_similar_images(self.folder_path, self.image_method)
+            else:
+                self.finder.find_duplicates(self.folder_path, self.resume_from_checkpoint)
+        finally:
+            self.finished.emit()
+
+
+def _as_roots(folder_path) -> list:
+    """
+    Одна папка (str/Path) или список папок -> список реальных путей без повторов.
+    Папки, вложенные в другие из списка, отбрасываются: иначе их файлы обходились бы дважды
+    и каждый выглядел бы жесткой ссылкой на самого себя.
+    """
+    if isinstance(folder_path, (str, os.PathLike)):
+        folder_path = [folder_path]
+    roots = []
+    for path in (os.path.realpath(os.fspath(p)) for p in folder_path):
+        if any(_is_within(path, root) for root in roots):
+            continue
+        roots = [root for root in roots if not _is_within(root, path)]
+        roots.append(path)
+    return roots
+
+
+def _is_within(path: str, root: str) -> bool:
+    """Лежит ли path внутри root или совпадает с ним (пути уже нормализованы realpath)."""
+    path, root = os.path.normcase(path), os.path.normcase(root)
+    return path == root or path.startswith(root.rstrip(os.sep) + os.sep)
+
+
+def walk_files(root: str, logger=None, recursive: bool = True, pending: list = None, on_dir_done=None):
+    """
+    Обходит дерево через os.scandir и по одной отдает записи FileRecord.
+    При recursive=False читается только сама папка root.
+    pending — изменяемая очередь еще не прочитанных папок (для сохранения и продолжения обхода);
+    on_dir_done вызывается после того, как все файлы очередной папки отданы.
+    Используются данные stat из DirEntry, без лишних системных вызовов и объектов Path.
+    Символические ссылки пропускаются: они не занимают места и не являются копиями.
+    """
+    stack = pending if pending is not None else [root]
+    while stack:
+        directory = stack.pop()
+        try:
+            with os.scandir(directory) as it:
+                for entry in it:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            if recursive:
+                                stack.append(entry.path)
+                        elif entry.is_file(follow_symlinks=False):
+                            st = entry.stat(follow_symlinks=False)
+                            yield FileRecord(entry.path, st.st_size, st.st_dev, st.st_ino, st.st_mtime_ns)
+                    except OSError as e:
+                        if logger:
+                            logger.warning(f"Не удалось получить сведения о файле {entry.name}: {e}")
+        except OSError as e:
+            if logger:
+                logger.warning(f"Не удалось прочитать папку {directory}: {e}")
+        if on_dir_done is not None:
+            on_dir_done()
+
+
+def refresh_records(rows):
+    """
+    Перечитывает stat для сохраненных записей ([path, size, dev, ino, mtime_ns]).
+    Исчезнувшие и ставшие не обычными файлами записи отбрасываются.
+    """
+    for row in rows:
+        path = row[0]
+        try:
+            st = os.stat(path, follow_symlinks=False)
+        except OSError:
+            continue
+        if stat.S_ISREG(st.st_mode):
+            yield FileRecord(path, st.st_size, st.st_dev, st.st_ino, st.st_mtime_ns)
+
+
+def with_identity(record: FileRecord) -> FileRecord:
+    """Дополняет запись st_dev/st_ino, если их не вернул DirEntry.stat() (Windows)."""
+    if record.ino:
+        return record
+    try:
+        st = os.stat(record.path, follow_symlinks=False)
+    except OSError:
+        return record
+    return record._replace(dev=st.st_dev, ino=st.st_ino, mtime_ns=st.st_mtime_ns)
+
+
+def is_rotational(path: Path):
+    """
+    Определяет, лежит ли путь на вращающемся диске (HDD).
+    Возвращает True/False или None, если тип диска узнать не удалось.
+    """
+    if os.name == 'nt':
+        return _is_rotational_windows(path)
+    try:
+        st_dev = os.stat(path).st_dev
+        # Для раздела (sda1) флаг лежит у родительского устройства (sda)
+        sys_dev = Path(f"/sys/dev/block/{os.major(st_dev)}:{os.minor(st_dev)}").resolve()
+        for queue_dir in (sys_dev / "queue", sys_dev.parent / "queue"):
+            flag = queue_dir / "rotational"
+            if flag.exists():
+                return flag.read_text().strip() == "1"
+    except (OSError, AttributeError, ValueError):
+        pass
+    return None
+
+
+
+def _is_rotational_windows(path: Path):
+    """
+    Тип диска на Windows: IOCTL_STORAGE_QUERY_PROPERTY с StorageDeviceSeekPenaltyProperty для тома пути.
+    Открытие тома без прав доступа (0) не требует администратора. Для сетевых путей и без pywin32 — None.
+    """
+    if not WIN32FILE_AVAILABLE:
+        return None
+    drive = os.path.splitdrive(os.path.abspath(path))[0]
+    if not drive or drive.startswith('\\\\'):
+        return None
+    try:
+        handle = win32file.CreateFile(f"\\\\.\\{drive}", 0,
+                                      win32file.FILE_SHARE_READ | win32file.FILE_SHARE_WRITE,
+                                      None, win32file.OPEN_EXISTING, 0, None)
+        try:
+            # STORAGE_PROPERTY_QUERY: PropertyId, QueryType, AdditionalParameters[1] (с выравниванием — 12 байт)
+            query = struct.pack('<IIxxxx', STORAGE_DEVICE_SEEK_PENALTY_PROPERTY, PROPERTY_STANDARD_QUERY)
+            # DEVICE_SEEK_PENALTY_DESCRIPTOR: Version, Size, IncursSeekPenalty
+            output = win32file.DeviceIoControl(handle, IOCTL_STORAGE_QUERY_PROPERTY, query, 12)
+        finally:
+            handle.Close()
+        if len(output) < 9:
+            return None
+        return bool(struct.unpack_from('<IIB', output)[2])
+    except pywintypes.error:
+        return None
+
+
+if __name__ == "__main__":
+    import sys
+    from core.duplicate_report import main
+
+    sys.exit(main())
@@ -0,0 +1,180 @@
+# core/file_types.py
+"""
+Определение типа файла по содержимому (сигнатурам), а не по расширению.
+
+Сигнатуры с нулевого смещения собраны в префиксное дерево: начало файла проходится по дереву
+один раз, и кандидатами становятся все сигнатуры, которые оно встретило по пути; побеждает
+самая длинная из подтвержденных. Сигнатуры на другом смещении (ftyp в MP4, ustar в tar)
+проверяются отдельно, если дерево ничего не нашло.
+Читается не больше SNIFF_SIZE байт; результат кэшируется по (том, inode, mtime, размер).
+"""
+import struct
+import threading
+from collections import OrderedDict
+
+# Сколько байт начала файла читается для определения типа (tar проверяется по смещению 257)
+SNIFF_SIZE = 512
+SNIFF_CACHE_SIZE = 4096
+
+# Более общий тип для составных форматов: условие "zip" выполняется и для docx
+TYPE_PARENTS = {'ooxml': 'zip', 'epub': 'zip', 'webm': 'mkv', 'mov': 'mp4'}
+
+
+def _riff(kind: bytes):
+    return lambda head: head[8:12] == kind
+
+
+def _zip_member(name: bytes):
+    # Имя первой записи локального заголовка ZIP начинается со смещения 30
+    return lambda head: head[30:30 + len(name)] == name
+
+
+def _is_pe(head: bytes) -> bool:
+    # Для PE-файла e_lfanew (смещение 0x3C) указывает на сигнатуру 'PE\0\0'; если она дальше
+    # прочитанного, остается довольствоваться заголовком MZ
+    if len(head) < 0x40:
+        return True
+    offset = struct.unpack_from('<I', head, 0x3C)[0]
+    if offset + 4 > len(head):
+        return True
+    return head[offset:offset + 4] == b'PE\0\0'
+
+
+# (тип, сигнатура с нулевого смещения, дополнительная проверка или None)
+SIGNATURES = [
+    ('pdf', b'%PDF-', None),
+    ('zip', b'PK\x03\x04', None),
+    ('zip', b'PK\x05\x06', None),
+    ('ooxml', b'PK\x03\x04', _zip_member(b'[Content_Types].xml')),
+    ('epub', b'PK\x03\x04', _zip_member(b'mimetypeapplication/epub+zip')),
+    ('png', b'\x89PNG\r\n\x1a\n', None),
+    ('jpeg', b'\xff\xd8\xff', None),
+    ('gif', b'GIF87a', None),
+    ('gif', b'GIF89a', None),
+    ('webp', b'RIFF', _riff(b'WEBP')),
+    ('avi', b'RIFF', _riff(b'AVI ')),
+    ('wav', b'RIFF', _riff(b'WAVE')),
+    ('bmp', b'BM', lambda head: len(head) >= 14 and head[6:10] == b'\0\0\0\0'),
+    ('tiff', b'II*\x00', None),
+    ('tiff', b'MM\x00*', None),
+    ('exe', b'MZ', _is_pe),
+    ('elf', b'\x7fELF', None),
+    ('ole', b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1', None),
+    ('mkv', b'\x1a\x45\xdf\xa3', None),
+    ('webm', b'\x1a\x45\xdf\xa3', lambda head: b'webm' in head[:64]),
+    ('mp3', b'ID3', None),
+    ('mp3', b'\xff\xfb', None),
+    ('ogg', b'OggS', None),
+    ('flac', b'fLaC', None),
+    ('7z', b"7z\xbc\xaf'\x1c", None),
+    ('rar', b'Rar!\x1a\x07', None),
+    ('gzip', b'\x1f\x8b', None),
+    ('bzip2', b'BZh', None),
+    ('xz', b'\xfd7zXZ\x00', None),
+    ('rtf', b'{\\rtf', None),
+    ('sqlite', b'SQLite format 3\x00', None),
+]
+
+# (тип, смещение, сигнатура, дополнительная проверка или None)
+OFFSET_SIGNATURES = [
+    ('mov', 4, b'ftypqt  ', None),
+    ('mp4', 4, b'ftyp', None),
+    ('tar', 257, b'ustar', None),
+]
+
+CONTENT_TYPES = frozenset(t for t, _, _ in SIGNATURES) | frozenset(t for t, _, _, _ in OFFSET_SIGNATURES)
+
+
+class SignatureTrie:
+    """Префиксное дерево сигнатур: узел — словарь байт -> узел, в ключе None — сигнатуры, кончающиеся здесь."""
+
+    def __init__(self, signatures: list):
+        self.root = {}
+        for content_type, prefix, check in signatures:
+            node = self.root
+            for byte in prefix:
+                node = node.setdefault(byte, {})
+            node.setdefault(None, []).append((content_type, check))
+
+    def detect(self, head: bytes):
+        """Тип по самой длинной подтвержденной сигнатуре или None."""
+        found = None
+        node = self.root
+        for byte in head:
+            node = node.get(byte)
+            if node is None:
+                break
+            for content_type, check in node.get(None, ()):
+                # Более длинная сигнатура (и более поздняя для той же длины) уточняет тип
+                if check is None or check(head):
+                    found = content_type
+        return found
+
+
+_TRIE = SignatureTrie(SIGNATURES)
+
+
+def detect_content_type(head: bytes):
+    """Тип содержимого по первым байтам файла или None, если он не распознан."""
+    content_type = _TRIE.detect(head)
+    if content_type is not None:
+        return content_type
+    for content_type, offset, signature, check in OFFSET_SIGNATURES:
+        if head[offset:offset + len(signature)] == signature and (check is None or check(head)):
+            return content_type
+    return None
+
+
+def type_matches(content_type, wanted: str) -> bool:
+    """Совпадает ли тип с искомым с учетом общих типов (docx — это тоже zip)."""
+    while content_type is not None:
+        if content_type == wanted:
+            return True
+        content_type = TYPE_PARENTS.get(content_type)
+    return False
+
+
+class ContentTypeCache:
+    """LRU-кэш типов по (st_dev, st_ino, st_mtime_ns, st_size); доступен из нескольких потоков."""
+    MISSING = object()
+
+    def __init__(self, max_size: int = SNIFF_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(path: str, stat_result):
+        # В stat из DirEntry на Windows inode не заполнен — тогда файл узнается по пути
+        identity = stat_result.st_ino or path
+        return stat_result.st_dev, identity, stat_result.st_mtime_ns, stat_result.st_size
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key, self.MISSING)
+            if value is not self.MISSING:
+                self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, value) -> None:
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+
+_cache = ContentTypeCache()
+
+
+def content_type_of(ctx):
+    """Тип содержимого файла из FileContext: сначала кэш, затем чтение не больше SNIFF_SIZE байт."""
+    st = ctx.stat
+    if st is None:
+        return None
+    key = ContentTypeCache.key(ctx.path, st)
+    content_type = _cache.get(key)
+    if content_type is ContentTypeCache.MISSING:
+        content_type = detect_content_type(ctx.head(SNIFF_SIZE))
+        _cache.put(key, content_type)
+    return content_type
@@ -0,0 +1,53 @@
+# core/hash_benchmark.py
+"""
+Замер пропускной способности хеширования: последовательный проход против пула потоков.
+
+Запуск: python -m core.hash_benchmark <папка> [число_потоков ...]
+Кеш хешей не используется, считается чистое чтение и хеширование. Повторный прогон
+читает файлы из кеша страниц ОС, поэтому для честного сравнения с диском нужна папка
+больше объема свободной памяти или сброс кеша между прогонами.
+"""
+import sys
+import time
+
+from .duplicates import DuplicateFinder, walk_files
+
+
+def run_benchmark(folder: str, worker_counts=(1, 2, 4, 8)) -> list:
+    """
+    Хеширует все файлы папки полным хешем с каждым числом потоков из worker_counts.
+    Возвращает список словарей: workers, seconds, mb_per_s, files_per_s.
+    """
+    records = list(walk_files(folder))
+    total_bytes = sum(r.size for r in records)
+    results = []
+    for workers in worker_counts:
+        finder = DuplicateFinder(workers=workers)
+        finder._active_workers = workers
+        started = time.perf_counter()
+        for _ in finder._map_ordered(lambda r: finder._calculate_hash(r.path), records):
+            pass
+        elapsed = max(time.perf_counter() - started, 1e-9)
+        results.append({
+            'workers': workers,
+            'seconds': elapsed,
+            'mb_per_s': total_bytes / (1024 * 1024) / elapsed,
+            'files_per_s': len(records) / elapsed,
+        })
+    return results
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv:
+        print("Использование: python -m core.hash_benchmark <папка> [число_потоков ...]")
+        return 2
+    worker_counts = [int(x) for x in argv[1:]] or [1, 2, 4, 8]
+    print(f"{'Потоки':>7} {'Время, с':>10} {'МБ/с':>10} {'Файлов/с':>10}")
+    for row in run_benchmark(argv[0], worker_counts):
+        print(f"{row['workers']:>7} {row['seconds']:>10.2f} {row['mb_per_s']:>10.1f} {row['files_per_s']:>10.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
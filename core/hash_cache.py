@@ -0,0 +1,119 @@
+# core/hash_cache.py
+import logging
+import sqlite3
+import threading
+from pathlib import Path
+
+from .utils import DATA_DIR
+
+CACHE_PATH = DATA_DIR / "cache" / "hashes.sqlite"
+DEFAULT_MAX_ENTRIES = 1_000_000
+
+
+class HashCache:
+    """
+    Постоянный кеш хешей содержимого файлов.
+    Ключ — идентичность файла (st_dev, st_ino, st_size, st_mtime_ns) и вид хеша вместе
+    с алгоритмом ('partial:blake2b_128', 'full:blake2b'), поэтому при любом изменении файла
+    запись просто перестает совпадать. Записи без номера inode не кешируются.
+    Размер кеша ограничен max_entries, лишние записи вытесняются по давности использования (LRU).
+    """
+
+    def __init__(self, db_path: Path = CACHE_PATH, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.logger = logging.getLogger(__name__)
+        self.db_path = Path(db_path)
+        self.max_entries = max_entries
+        self._conn = None
+        self._lock = threading.Lock()
+        self._clock = 0
+        self._touched = []
+        self._pending = []
+
+    def open(self) -> bool:
+        if self._conn is not None:
+            return True
+        try:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS hashes ("
+                " dev INTEGER, ino INTEGER, size INTEGER, mtime_ns INTEGER, kind TEXT,"
+                " value TEXT NOT NULL, last_used INTEGER NOT NULL,"
+                " PRIMARY KEY (dev, ino, size, mtime_ns, kind)) WITHOUT ROWID")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_hashes_last_used ON hashes(last_used)")
+            row = conn.execute("SELECT MAX(last_used) FROM hashes").fetchone()
+            self._clock = row[0] or 0
+            self._conn = conn
+            return True
+        except sqlite3.Error as e:
+            self.logger.warning(f"Не удалось открыть кеш хешей {self.db_path}: {e}. Кеш отключен.")
+            self._conn = None
+            return False
+
+    def get(self, record, kind: str):
+        """Возвращает сохраненный хеш для записи о файле или None."""
+        if self._conn is None or not record.ino:
+            return None
+        key = (record.dev, record.ino, record.size, record.mtime_ns, kind)
+        with self._lock:
+            try:
+                row = self._conn.execute(
+                    "SELECT value FROM hashes WHERE dev=? AND ino=? AND size=? AND mtime_ns=? AND kind=?",
+                    key).fetchone()
+            except sqlite3.Error as e:
+                self.logger.warning(f"Ошибка чтения кеша хешей: {e}")
+                return None
+            if row is None:
+                return None
+            self._touched.append(key)
+            return row[0]
+
+    def put(self, record, kind: str, value: str) -> None:
+        if self._conn is None or not record.ino or not value:
+            return
+        with self._lock:
+            self._pending.append((record.dev, record.ino, record.size, record.mtime_ns, kind, value))
+
+    def flush(self) -> None:
+        """Записывает накопленные хеши, обновляет отметки использования и вытесняет старые записи."""
+        if self._conn is None:
+            return
+        with self._lock:
+            # Нечего записывать — незачем и считать записи для вытеснения
+            if not self._pending and not self._touched:
+                return
+            self._clock += 1
+            try:
+                with self._conn:
+                    if self._pending:
+                        self._conn.executemany(
+                            "INSERT OR REPLACE INTO hashes VALUES (?, ?, ?, ?, ?, ?, ?)",
+                            [(*row, self._clock) for row in self._pending])
+                    if self._touched:
+                        self._conn.executemany(
+                            "UPDATE hashes SET last_used=? WHERE dev=? AND ino=? AND size=? AND mtime_ns=? AND kind=?",
+                            [(self._clock, *key) for key in self._touched])
+                    self._evict()
+            except sqlite3.Error as e:
+                self.logger.warning(f"Ошибка записи кеша хешей: {e}")
+            self._pending.clear()
+            self._touched.clear()
+
+    def _evict(self) -> None:
+        count = self._conn.execute("SELECT COUNT(*) FROM hashes").fetchone()[0]
+        excess = count - self.max_entries
+        if excess > 0:
+            self._conn.execute(
+                "DELETE FROM hashes WHERE (dev, ino, size, mtime_ns, kind) IN ("
+                " SELECT dev, ino, size, mtime_ns, kind FROM hashes ORDER BY last_used LIMIT ?)",
+                (excess,))
+            self.logger.info(f"Из кеша хешей вытеснено записей: {excess}.")
+
+    def close(self) -> None:
+        if self._conn is None:
+            return
+        self.flush()
+        self._conn.close()
+        self._conn = None
@@ -0,0 +1,174 @@
+# core/hash_io.py
+import mmap
+import os
+import threading
+
+# Границы автоматически подбираемого размера блока чтения
+MIN_BLOCK_SIZE = 64 * 1024
+MAX_BLOCK_SIZE = 1024 * 1024
+# Файлы больше этого порога хешируются через mmap
+MMAP_THRESHOLD = 64 * 1024 * 1024
+# После чтения файлов больше этого порога их страницы выбрасываются из кеша ОС,
+# чтобы большой поиск не вытеснял данные, нужные остальным программам
+DROP_CACHE_THRESHOLD = 8 * 1024 * 1024
+
+FADVISE_AVAILABLE = hasattr(os, 'posix_fadvise')
+
+# У каждого потока хеширования свой переиспользуемый буфер
+_local = threading.local()
+
+
+def block_size_for(st) -> int:
+    """Размер блока по предпочтительному размеру ввода-вывода устройства (st_blksize)."""
+    preferred = getattr(st, 'st_blksize', 0) or 4096
+    return max(MIN_BLOCK_SIZE, min(MAX_BLOCK_SIZE, preferred * 64))
+
+
+def _buffer(size: int) -> memoryview:
+    buf = getattr(_local, 'buffer', None)
+    if buf is None or len(buf) < size:
+        buf = bytearray(size)
+        _local.buffer = buf
+    return memoryview(buf)[:size]
+
+
+def _advise(fd: int, advice_name: str, offset: int = 0, length: int = 0) -> None:
+    if not FADVISE_AVAILABLE:
+        return
+    try:
+        os.posix_fadvise(fd, offset, length, getattr(os, advice_name))
+    except (OSError, AttributeError):
+        pass
+
+
+def hash_file(path, hasher, block_size: int = None, control=None):
+    """
+    Передает содержимое файла в hasher без создания нового bytes на каждый блок.
+    Крупные файлы отображаются в память (mmap), остальные читаются через readinto
+    в переиспользуемый буфер. Возвращает тот же hasher.
+    control (ScanControl) проверяется между блоками: на паузе чтение ждет, при отмене — ScanCancelled.
+    """
+    with open(path, 'rb', buffering=0) as f:
+        fd = f.fileno()
+        st = os.fstat(fd)
+        file_size = st.st_size
+        block_size = block_size or block_size_for(st)
+
+        _advise(fd, 'POSIX_FADV_SEQUENTIAL')
+        _advise(fd, 'POSIX_FADV_NOREUSE')
+
+        if file_size >= MMAP_THRESHOLD:
+            with mmap.mmap(fd, 0, access=mmap.ACCESS_READ) as mm:
+                if hasattr(mm, 'madvise') and hasattr(mmap, 'MADV_SEQUENTIAL'):
+                    mm.madvise(mmap.MADV_SEQUENTIAL)
+                view = memoryview(mm)
+                try:
+                    for offset in range(0, file_size, block_size):
+                        if control is not None:
+                            control.check()
+                        hasher.update(view[offset:offset + block_size])
+                finally:
+                    view.release()
+        else:
+            buf = _buffer(block_size)
+            while True:
+                if control is not None:
+                    control.check()
+                n = f.readinto(buf)
+                if not n:
+                    break
+                hasher.update(buf[:n])
+
+        if file_size >= DROP_CACHE_THRESHOLD:
+            _advise(fd, 'POSIX_FADV_DONTNEED')
+    return hasher
+
+
+def read_into_hasher(f, hasher, length: int) -> None:
+    """Читает не более length байт из текущей позиции открытого файла прямо в hasher."""
+    buf = _buffer(length)
+    filled = 0
+    while filled < length:
+        n = f.readinto(buf[filled:])
+        if not n:
+            break
+        filled += n
+    if filled:
+        hasher.update(buf[:filled])
+
+
+def compare_files_lockstep(paths: list, file_size: int, new_hasher=None, first_chunk: int = MIN_BLOCK_SIZE,
+                           max_chunk: int = MAX_BLOCK_SIZE, control=None) -> list:
+    """
+    Побайтно сравнивает файлы одного размера, читая их одновременно блоками.
+    Группа делится, как только содержимое расходится, и разошедшиеся файлы дальше не читаются,
+    поэтому различия в начале файла обнаруживаются после первого блока. Блок растет от first_chunk
+    до max_chunk: ранние расхождения дешевы, а на длинных совпадающих участках мало вызовов.
+    Если передан new_hasher (фабрика объекта с update/copy/hexdigest), прочитанные блоки попутно
+    хешируются: у совпадающих файлов содержимое общее, поэтому хешируется один экземпляр данных
+    на группу и только пока группа жива; копия состояния нужна, лишь когда группа делится на
+    несколько частей по 2+ файла (при 2-3 файлах такого не бывает). Без new_hasher хеш не считается.
+    Возвращает пары (индексы paths с одинаковым содержимым, полный хеш или None) для групп из 2+ файлов.
+    control (ScanControl) проверяется между блоками, как в hash_file.
+    Бросает OSError, если файл не удалось открыть или прочитать.
+    """
+    files = []
+    try:
+        for path in paths:
+            f = open(path, 'rb', buffering=0)
+            files.append(f)
+            _advise(f.fileno(), 'POSIX_FADV_SEQUENTIAL')
+        buffers = []
+        groups = [(list(range(len(paths))), new_hasher() if new_hasher is not None else None)]
+        chunk = first_chunk
+        offset = 0
+        while groups and offset < file_size:
+            if control is not None:
+                control.check()
+            length = min(chunk, file_size - offset)
+            if not buffers or len(buffers[0]) != length:
+                # Буферы ровно по длине блока: bytearray сравниваются целиком через memcmp, без срезов
+                buffers = [bytearray(length) for _ in paths]
+            next_groups = []
+            truncated = set()
+            for group, hasher in groups:
+                for i in group:
+                    view = memoryview(buffers[i])
+                    filled = 0
+                    while filled < length:
+                        n = files[i].readinto(view[filled:])
+                        if not n:
+                            break
+                        filled += n
+                    if filled < length:
+                        # Файл укоротился во время поиска: дубликатом он уже не является
+                        truncated.add(i)
+                buckets = []
+                for i in group:
+                    if i in truncated:
+                        continue
+                    for bucket in buckets:
+                        if buffers[bucket[0]] == buffers[i]:
+                            bucket.append(i)
+                            break
+                    else:
+                        buckets.append([i])
+                buckets = [bucket for bucket in buckets if len(bucket) > 1]
+                if hasher is None:
+                    next_groups.extend((bucket, None) for bucket in buckets)
+                    continue
+                # Копии снимаются до update: все части группы продолжают с одного состояния
+                hashers = [hasher] + [hasher.copy() for _ in buckets[1:]]
+                for bucket, bucket_hasher in zip(buckets, hashers):
+                    bucket_hasher.update(buffers[bucket[0]])
+                    next_groups.append((bucket, bucket_hasher))
+            groups = next_groups
+            offset += length
+            chunk = min(chunk * 2, max_chunk)
+        if file_size >= DROP_CACHE_THRESHOLD:
+            for f in files:
+                _advise(f.fileno(), 'POSIX_FADV_DONTNEED')
+        return [(group, hasher.hexdigest() if hasher is not None else None) for group, hasher in groups]
+    finally:
+        for f in files:
+            f.close()
@@ -0,0 +1,42 @@
+# core/hashers.py
+import hashlib
+
+try:
+    import xxhash
+
+    XXHASH_AVAILABLE = True
+except ImportError:
+    XXHASH_AVAILABLE = False
+
+# Реестр алгоритмов: имя -> фабрика объекта с методами update(), copy() и hexdigest()
+HASHERS = {}
+
+
+def register_hasher(name: str, factory) -> None:
+    HASHERS[name] = factory
+
+
+def get_hasher(name: str):
+    """Создает новый объект хеширования по имени алгоритма."""
+    try:
+        return HASHERS[name]()
+    except KeyError:
+        raise ValueError(f"Неизвестный алгоритм хеширования: {name}") from None
+
+
+def available_hashers() -> list:
+    return sorted(HASHERS)
+
+
+register_hasher('md5', hashlib.md5)
+register_hasher('sha256', hashlib.sha256)
+register_hasher('blake2b', lambda: hashlib.blake2b(digest_size=32))
+register_hasher('blake2b_128', lambda: hashlib.blake2b(digest_size=16))
+if XXHASH_AVAILABLE:
+    register_hasher('xxh3_128', xxhash.xxh3_128)
+
+# Итоговое подтверждение дубликатов требует стойкости к коллизиям
+DEFAULT_FULL_ALGORITHM = 'blake2b'
+# Для предварительных этапов достаточно быстрого некриптографического 128-битного хеша;
+# без пакета xxhash используется укороченный blake2b, он все равно быстрее md5
+FAST_ALGORITHM = 'xxh3_128' if XXHASH_AVAILABLE else 'blake2b_128'
@@ -0,0 +1,155 @@
+# core/image_similarity.py
+import math
+import logging
+
+try:
+    from PIL import Image
+
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.bmp', '.gif', '.webp', '.tif', '.tiff'}
+HASH_BITS = 64
+
+logger = logging.getLogger(__name__)
+
+
+def _bits_to_int(bits) -> int:
+    value = 0
+    for bit in bits:
+        value = (value << 1) | bool(bit)
+    return value
+
+
+def _load_gray(path: str, size):
+    """Открывает изображение и уменьшает его до size в оттенках серого."""
+    with Image.open(path) as img:
+        # Для JPEG draft декодирует сразу уменьшенную копию, это в разы быстрее полного декодирования
+        img.draft('L', (size[0] * 4, size[1] * 4))
+        return list(img.convert('L').resize(size, Image.LANCZOS).getdata())
+
+
+def average_hash(path: str) -> int:
+    pixels = _load_gray(path, (8, 8))
+    mean = sum(pixels) / len(pixels)
+    return _bits_to_int(p > mean for p in pixels)
+
+
+def difference_hash(path: str) -> int:
+    pixels = _load_gray(path, (9, 8))
+    return _bits_to_int(pixels[row * 9 + col] > pixels[row * 9 + col + 1]
+                        for row in range(8) for col in range(8))
+
+
+# Косинусы для DCT 32x32; нужны только первые 8 частот
+_DCT_SIZE = 32
+_DCT_COS = [[math.cos(math.pi * (2 * x + 1) * u / (2 * _DCT_SIZE)) for x in range(_DCT_SIZE)] for u in range(8)]
+
+
+def perceptual_hash(path: str) -> int:
+    """pHash: низкочастотные коэффициенты DCT 8x8 сравниваются с их медианой."""
+    pixels = _load_gray(path, (_DCT_SIZE, _DCT_SIZE))
+    rows = [pixels[y * _DCT_SIZE:(y + 1) * _DCT_SIZE] for y in range(_DCT_SIZE)]
+    # Сначала DCT по строкам (8 частот), затем по столбцам
+    row_dct = [[sum(c * v for c, v in zip(_DCT_COS[u], row)) for u in range(8)] for row in rows]
+    coeffs = [sum(_DCT_COS[v][y] * row_dct[y][u] for y in range(_DCT_SIZE)) for v in range(8) for u in range(8)]
+    # Постоянная составляющая (0, 0) сильно отличается от остальных и в медиану не входит
+    median = sorted(coeffs[1:])[len(coeffs[1:]) // 2]
+    return _bits_to_int(c > median for c in coeffs)
+
+
+IMAGE_HASHERS = {
+    'ahash': average_hash,
+    'dhash': difference_hash,
+    'phash': perceptual_hash,
+}
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count('1')
+
+
+def similarity_to_distance(similarity_percent: int) -> int:
+    """Переводит порог схожести в процентах в максимальное расстояние Хэмминга."""
+    return int(round(HASH_BITS * (100 - similarity_percent) / 100))
+
+
+class BKTree:
+    """BK-дерево по расстоянию Хэмминга: поиск всех хешей в радиусе без полного перебора."""
+
+    def __init__(self):
+        self.root = None
+        self.size = 0
+
+    def add(self, value: int, item) -> None:
+        self.size += 1
+        if self.root is None:
+            self.root = (value, [item], {})
+            return
+        node = self.root
+        while True:
+            node_value, items, children = node
+            distance = hamming(value, node_value)
+            if distance == 0:
+                items.append(item)
+                return
+            child = children.get(distance)
+            if child is None:
+                children[distance] = (value, [item], {})
+                return
+            node = child
+
+    def search(self, value: int, radius: int) -> list:
+        """Возвращает [(расстояние, элемент)] для всех элементов не дальше radius."""
+        found = []
+        if self.root is None:
+            return found
+        stack = [self.root]
+        while stack:
+            node_value, items, children = stack.pop()
+            distance = hamming(value, node_value)
+            if distance <= radius:
+                found.extend((distance, item) for item in items)
+            for child_distance in range(max(distance - radius, 1), distance + radius + 1):
+                child = children.get(child_distance)
+                if child is not None:
+                    stack.append(child)
+        return found
+
+
+class ImageHashIndex:
+    """Перцептивные хеши изображений с BK-деревом для запросов по радиусу Хэмминга."""
+
+    def __init__(self, method: str = 'dhash'):
+        self.method = method
+        self.hashes = {}
+        self.tree = BKTree()
+
+    def add(self, path: str, image_hash: int) -> None:
+        self.hashes[path] = image_hash
+        self.tree.add(image_hash, path)
+
+    def clusters(self, max_distance: int) -> list:
+        """
+        Объединяет изображения, связанные цепочкой пар с расстоянием не больше max_distance.
+        Возвращает список кластеров из 2+ путей, крупные кластеры первыми.
+        """
+        parent = {path: path for path in self.hashes}
+
+        def find(path):
+            while parent[path] != path:
+                parent[path] = parent[parent[path]]
+                path = parent[path]
+            return path
+
+        for path, image_hash in self.hashes.items():
+            for _, other in self.tree.search(image_hash, max_distance):
+                root_a, root_b = find(path), find(other)
+                if root_a != root_b:
+                    parent[root_b] = root_a
+
+        groups = {}
+        for path in self.hashes:
+            groups.setdefault(find(path), []).append(path)
+        return sorted((sorted(g) for g in groups.values() if len(g) > 1), key=len, reverse=True)
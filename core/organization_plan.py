@@ -0,0 +1,215 @@
+# core/organization_plan.py
+"""
+План организации рабочего стола: что будет сделано с каждым файлом, до того как что-либо сделано.
+
+Планирование только классифицирует файлы и вычисляет цели (пути ярлыков), не трогая диск,
+поэтому план можно показать пользователю и выполнить позже. Выполнение ведет журнал
+(строка JSON на операцию), а выполненные операции образуют запись для UndoManager.
+Прерванный план (unfinished) загружается с применением журнала и довыполняется с места остановки.
+"""
+import json
+import uuid
+import logging
+import threading
+from datetime import datetime
+from pathlib import Path
+
+from .utils import DATA_DIR
+
+try:
+    import win32api, win32con
+    import pywintypes
+
+    WIN32_AVAILABLE = True
+except ImportError:
+    WIN32_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+PLANS_DIR = DATA_DIR / "plans"
+# Сколько последних планов (с журналами) хранить
+PLANS_KEEP = 20
+
+OP_PENDING = 'pending'
+OP_DONE = 'done'
+OP_SKIPPED = 'skipped'
+OP_FAILED = 'failed'
+
+
+def shortcut_target(src_path: Path, action: dict):
+    """Путь ярлыка, который создаст действие assign_to_box, или None для других действий."""
+    if action.get("type") != "assign_to_box" or not action.get("box_id"):
+        return None
+    return str(DATA_DIR / "Shortcuts" / action["box_id"] / f"{src_path.stem}.lnk")
+
+
+class PlannedOperation:
+    __slots__ = ('source', 'action', 'rule', 'target', 'status', 'result', 'error')
+
+    def __init__(self, source: str, action: dict, rule: str = "", target: str = None,
+                 status: str = OP_PENDING, result: dict = None, error: str = None):
+        self.source = source
+        self.action = action
+        self.rule = rule
+        # Операции с одной целью выполняются строго по порядку плана
+        self.target = target
+        self.status = status
+        # Запись о выполненном действии в формате истории отмены
+        self.result = result
+        self.error = error
+
+    def describe(self) -> str:
+        action_type = self.action.get("type")
+        if action_type == "assign_to_box":
+            what = f"в ящик '{self.action.get('box_id')}'"
+        elif action_type == "move_to":
+            what = f"в папку '{self.action.get('path')}'"
+        else:
+            what = f"действие '{action_type}'"
+        return f"{Path(self.source).name} → {what} (правило '{self.rule}')"
+
+    def to_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "PlannedOperation":
+        return cls(**{name: data.get(name) for name in cls.__slots__ if name in data})
+
+
+class OrganizationPlan:
+    def __init__(self, desktop: str, operations: list = None, plan_id: str = None, created: str = None):
+        self.desktop = desktop
+        self.operations = operations if operations is not None else []
+        self.plan_id = plan_id or f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:6]}"
+        self.created = created or datetime.now().isoformat(timespec='seconds')
+
+    def __len__(self):
+        return len(self.operations)
+
+    def describe(self) -> list:
+        return [op.describe() for op in self.operations]
+
+    def counts(self) -> dict:
+        counts = {OP_PENDING: 0, OP_DONE: 0, OP_SKIPPED: 0, OP_FAILED: 0}
+        for op in self.operations:
+            counts[op.status] = counts.get(op.status, 0) + 1
+        return counts
+
+    def groups_by_target(self) -> list:
+        """
+        Невыполненные операции, сгруппированные по цели: группы независимы и могут выполняться
+        параллельно, внутри группы порядок плана сохраняется. Операции без цели — по одной в группе.
+        """
+        groups = {}
+        for index, op in enumerate(self.operations):
+            if op.status == OP_DONE:
+                continue
+            key = op.target.lower() if op.target else index
+            groups.setdefault(key, []).append(index)
+        return list(groups.values())
+
+    def undo_record(self, indices: list) -> dict:
+        """Запись для UndoManager из операций с данными индексами, которые выполнены."""
+        operations = (self.operations[index] for index in indices)
+        return {'type': 'organize', 'plan_id': self.plan_id,
+                'moved_files': [op.result for op in operations if op.status == OP_DONE and op.result]}
+
+    def to_dict(self) -> dict:
+        return {'plan_id': self.plan_id, 'desktop': self.desktop, 'created': self.created,
+                'operations': [op.to_dict() for op in self.operations]}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "OrganizationPlan":
+        return cls(data['desktop'], [PlannedOperation.from_dict(op) for op in data.get('operations', [])],
+                   data.get('plan_id'), data.get('created'))
+
+    @property
+    def path(self) -> Path:
+        return PLANS_DIR / f"{self.plan_id}.json"
+
+    @property
+    def journal_path(self) -> Path:
+        return PLANS_DIR / f"{self.plan_id}.journal"
+
+    def save(self) -> Path:
+        PLANS_DIR.mkdir(parents=True, exist_ok=True)
+        with open(self.path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, indent=4, ensure_ascii=False)
+        # Имена начинаются с даты, поэтому сортировка по имени — по времени создания
+        for old_plan in sorted(PLANS_DIR.glob("*.json"))[:-PLANS_KEEP]:
+            old_plan.unlink(missing_ok=True)
+            old_plan.with_suffix(".journal").unlink(missing_ok=True)
+        return self.path
+
+    @classmethod
+    def load(cls, path) -> "OrganizationPlan":
+        """Загружает план и применяет к нему журнал: уже выполненные операции не повторяются."""
+        with open(path, 'r', encoding='utf-8') as f:
+            plan = cls.from_dict(json.load(f))
+        for entry in PlanJournal.read(plan.journal_path):
+            op = plan.operations[entry['index']]
+            op.status, op.result, op.error = entry['status'], entry.get('result'), entry.get('error')
+        return plan
+
+    @classmethod
+    def unfinished(cls) -> list:
+        """Сохраненные планы, в которых после применения журнала остались невыполненные операции; новые первыми."""
+        plans = []
+        for path in sorted(PLANS_DIR.glob("*.json"), reverse=True):
+            try:
+                plan = cls.load(path)
+            except (OSError, ValueError, KeyError, IndexError, TypeError) as e:
+                logger.warning(f"Не удалось загрузить план {path.name}: {e}")
+                continue
+            if plan.counts()[OP_PENDING]:
+                plans.append(plan)
+        return plans
+
+    def discard(self) -> None:
+        """Удаляет сохраненный план вместе с журналом (например, если продолжать его не нужно)."""
+        self.path.unlink(missing_ok=True)
+        self.journal_path.unlink(missing_ok=True)
+
+
+class PlanJournal:
+    """Журнал выполнения плана: строка JSON на завершенную операцию, пишется сразу и из разных потоков."""
+
+    def __init__(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(path, 'a', encoding='utf-8')
+        self._lock = threading.Lock()
+
+    def record(self, index: int, op: PlannedOperation) -> None:
+        line = json.dumps({'index': index, 'status': op.status, 'result': op.result, 'error': op.error},
+                          ensure_ascii=False)
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+
+    def close(self) -> None:
+        self._file.close()
+
+    @staticmethod
+    def read(path: Path) -> list:
+        if not path.exists():
+            return []
+        entries = []
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # Последняя строка могла не дописаться при аварийном завершении
+                    break
+        return entries
+
+
+def revert_assignment(original: str, shortcut: str) -> None:
+    """Отмена назначения в ящик: ярлык удаляется, исходный файл снова становится видимым."""
+    if WIN32_AVAILABLE and Path(original).exists():
+        try:
+            attrs = win32api.GetFileAttributes(original)
+            win32api.SetFileAttributes(original, attrs & ~win32con.FILE_ATTRIBUTE_HIDDEN)
+        except pywintypes.error as e:
+            logger.warning(f"Не удалось сделать видимым файл '{original}': {e}")
+    Path(shortcut).unlink(missing_ok=True)
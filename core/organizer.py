@@ -1,22 +1,33 @@
 # Файл: core/organizer.py
+import os
+import stat
 import shutil
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 from PyQt5.QtCore import QObject, pyqtSignal
 from .classifier import FileClassifier
-from .utils import get_all_desktop_paths, DATA_DIR
+from .organization_plan import (OrganizationPlan, PlannedOperation, PlanJournal, shortcut_target,
+                                OP_DONE, OP_FAILED, OP_PENDING, OP_SKIPPED)
+from .scan_checkpoint import ScanControl
+from .utils import get_all_desktop_paths
 
 try:
     import win32com.client
     import win32api, win32con
     # --- ИЗМЕНЕНИЕ: Импортируем класс ошибки, чтобы ее можно было "поймать" ---
     import pywintypes
+    import pythoncom
 
     WIN32_AVAILABLE = True
 except ImportError:
     WIN32_AVAILABLE = False
 
+# Сколько потоков выполняет план организации
+PLAN_WORKERS = 4
+
 
 class DesktopOrganizer(QObject):
     progress_updated = pyqtSignal(int)
@@ -33,64 +44,164 @@ class DesktopOrganizer(QObject):
         self.desktop_path = Path(all_desktops[0]) if all_desktops else None
         self.auto_organize = True
 
-    def organize_all_desktops(self):
+    def organize_all_desktops(self, control: ScanControl = None):
         if not self.desktop_path:
             msg = "Рабочий стол не найден. Организация отменена."
             self.logger.warning(msg)
             self.organization_completed.emit(msg)
             return
-        self.organize_single_desktop(self.desktop_path)
+        self.organize_single_desktop(self.desktop_path, control)
 
-    def organize_single_desktop(self, desktop_path: Path):
+    def organize_single_desktop(self, desktop_path: Path, control: ScanControl = None):
         try:
             if not desktop_path.is_dir():
                 self.logger.error(f"Директория рабочего стола не найдена: {desktop_path}")
                 return
 
-            # --- ИЗМЕНЕНИЕ: Добавляем обработку ошибок доступа при чтении атрибутов ---
-            entries = []
-            for e in desktop_path.iterdir():
-                try:
-                    # Пропускаем скрытые файлы
-                    if not (win32api.GetFileAttributes(str(e)) & win32con.FILE_ATTRIBUTE_HIDDEN):
-                        entries.append(e)
-                except pywintypes.error:
-                    self.logger.warning(f"Нет доступа к файлу '{e.name}', пропускаем.")
-                    continue
+            result = self.execute_plan(self.plan_desktop(desktop_path), control=control)
+            msg = f"Организация для '{desktop_path.name}' завершена. Перемещено: {result[OP_DONE]}."
+            if result[OP_PENDING]:
+                msg = (f"Организация для '{desktop_path.name}' остановлена. Перемещено: {result[OP_DONE]}, "
+                       f"не выполнено: {result[OP_PENDING]}.")
+            if result[OP_FAILED]:
+                msg += f" Ошибок: {result[OP_FAILED]}."
+            self.organization_completed.emit(msg)
 
-            total_items = len(entries)
-            moved_count = 0
-            operation_details = {'type': 'organize', 'moved_files': []}
+        except Exception as e:
+            self.logger.error(f"Ошибка при организации {desktop_path}: {e}", exc_info=True)
+            self.organization_completed.emit(f"Ошибка организации: {e}")
 
-            for i, entry in enumerate(entries):
-                if entry.name.startswith(".") or entry.name == "desktop.ini":
-                    continue
+    def plan_desktop(self, desktop_path: Path = None) -> OrganizationPlan:
+        """
+        Этап планирования: классифицирует файлы рабочего стола и возвращает план (файл -> действие).
+        Ничего не меняет на диске, поэтому план можно показать перед выполнением.
+        """
+        desktop_path = desktop_path or self.desktop_path
+        entries = self._desktop_entries(desktop_path)
+        # Все файлы проверяются по правилам одним пакетом
+        rules = self.classifier.classify_many(entries)
+        plan = OrganizationPlan(str(desktop_path))
+        for entry, rule in zip(entries, rules):
+            if rule is None or not rule.action:
+                continue
+            source = Path(entry.path)
+            plan.operations.append(PlannedOperation(
+                str(source), rule.action, rule.name or "", shortcut_target(source, rule.action)))
+        self.logger.info(f"План организации '{desktop_path}': операций {len(plan)} из {len(entries)} файлов.")
+        return plan
 
-                action = self.classifier.check_advanced_rules(entry)
-                if action:
-                    moved_info = self._execute_action(entry, action)
-                    if moved_info:
-                        operation_details['moved_files'].append(moved_info)
-                        moved_count += 1
+    def execute_plan(self, plan: OrganizationPlan, workers: int = PLAN_WORKERS, control: ScanControl = None) -> dict:
+        """
+        Этап выполнения: операции с разными целями идут параллельно в пуле потоков, с одной целью —
+        по порядку плана. Каждая завершенная операция сразу пишется в журнал плана; уже выполненные
+        (например, при повторном запуске загруженного плана) пропускаются.
+        После control.cancel() новые операции не начинаются и остаются в плане невыполненными.
+        Возвращает число операций по статусам.
+        """
+        groups = plan.groups_by_target()
+        if not groups:
+            return plan.counts()
+        total = sum(len(group) for group in groups)
+        plan.save()
+        journal = PlanJournal(plan.journal_path)
+        finished = [0]
+        # Выполненные в этом запуске: операции из журнала прошлого запуска уже есть в истории отмены
+        executed = []
+        lock = threading.Lock()
 
-                if total_items > 0:
-                    self.progress_updated.emit(int((i + 1) / total_items * 100))
+        def run_group(indices):
+            # COM (WScript.Shell) нужно инициализировать в каждом потоке
+            if WIN32_AVAILABLE:
+                pythoncom.CoInitialize()
+            try:
+                for index in indices:
+                    if control is not None and control.is_cancelled:
+                        return
+                    op = plan.operations[index]
+                    self._run_operation(op)
+                    journal.record(index, op)
+                    with lock:
+                        finished[0] += 1
+                        done = finished[0]
+                        if op.status == OP_DONE:
+                            executed.append(index)
+                    self.progress_updated.emit(int(done / total * 100))
+            finally:
+                if WIN32_AVAILABLE:
+                    pythoncom.CoUninitialize()
 
-            msg = f"Организация для '{desktop_path.name}' завершена. Перемещено: {moved_count}."
-            self.organization_completed.emit(msg)
-            if moved_count > 0:
-                self.operation_logged.emit(operation_details)
+        try:
+            with ThreadPoolExecutor(max_workers=max(1, min(workers, len(groups)))) as pool:
+                list(pool.map(run_group, groups))
+        finally:
+            journal.close()
+
+        counts = plan.counts()
+        if counts[OP_PENDING]:
+            self.logger.info(f"Выполнение плана {plan.plan_id} остановлено: {counts}.")
+        else:
+            self.logger.info(f"План {plan.plan_id} выполнен: {counts}.")
+        if executed:
+            self.operation_logged.emit(plan.undo_record(sorted(executed)))
+        return counts
 
+    def _run_operation(self, op: PlannedOperation) -> None:
+        source = Path(op.source)
+        # План мог устареть: файл удалили или переместили после планирования
+        if not source.exists():
+            op.status, op.error = OP_SKIPPED, "файл не найден"
+            return
+        try:
+            op.result = self._execute_action(source, op.action)
         except Exception as e:
-            self.logger.error(f"Ошибка при организации {desktop_path}: {e}", exc_info=True)
-            self.organization_completed.emit(f"Ошибка организации: {e}")
+            op.status, op.error = OP_FAILED, str(e)
+            return
+        if op.result:
+            op.status = OP_DONE
+        else:
+            op.status, op.error = OP_FAILED, "действие не выполнено"
+
+    def _desktop_entries(self, desktop_path: Path) -> list:
+        """Файлы рабочего стола для организации (os.DirEntry) без служебных и скрытых."""
+        # Атрибуты файла берутся из записи каталога (на Windows scandir отдает их без отдельного
+        # запроса к каждому файлу); скрытые файлы пропускаются
+        entries = []
+        with os.scandir(desktop_path) as it:
+            for e in it:
+                if e.name.startswith(".") or e.name == "desktop.ini":
+                    continue
+                try:
+                    if getattr(e.stat(), 'st_file_attributes', 0) & stat.FILE_ATTRIBUTE_HIDDEN:
+                        continue
+                except OSError:
+                    self.logger.warning(f"Нет доступа к файлу '{e.name}', пропускаем.")
+                    continue
+                entries.append(e)
+        return entries
+
+    def simulate_desktop(self, desktop_path: Path = None):
+        """
+        Пробный прогон правил по рабочему столу: ничего не перемещается и не скрывается.
+        Возвращает RuleProfile или None, если папка не найдена.
+        """
+        desktop_path = desktop_path or self.desktop_path
+        if not desktop_path or not desktop_path.is_dir():
+            self.logger.warning(f"Пробный прогон: папка не найдена: {desktop_path}")
+            return None
+        profile = self.classifier.simulate(self._desktop_entries(desktop_path))
+        self.logger.info(f"Пробный прогон по '{desktop_path}': файлов {profile.files}, "
+                         f"без правила {profile.unmatched}, {profile.seconds * 1000:.1f} мс.")
+        return profile
 
     def handle_new_file(self, file_path_str: str):
+        self.handle_new_files([file_path_str])
+
+    def handle_new_files(self, file_paths: list):
+        """Обрабатывает пачку новых файлов от наблюдателя одной пакетной проверкой правил."""
         if not self.auto_organize: return
-        file_path = Path(file_path_str)
-        action = self.classifier.check_advanced_rules(file_path)
-        if action:
-            self._execute_action(file_path, action)
+        for path_str, rule in zip(file_paths, self.classifier.classify_many(file_paths)):
+            if rule is not None and rule.action:
+                self._execute_action(Path(path_str), rule.action)
 
     def _execute_action(self, src_path: Path, action: dict):
         action_type = action.get("type")
@@ -106,10 +217,8 @@ class DesktopOrganizer(QObject):
                 return None
 
             try:
-                shortcuts_dir = DATA_DIR / "Shortcuts" / box_id
-                shortcuts_dir.mkdir(parents=True, exist_ok=True)
-
-                shortcut_path = shortcuts_dir / f"{src_path.stem}.lnk"
+                shortcut_path = Path(shortcut_target(src_path, action))
+                shortcut_path.parent.mkdir(parents=True, exist_ok=True)
                 shell = win32com.client.Dispatch("WScript.Shell")
                 shortcut = shell.CreateShortCut(str(shortcut_path))
                 shortcut.TargetPath = str(src_path.resolve())
@@ -163,4 +272,41 @@ class DesktopOrganizer(QObject):
             self.logger.info(f"Ярлык '{shortcut_path.name}' удален.")
 
         except Exception as e:
-            self.logger.error(f"Ошибка при восстановлении файла из ящика: {e}")
\ No newline at end of file
+            self.logger.error(f"Ошибка при восстановлении файла из ящика: {e}")
+
+class OrganizationJob(QObject):
+    """
+    Организация рабочего стола в фоне, чтобы окно оставалось отзывчивым.
+    Запускается в отдельном QThread через run(); прогресс и итог приходят сигналами органайзера
+    (progress_updated, organization_completed), которые Qt доставляет в поток интерфейса.
+    Без плана организует весь рабочий стол, с планом — выполняет его.
+    cancel() останавливает работу между операциями; невыполненные операции остаются в плане.
+    """
+    finished = pyqtSignal()
+
+    def __init__(self, organizer: DesktopOrganizer, plan: OrganizationPlan = None):
+        super().__init__()
+        self.logger = logging.getLogger(__name__)
+        self.organizer = organizer
+        self.plan = plan
+        self.control = ScanControl()
+
+    def cancel(self) -> None:
+        """Можно вызывать из любого потока."""
+        self.control.cancel()
+
+    def run(self):
+        try:
+            if self.plan is None:
+                self.organizer.organize_all_desktops(self.control)
+            else:
+                counts = self.organizer.execute_plan(self.plan, control=self.control)
+                status = "остановлен" if counts[OP_PENDING] else "выполнен"
+                self.organizer.organization_completed.emit(
+                    f"План организации {status}: выполнено {counts[OP_DONE]}, пропущено {counts[OP_SKIPPED]}, "
+                    f"ошибок {counts[OP_FAILED]}, не выполнено {counts[OP_PENDING]}.")
+        except Exception as e:
+            self.logger.error(f"Ошибка фоновой организации: {e}", exc_info=True)
+            self.organizer.organization_completed.emit(f"Ошибка организации: {e}")
+        finally:
+            self.finished.emit()
@@ -0,0 +1,607 @@
+# core/rule_engine.py
+"""
+Компиляция продвинутых правил (advanced_rules) в структуру для быстрого выбора правила.
+
+Вместо перебора всех правил и условий для каждого файла правила один раз индексируются:
+- по расширению: словарь расширение -> правила, требующие это расширение;
+- по подстрокам имени: автомат Ахо-Корасик находит все подстроки name_contains за один проход по имени.
+Условия могут быть вложенными группами «все» / «любое» / «не»; внутри группы они проверяются
+в порядке возрастания стоимости (имя, затем stat, затем содержимое файла).
+Для файла проверяются только правила-кандидаты, поэтому стоимость почти не зависит от числа правил.
+Порядок правил (приоритет) сохраняется: срабатывает первое подходящее правило из списка.
+Остальные условия (размер, возраст, glob, регулярное выражение, тип содержимого) компилируются
+в предикаты над FileContext, который читает сведения о файле лениво и не больше одного раза за проверку.
+"""
+import copy
+import os
+import re
+import time
+import fnmatch
+import logging
+import threading
+from collections import OrderedDict
+
+from .file_types import CONTENT_TYPES, content_type_of, type_matches
+
+logger = logging.getLogger(__name__)
+
+# Сколько байт начала файла читать по умолчанию для проверки содержимого
+HEAD_SIZE = 64
+
+SIZE_UNITS = {
+    '': 1, 'b': 1, 'б': 1,
+    'k': 1024, 'kb': 1024, 'кб': 1024,
+    'm': 1024 ** 2, 'mb': 1024 ** 2, 'мб': 1024 ** 2,
+    'g': 1024 ** 3, 'gb': 1024 ** 3, 'гб': 1024 ** 3,
+}
+TIME_FIELDS = {'mtime': 'st_mtime', 'ctime': 'st_ctime', 'atime': 'st_atime'}
+# Условия, результат которых меняется со временем даже для неизмененного файла
+TIME_DEPENDENT_TYPES = frozenset({'older_than', 'newer_than'})
+# Решения для правил с условиями возраста кэшируются в пределах такого окна (секунды)
+AGE_CACHE_WINDOW = 60
+DECISION_CACHE_SIZE = 4096
+_SIZE_RE = re.compile(r'^\s*(\d+(?:[.,]\d+)?)\s*([^\d\s]*)\s*$')
+
+
+class RuleCompileError(ValueError):
+    """Значение условия не удалось разобрать (например, неверное регулярное выражение)."""
+
+
+def parse_size(value) -> int:
+    """Размер в байтах из числа или строки вида '10', '1.5 MB', '200 КБ'."""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return int(value)
+    match = _SIZE_RE.match(str(value))
+    if not match or match.group(2).lower() not in SIZE_UNITS:
+        raise RuleCompileError(f"неверный размер: {value!r}")
+    return int(float(match.group(1).replace(',', '.')) * SIZE_UNITS[match.group(2).lower()])
+
+
+def parse_days(value) -> float:
+    """Возраст в днях (число или строка) -> секунды."""
+    try:
+        return float(str(value).replace(',', '.')) * 86400
+    except ValueError:
+        raise RuleCompileError(f"неверное число дней: {value!r}") from None
+
+
+class FileContext:
+    """
+    Сведения о файле для одной проверки правил. Каждое свойство вычисляется при первом обращении
+    и запоминается, так что stat и чтение начала файла выполняются не больше одного раза,
+    сколько бы условий их ни использовали.
+    """
+    __slots__ = ('path', 'name', 'found', '_name_lower', '_suffixes', '_stat', '_head', '_head_size', '_now')
+    _MISSING = object()
+
+    def __init__(self, path, stat_result=None):
+        self.path = os.fspath(path)
+        self.name = os.path.basename(self.path)
+        # Номера подстрок name_contains, найденных в имени; заполняет CompiledRules.match
+        self.found = frozenset()
+        self._name_lower = None
+        self._suffixes = None
+        # stat можно передать заранее (например, из DirEntry), тогда он не запрашивается повторно
+        self._stat = stat_result if stat_result is not None else self._MISSING
+        self._head = None
+        self._head_size = 0
+        self._now = None
+
+    @property
+    def name_lower(self) -> str:
+        if self._name_lower is None:
+            self._name_lower = self.name.lower()
+        return self._name_lower
+
+    @property
+    def suffixes(self) -> tuple:
+        """Цепочка расширений в нижнем регистре от самой длинной: ('.tar.gz', '.gz') для 'a.tar.gz'."""
+        if self._suffixes is None:
+            name = self.name_lower
+            if name.endswith('.'):
+                self._suffixes = ()
+            else:
+                parts = name.lstrip('.').split('.')[1:]
+                self._suffixes = tuple('.' + '.'.join(parts[i:]) for i in range(len(parts)) if parts[i])
+        return self._suffixes
+
+    @property
+    def suffix(self) -> str:
+        """Последнее расширение в нижнем регистре по правилам Path.suffix: '.gz' для 'a.tar.gz'."""
+        name = self.name_lower
+        i = name.rfind('.')
+        return name[i:] if 0 < i < len(name) - 1 else ''
+
+    @property
+    def stat(self):
+        """os.stat файла или None, если его не удалось получить."""
+        if self._stat is self._MISSING:
+            try:
+                self._stat = os.stat(self.path)
+            except OSError:
+                self._stat = None
+        return self._stat
+
+    @property
+    def now(self) -> float:
+        # Одно «сейчас» на проверку, чтобы условия возраста не расходились между собой
+        if self._now is None:
+            self._now = time.time()
+        return self._now
+
+    def head(self, size: int = HEAD_SIZE) -> bytes:
+        """Первые size байт файла (b'' при ошибке). Файл перечитывается, только если нужно больше прочитанного."""
+        if size > self._head_size:
+            self._head_size = max(size, HEAD_SIZE)
+            try:
+                with open(self.path, 'rb') as f:
+                    self._head = f.read(self._head_size)
+            except OSError:
+                self._head = b''
+        return self._head[:size]
+
+
+class AhoCorasick:
+    """Автомат Ахо-Корасик: поиск всех шаблонов в строке за один проход."""
+
+    def __init__(self, patterns: list):
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [()]
+        for pattern_id, pattern in enumerate(patterns):
+            self._add(pattern, pattern_id)
+        self._build_links()
+
+    def _add(self, pattern: str, pattern_id: int) -> None:
+        state = 0
+        for char in pattern:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append(())
+                self._goto[state][char] = next_state
+            state = next_state
+        self._output[state] = self._output[state] + (pattern_id,)
+
+    def _build_links(self) -> None:
+        # Обход в ширину: ссылка неудачи узла указывает на самый длинный собственный суффикс в боре
+        queue = list(self._goto[0].values())
+        head = 0
+        while head < len(queue):
+            state = queue[head]
+            head += 1
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                target = self._goto[fail].get(char, 0)
+                self._fail[next_state] = target if target != next_state else 0
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+
+    def find_all(self, text: str) -> set:
+        """Возвращает номера всех шаблонов, встречающихся в text."""
+        goto, fail, output = self._goto, self._fail, self._output
+        found = set()
+        state = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state]:
+                found.update(output[state])
+        return found
+
+
+def _size_condition(condition: dict, greater: bool):
+    limit = parse_size(condition.get("value"))
+    if greater:
+        return lambda ctx: ctx.stat is not None and ctx.stat.st_size > limit
+    return lambda ctx: ctx.stat is not None and ctx.stat.st_size < limit
+
+
+def _age_condition(condition: dict, older: bool):
+    seconds = parse_days(condition.get("value"))
+    field = condition.get("field", "mtime")
+    if field not in TIME_FIELDS:
+        raise RuleCompileError(f"неизвестное поле времени: {field!r}")
+    attribute = TIME_FIELDS[field]
+    if older:
+        return lambda ctx: ctx.stat is not None and ctx.now - getattr(ctx.stat, attribute) > seconds
+    return lambda ctx: ctx.stat is not None and ctx.now - getattr(ctx.stat, attribute) < seconds
+
+
+def _glob_condition(condition: dict):
+    value = condition.get("value")
+    if not isinstance(value, str):
+        raise RuleCompileError(f"неверный шаблон: {value!r}")
+    # Шаблон, как и остальные условия по имени, не зависит от регистра
+    pattern = re.compile(fnmatch.translate(value.lower()))
+    return lambda ctx: pattern.match(ctx.name_lower) is not None
+
+
+def _regex_condition(condition: dict):
+    try:
+        pattern = re.compile(condition.get("value"), re.IGNORECASE)
+    except (re.error, TypeError) as e:
+        raise RuleCompileError(f"неверное регулярное выражение {condition.get('value')!r}: {e}") from None
+    return lambda ctx: pattern.search(ctx.name) is not None
+
+
+def _content_type_condition(condition: dict):
+    value = condition.get("value")
+    wanted = value.strip().lower() if isinstance(value, str) else None
+    if wanted not in CONTENT_TYPES:
+        raise RuleCompileError(f"неизвестный тип содержимого: {value!r}")
+    return lambda ctx: type_matches(content_type_of(ctx), wanted)
+
+
+# Условия, которые компилируются в предикат над FileContext: тип -> функция(условие) -> предикат
+CONDITION_COMPILERS = {
+    "size_greater_than": lambda condition: _size_condition(condition, greater=True),
+    "size_less_than": lambda condition: _size_condition(condition, greater=False),
+    "older_than": lambda condition: _age_condition(condition, older=True),
+    "newer_than": lambda condition: _age_condition(condition, older=False),
+    "name_matches": _glob_condition,
+    "name_regex": _regex_condition,
+    "content_type_is": _content_type_condition,
+}
+
+# Оценка стоимости проверки условия: соседние условия в группе проверяются от дешевых к дорогим,
+# поэтому stat и чтение файла выполняются, только если дешевые проверки имени прошли
+COST_NAME = 1
+COST_STAT = 10
+COST_CONTENT = 100
+CONDITION_COSTS = {
+    "extension_is": COST_NAME, "name_contains": COST_NAME,
+    "name_matches": COST_NAME * 2, "name_regex": COST_NAME * 3,
+    "size_greater_than": COST_STAT, "size_less_than": COST_STAT,
+    "older_than": COST_STAT, "newer_than": COST_STAT,
+    "content_type_is": COST_CONTENT,
+}
+
+# Группы условий: {"type": "all" | "any" | "not", "conditions": [...]}; "not" отрицает «все условия» группы
+GROUP_TYPES = ("all", "any", "not")
+
+
+def _never(ctx) -> bool:
+    return False
+
+
+class _Node:
+    """
+    Скомпилированное условие: предикат, оценка стоимости и «триггер» для индекса.
+    Триггер (расширения, номера подстрок) означает, что условие может выполниться, только если
+    расширение файла входит в первое множество или в имени найдена одна из подстрок второго.
+    None — условие ничего не требует от имени, и правило проверяется для любого файла.
+    """
+    __slots__ = ('predicate', 'cost', 'trigger')
+
+    def __init__(self, predicate, cost: int, trigger=None):
+        self.predicate = predicate
+        self.cost = cost
+        self.trigger = trigger
+
+
+def _all_of(nodes: list) -> _Node:
+    nodes = sorted(nodes, key=lambda node: node.cost)
+    predicates = tuple(node.predicate for node in nodes)
+    # Для «и» достаточно любого триггера потомка; точнее всего — с наименьшим числом вариантов
+    triggers = [node.trigger for node in nodes if node.trigger is not None]
+    trigger = min(triggers, key=lambda t: len(t[0]) + len(t[1])) if triggers else None
+    if len(predicates) == 1:
+        return _Node(predicates[0], nodes[0].cost, trigger)
+    return _Node(lambda ctx: all(predicate(ctx) for predicate in predicates),
+                 sum(node.cost for node in nodes), trigger)
+
+
+def _any_of(nodes: list) -> _Node:
+    if not nodes:
+        return _Node(_never, 0, (frozenset(), frozenset()))
+    nodes = sorted(nodes, key=lambda node: node.cost)
+    predicates = tuple(node.predicate for node in nodes)
+    # Для «или» триггер есть, только если он есть у каждого варианта
+    trigger = None
+    if all(node.trigger is not None for node in nodes):
+        trigger = (frozenset().union(*(node.trigger[0] for node in nodes)),
+                   frozenset().union(*(node.trigger[1] for node in nodes)))
+    return _Node(lambda ctx: any(predicate(ctx) for predicate in predicates),
+                 sum(node.cost for node in nodes), trigger)
+
+
+class CompiledRule:
+    __slots__ = ('priority', 'name', 'action', 'predicate', 'trigger')
+
+    def __init__(self, priority: int, name: str, action: dict, predicate, trigger):
+        self.priority = priority
+        self.name = name
+        self.action = action
+        self.predicate = predicate
+        self.trigger = trigger
+
+
+class CompiledRules:
+    """Скомпилированный набор правил; создается заново при каждом изменении advanced_rules."""
+
+    def __init__(self, rules: list, profile=None):
+        """profile — RuleProfile для пробного прогона: условия тогда замеряются (это медленнее)."""
+        self.by_extension = {}
+        self.by_pattern = {}
+        self.unindexed = []
+        self._pattern_ids = {}
+        self.count = 0
+        self.profile = profile
+        # Есть ли среди активных правил условия возраста (см. DecisionCache)
+        self.time_dependent = False
+
+        for priority, rule in enumerate(rules):
+            compiled = self._compile_rule(priority, rule)
+            if compiled is None:
+                continue
+            self.count += 1
+            if profile is not None:
+                profile.rules[priority].active = True
+            if compiled.trigger is None:
+                self.unindexed.append(compiled)
+                continue
+            extensions, patterns = compiled.trigger
+            for extension in extensions:
+                self.by_extension.setdefault(extension, []).append(compiled)
+            for pattern_id in patterns:
+                self.by_pattern.setdefault(pattern_id, []).append(compiled)
+
+        pattern_ids = self._pattern_ids
+        self.automaton = AhoCorasick(sorted(pattern_ids, key=pattern_ids.get)) if pattern_ids else None
+
+    def _compile_rule(self, priority: int, rule: dict):
+        """Возвращает CompiledRule или None, если правило выключено или заведомо не может сработать."""
+        if not rule.get("enabled", False):
+            return None
+        conditions = rule.get("conditions", [])
+        if not conditions:
+            return None
+
+        # Верхний уровень — «все условия»; неизвестное или невыполнимое условие здесь исключает правило целиком
+        leaf_types = [condition.get("type") for condition in conditions]
+        if any(t not in GROUP_TYPES and t not in CONDITION_COSTS for t in leaf_types):
+            return None
+        extensions = {condition.get("value").lower() for condition in conditions
+                      if condition.get("type") == "extension_is" and isinstance(condition.get("value"), str)}
+        # У файла одно расширение: правило с двумя разными расширениями сработать не может
+        if len(extensions) > 1:
+            return None
+        try:
+            node = _all_of([self._compile_node(condition) for condition in conditions])
+        except RuleCompileError as e:
+            logger.warning(f"Правило '{rule.get('name')}' отключено: {e}")
+            return None
+        # Имя и действие копируются: план и журнал должны отражать правило в том виде, в каком оно проверялось
+        return CompiledRule(priority, rule.get("name") or "", copy.deepcopy(rule.get("action")),
+                            node.predicate, node.trigger)
+
+    def _compile_node(self, condition: dict) -> _Node:
+        cond_type = condition.get("type")
+        if cond_type in GROUP_TYPES:
+            children = [self._compile_node(child) for child in condition.get("conditions", [])]
+            if cond_type == "any":
+                return _any_of(children)
+            # Пустая группа «все» выполняется всегда, как и all([])
+            inner = _all_of(children) if children else _Node(lambda ctx: True, 0)
+            if cond_type == "all":
+                return inner
+            inner_predicate = inner.predicate
+            return _Node(lambda ctx: not inner_predicate(ctx), inner.cost)
+
+        node = self._compile_leaf(condition)
+        if self.profile is not None:
+            node.predicate = self.profile.timed(cond_type, node.predicate)
+        return node
+
+    def _compile_leaf(self, condition: dict) -> _Node:
+        cond_type = condition.get("type")
+        value = condition.get("value")
+        if cond_type == "extension_is":
+            if not isinstance(value, str):
+                return _Node(_never, 0)
+            extension = value.lower()
+            return _Node(lambda ctx: ctx.suffix == extension, COST_NAME, (frozenset([extension]), frozenset()))
+        if cond_type == "name_contains":
+            if not isinstance(value, str):
+                return _Node(_never, 0)
+            if not value:
+                # Пустая подстрока содержится в любом имени
+                return _Node(lambda ctx: True, 0)
+            pattern_id = self._pattern_ids.setdefault(value.lower(), len(self._pattern_ids))
+            return _Node(lambda ctx: pattern_id in ctx.found, COST_NAME, (frozenset(), frozenset([pattern_id])))
+        if cond_type in CONDITION_COMPILERS:
+            if cond_type in TIME_DEPENDENT_TYPES:
+                self.time_dependent = True
+            return _Node(CONDITION_COMPILERS[cond_type](condition), CONDITION_COSTS[cond_type])
+        # Неизвестное условие никогда не выполняется
+        return _Node(_never, 0)
+
+    def match(self, ctx: FileContext):
+        """Возвращает первое по приоритету правило, которому соответствует файл, или None."""
+        return self.match_many([ctx])[0]
+
+    def match_many(self, contexts: list) -> list:
+        """
+        Проверяет пакет файлов: для каждого возвращает сработавшее правило или None.
+        Файлы группируются по расширению, и список кандидатов по расширению и неиндексированных
+        правил собирается и сортируется один раз на группу; для отдельного файла к нему
+        добавляются только правила по найденным в имени подстрокам.
+        """
+        results = [None] * len(contexts)
+        for i, candidates in self._candidates(contexts):
+            ctx = contexts[i]
+            for rule in candidates:
+                if rule.predicate(ctx):
+                    results[i] = rule
+                    break
+        return results
+
+    def simulate(self, contexts: list, profile) -> list:
+        """
+        Пробный прогон: как match_many, но для статистики проверяются все правила-кандидаты,
+        а не только до первого сработавшего, и время каждой проверки записывается в profile.
+        """
+        results = [None] * len(contexts)
+        for i, candidates in self._candidates(contexts):
+            ctx = contexts[i]
+            for rule in candidates:
+                start = time.perf_counter()
+                matched = rule.predicate(ctx)
+                profile.record_rule(rule.priority, time.perf_counter() - start, matched, results[i])
+                if matched and results[i] is None:
+                    results[i] = rule
+            profile.record_file(results[i])
+        return results
+
+    def _candidates(self, contexts: list):
+        """Пары (номер файла, правила-кандидаты по приоритету); заполняет ctx.found."""
+        groups = {}
+        for i, ctx in enumerate(contexts):
+            groups.setdefault(ctx.suffix, []).append(i)
+
+        automaton = self.automaton
+        for suffix, indices in groups.items():
+            base = {rule.priority: rule for rule in self.by_extension.get(suffix, ())}
+            for rule in self.unindexed:
+                base[rule.priority] = rule
+            ordered = [base[priority] for priority in sorted(base)]
+            for i in indices:
+                ctx = contexts[i]
+                ctx.found = automaton.find_all(ctx.name_lower) if automaton is not None else frozenset()
+                candidates = ordered
+                if ctx.found:
+                    extra = {rule.priority: rule for pattern_id in ctx.found
+                             for rule in self.by_pattern.get(pattern_id, ())}
+                    if extra:
+                        extra.update(base)
+                        candidates = [extra[priority] for priority in sorted(extra)]
+                yield i, candidates
+
+
+class RuleStats:
+    __slots__ = ('name', 'active', 'evaluated', 'matched', 'would_match', 'seconds', 'shadowed_by')
+
+    def __init__(self, name: str, active: bool):
+        self.name = name
+        # Неактивное правило выключено или не может сработать (ошибка в условиях, два расширения)
+        self.active = active
+        self.evaluated = 0
+        # Файлы, которые правило получило (оно первое подходящее)
+        self.matched = 0
+        # Файлы, которым правило соответствует, включая забранные более ранними правилами
+        self.would_match = 0
+        self.seconds = 0.0
+        # Номер более раннего правила -> сколько подходящих файлов оно забрало
+        self.shadowed_by = {}
+
+    @property
+    def never_fires(self) -> bool:
+        return self.active and self.would_match == 0
+
+    @property
+    def shadowed(self) -> bool:
+        """Правило подходит файлам, но все они достаются более ранним правилам."""
+        return self.would_match > 0 and self.matched == 0
+
+
+class RuleProfile:
+    """Статистика пробного прогона правил: срабатывания и время по правилам и по типам условий."""
+
+    def __init__(self, rules: list):
+        self.rules = [RuleStats(rule.get("name", ""), False) for rule in rules]
+        # Тип условия -> [число проверок, секунды]
+        self.conditions = {}
+        self.files = 0
+        self.unmatched = 0
+        self.seconds = 0.0
+
+    def timed(self, cond_type: str, predicate):
+        """Оборачивает предикат условия замером времени."""
+        stats = self.conditions.setdefault(cond_type, [0, 0.0])
+
+        def timed_predicate(ctx):
+            start = time.perf_counter()
+            try:
+                return predicate(ctx)
+            finally:
+                stats[0] += 1
+                stats[1] += time.perf_counter() - start
+        return timed_predicate
+
+    def record_rule(self, priority: int, seconds: float, matched: bool, winner) -> None:
+        stats = self.rules[priority]
+        stats.evaluated += 1
+        stats.seconds += seconds
+        if not matched:
+            return
+        stats.would_match += 1
+        if winner is None:
+            stats.matched += 1
+        else:
+            stats.shadowed_by[winner.priority] = stats.shadowed_by.get(winner.priority, 0) + 1
+
+    def record_file(self, winner) -> None:
+        self.files += 1
+        if winner is None:
+            self.unmatched += 1
+
+
+class DecisionCache:
+    """
+    LRU-кэш решений по правилам: ключ (путь, размер, mtime_ns, поколение правил).
+    Поколение меняется при каждом изменении правил или категорий, и старые записи
+    перестают находиться; кроме того, при смене поколения кэш очищается целиком.
+    Если среди правил есть условия возраста, к ключу добавляется номер окна AGE_CACHE_WINDOW,
+    чтобы файл «постарел» и без изменений. Доступен из нескольких потоков (наблюдатель и GUI).
+    """
+    MISSING = object()
+
+    def __init__(self, max_size: int = DECISION_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._generation = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    @staticmethod
+    def key(ctx: FileContext, generation: int, time_dependent: bool):
+        """Ключ для файла или None, если stat недоступен (такое решение не кэшируется)."""
+        st = ctx.stat
+        if st is None:
+            return None
+        window = int(ctx.now // AGE_CACHE_WINDOW) if time_dependent else 0
+        return ctx.path, st.st_size, st.st_mtime_ns, generation, window
+
+    def get(self, key):
+        """Возвращает сохраненное решение или DecisionCache.MISSING."""
+        with self._lock:
+            if key[3] != self._generation:
+                self._entries.clear()
+                self._generation = key[3]
+            value = self._entries.get(key, self.MISSING)
+            if value is self.MISSING:
+                self.misses += 1
+            else:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            return value
+
+    def put(self, key, value) -> None:
+        with self._lock:
+            if key[3] != self._generation:
+                return
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
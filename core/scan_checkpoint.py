@@ -0,0 +1,128 @@
+# core/scan_checkpoint.py
+import os
+import json
+import hashlib
+import logging
+import threading
+import time
+from pathlib import Path
+
+from .utils import DATA_DIR
+
+CHECKPOINT_DIR = DATA_DIR / "scan_checkpoints"
+# Как часто (в секундах) сохранять состояние долгого поиска
+CHECKPOINT_INTERVAL = 30
+CHECKPOINT_VERSION = 1
+
+
+class ScanCancelled(Exception):
+    """Поиск остановлен пользователем или при закрытии приложения."""
+
+
+class ScanControl:
+    """
+    Токен управления поиском: отмена и пауза из любого потока.
+    Рабочий поток периодически вызывает wait_if_paused(), который блокируется на паузе.
+    """
+
+    def __init__(self):
+        self._cancelled = threading.Event()
+        self._running = threading.Event()
+        self._running.set()
+
+    def reset(self) -> None:
+        self._cancelled.clear()
+        self._running.set()
+
+    def cancel(self) -> None:
+        self._cancelled.set()
+        # Снимаем паузу, чтобы поток проснулся и увидел отмену
+        self._running.set()
+
+    def pause(self) -> None:
+        # После отмены пауза не ставится: иначе поток уснет, так и не увидев отмену
+        if not self._cancelled.is_set():
+            self._running.clear()
+
+    def resume(self) -> None:
+        self._running.set()
+
+    @property
+    def is_cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    @property
+    def is_paused(self) -> bool:
+        return not self._running.is_set()
+
+    def wait_if_paused(self) -> None:
+        self._running.wait()
+
+    def check(self) -> None:
+        """Точка остановки для рабочих потоков: ждет на паузе, при отмене бросает ScanCancelled."""
+        self._running.wait()
+        if self._cancelled.is_set():
+            raise ScanCancelled()
+
+
+class ScanCheckpoint:
+    """
+    Файл состояния поиска дубликатов для корневой папки (или набора папок, искавшихся вместе).
+    Фаза 'walk' хранит очередь непросмотренных папок и уже собранные по размеру записи,
+    фаза 'hash' — готовые группы по размеру. Сами хеши сохраняются в HashCache.
+    """
+
+    def __init__(self, root, algorithms: dict, directory: Path = CHECKPOINT_DIR):
+        self.logger = logging.getLogger(__name__)
+        roots = [root] if isinstance(root, (str, os.PathLike)) else root
+        self.root = os.pathsep.join(os.path.abspath(r) for r in roots)
+        self.algorithms = algorithms
+        digest = hashlib.sha1(self.root.encode('utf-8', 'surrogatepass')).hexdigest()[:16]
+        self.path = Path(directory) / f"{digest}.json"
+        self._last_saved = time.monotonic()
+
+    def due(self) -> bool:
+        return time.monotonic() - self._last_saved >= CHECKPOINT_INTERVAL
+
+    def touch(self) -> None:
+        """Отмечает, что состояние только что зафиксировано другим способом (например, сбросом кеша хешей)."""
+        self._last_saved = time.monotonic()
+
+    def save(self, state: dict) -> None:
+        data = {'version': CHECKPOINT_VERSION, 'root': self.root, 'algorithms': self.algorithms, **state}
+        tmp_path = self.path.with_suffix('.tmp')
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+            self._last_saved = time.monotonic()
+            self.logger.info(f"Состояние поиска сохранено ({state.get('phase')}): {self.path.name}")
+        except (IOError, OSError, TypeError) as e:
+            self.logger.warning(f"Не удалось сохранить состояние поиска: {e}")
+
+    def load(self):
+        """Возвращает сохраненное состояние или None, если его нет или оно от других настроек."""
+        if not self.path.exists():
+            return None
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (json.JSONDecodeError, IOError) as e:
+            self.logger.warning(f"Файл состояния поиска поврежден, начинаем заново: {e}")
+            return None
+        if (data.get('version') != CHECKPOINT_VERSION or data.get('root') != self.root
+                or data.get('algorithms') != self.algorithms):
+            return None
+        return data
+
+    def exists(self) -> bool:
+        return self.load() is not None
+
+    def delete(self) -> None:
+        try:
+            self.path.unlink()
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            self.logger.warning(f"Не удалось удалить файл состояния поиска: {e}")
@@ -65,6 +65,8 @@ class UndoManager:
                 self._undo_clean(operation_data)
             elif op_type in ['organize', 'sort']:
                 self._undo_move(operation_data)
+            elif op_type == 'dedupe_link':
+                self._undo_dedupe_link(operation_data)
             else:
                 raise NotImplementedError(f"Отмена для операции типа '{op_type}' не реализована.")
 
@@ -97,6 +99,12 @@ class UndoManager:
         moved_count = 0
         for file_info in reversed(operation_data.get('moved_files', [])):
             try:
+                if file_info.get('type') == 'assign':
+                    # Назначение в ящик: файл не перемещался, ярлык удаляется, файл снова видим
+                    from core.organization_plan import revert_assignment
+                    revert_assignment(file_info['original'], file_info['new_shortcut'])
+                    moved_count += 1
+                    continue
                 src = Path(file_info['new'])      # Путь в хранилище
                 dest = Path(file_info['original']) # Путь на рабочем столе
 
@@ -113,4 +121,19 @@ class UndoManager:
                     self.logger.warning(f"Файл для отмены перемещения не найден: {src}")
             except Exception as e:
                 self.logger.warning(f"Не удалось отменить перемещение для {file_info['new']}: {e}")
-        self.logger.info(f"Возвращено на место {moved_count} файлов.")
\ No newline at end of file
+        self.logger.info(f"Возвращено на место {moved_count} файлов.")
+
+    def _undo_dedupe_link(self, operation_data: dict):
+        """Отмена замены дубликатов ссылками: жесткие ссылки снова становятся отдельными копиями."""
+        from core.duplicate_linking import break_link, LINK_HARDLINK
+        restored_count = 0
+        for file_info in reversed(operation_data.get('linked_files', [])):
+            # reflink-копия и так независима от оригинала, восстанавливать нечего
+            if file_info.get('method') != LINK_HARDLINK:
+                continue
+            try:
+                break_link(file_info['path'])
+                restored_count += 1
+            except Exception as e:
+                self.logger.warning(f"Не удалось восстановить отдельную копию {file_info['path']}: {e}")
+        self.logger.info(f"Восстановлено отдельных копий: {restored_count}.")
@@ -69,25 +69,28 @@ def load_config() -> dict:
             },
             {
                 "name": "Исполняемые файлы в Программы", "enabled": True,
-                "conditions": [{"type": "extension_is", "value": ".exe"}, {"type": "extension_is", "value": ".msi"}],
+                "conditions": [{"type": "any", "conditions": [{"type": "extension_is", "value": ".exe"},
+                                                              {"type": "extension_is", "value": ".msi"}]}],
                 "action": {"type": "assign_to_box", "box_id": "default_programs"}
             },
             {
                 "name": "Изображения", "enabled": True,
-                "conditions": [{"type": "extension_is", "value": ".png"}, {"type": "extension_is", "value": ".jpg"},
-                               {"type": "extension_is", "value": ".jpeg"}],
+                "conditions": [{"type": "any", "conditions": [{"type": "extension_is", "value": ".png"},
+                                                              {"type": "extension_is", "value": ".jpg"},
+                                                              {"type": "extension_is", "value": ".jpeg"}]}],
                 "action": {"type": "assign_to_box", "box_id": "default_images"}
             },
             {
                 "name": "Скриншоты", "enabled": True,
-                "conditions": [{"type": "name_contains", "value": "Снимок"},
-                               {"type": "name_contains", "value": "Screenshot"}],
+                "conditions": [{"type": "any", "conditions": [{"type": "name_contains", "value": "Снимок"},
+                                                              {"type": "name_contains", "value": "Screenshot"}]}],
                 "action": {"type": "assign_to_box", "box_id": "default_screenshots"}
             },
             {
                 "name": "Архивы", "enabled": True,
-                "conditions": [{"type": "extension_is", "value": ".zip"}, {"type": "extension_is", "value": ".rar"},
-                               {"type": "extension_is", "value": ".7z"}],
+                "conditions": [{"type": "any", "conditions": [{"type": "extension_is", "value": ".zip"},
+                                                              {"type": "extension_is", "value": ".rar"},
+                                                              {"type": "extension_is", "value": ".7z"}]}],
                 "action": {"type": "assign_to_box", "box_id": "default_archives"}
             }
         ],
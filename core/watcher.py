@@ -1,10 +1,15 @@
 # core/watcher.py
 import time
 import logging
+import threading
 from PyQt5.QtCore import QThread
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
 
+# Сколько секунд файл должен «отлежаться» после последнего события, прежде чем его обрабатывать
+# (например, пока завершается скачивание)
+SETTLE_DELAY = 1.0
+
 
 class DesktopHandler(FileSystemEventHandler):
     """
@@ -12,32 +17,95 @@ class DesktopHandler(FileSystemEventHandler):
     Когда watchdog замечает событие, он передает его сюда.
     """
 
-    def __init__(self, organizer):
+    def __init__(self, organizer, duplicate_index=None):
         super().__init__()
         self.organizer = organizer
+        # Живой индекс дубликатов (необязательный), обновляется каждым событием
+        self.duplicate_index = duplicate_index
         self.logger = logging.getLogger(__name__)
-        # Защита от дублирующихся событий, которые иногда генерирует ОС
-        self.last_event_time = 0
-        self.last_event_path = ""
+        # Новые файлы ждут здесь (путь -> время последнего события), пока не «отлежатся»;
+        # повторные события для того же пути, которые иногда генерирует ОС, просто сдвигают время
+        self.pending = {}
+        # Измененные на месте файлы (путь -> время последнего события): хеш в индексе дубликатов
+        # пересчитывается, когда запись в файл закончится
+        self.modified = {}
+        self._pending_lock = threading.Lock()
 
     def on_created(self, event):
         """Вызывается, когда в отслеживаемой папке создается новый файл или папка."""
         try:
             # Нас интересуют только файлы
             if not event.is_directory:
-                current_time = time.time()
-                if (current_time - self.last_event_time < 1) and (event.src_path == self.last_event_path):
-                    return  # Игнорируем дублирующееся событие
+                with self._pending_lock:
+                    self.pending[event.src_path] = time.time()
+        except Exception as e:
+            self.logger.error(f"Ошибка в обработчике файловых событий: {e}", exc_info=True)
 
-                self.last_event_time = current_time
-                self.last_event_path = event.src_path
+    def on_modified(self, event):
+        try:
+            if event.is_directory:
+                return
+            with self._pending_lock:
+                # Новый файл еще дописывается — откладываем его обработку; иначе обновим индекс позже
+                if event.src_path in self.pending:
+                    self.pending[event.src_path] = time.time()
+                elif self.duplicate_index is not None:
+                    self.modified[event.src_path] = time.time()
+        except Exception as e:
+            self.logger.error(f"Ошибка в обработчике файловых событий: {e}", exc_info=True)
+
+    @staticmethod
+    def _take_settled(events: dict, threshold: float) -> list:
+        settled = [path for path, event_time in events.items() if event_time <= threshold]
+        for path in settled:
+            del events[path]
+        return settled
+
+    def process_settled(self) -> None:
+        """
+        Передает органайзеру одной пачкой все новые файлы, которые не менялись SETTLE_DELAY секунд,
+        и обновляет в индексе дубликатов «отлежавшиеся» измененные файлы.
+        """
+        threshold = time.time() - SETTLE_DELAY
+        with self._pending_lock:
+            settled = self._take_settled(self.pending, threshold)
+            modified = self._take_settled(self.modified, threshold)
+        try:
+            for path in modified:
+                self.duplicate_index.add_path(path)
+        except Exception as e:
+            self.logger.error(f"Ошибка обновления индекса дубликатов: {e}", exc_info=True)
+        if not settled:
+            return
+        try:
+            for path in settled:
+                self.logger.info(f"Наблюдатель обнаружил новый файл: {path}")
+                if self.duplicate_index is not None:
+                    self.duplicate_index.add_path(path)
+            self.organizer.handle_new_files(settled)
+        except Exception as e:
+            self.logger.error(f"Ошибка в обработчике файловых событий: {e}", exc_info=True)
 
-                # Даем файлу время на завершение записи (например, при скачивании)
-                time.sleep(1)
+    def on_deleted(self, event):
+        try:
+            with self._pending_lock:
+                self.pending.pop(event.src_path, None)
+                self.modified.pop(event.src_path, None)
+            if not event.is_directory and self.duplicate_index is not None:
+                self.duplicate_index.remove_path(event.src_path)
+        except Exception as e:
+            self.logger.error(f"Ошибка в обработчике файловых событий: {e}", exc_info=True)
 
-                self.logger.info(f"Наблюдатель обнаружил новый файл: {event.src_path}")
-                # Передаем файл на обработку в органайзер
-                self.organizer.handle_new_file(event.src_path)
+    def on_moved(self, event):
+        try:
+            # Ожидающий файл переименован (например, временный файл скачивания) — ждем его под новым именем
+            with self._pending_lock:
+                if self.pending.pop(event.src_path, None) is not None:
+                    self.pending[event.dest_path] = time.time()
+                if self.modified.pop(event.src_path, None) is not None:
+                    self.modified[event.dest_path] = time.time()
+            if not event.is_directory and self.duplicate_index is not None:
+                self.duplicate_index.move_path(event.src_path, event.dest_path)
         except Exception as e:
             self.logger.error(f"Ошибка в обработчике файловых событий: {e}", exc_info=True)
 
@@ -47,31 +115,44 @@ class DesktopWatcher(QThread):
     Наблюдатель, работающий в отдельном потоке, чтобы не блокировать основной интерфейс.
     """
 
-    def __init__(self, organizer, path_to_watch):
+    def __init__(self, organizer, path_to_watch, duplicate_index=None):
         super().__init__()
         self.organizer = organizer
         self.path_to_watch = path_to_watch
+        self.duplicate_index = duplicate_index
         self.logger = logging.getLogger(__name__)
         self.observer = Observer()
         self._is_running = True
 
     def run(self):
         """Этот метод выполняется при запуске потока (`.start()`)."""
-        event_handler = DesktopHandler(self.organizer)
+        event_handler = DesktopHandler(self.organizer, self.duplicate_index)
         self.observer.schedule(event_handler, self.path_to_watch, recursive=False)
         self.observer.start()
         self.logger.info(f"Наблюдение за папкой '{self.path_to_watch}' запущено.")
 
+        # Индекс строится после запуска наблюдателя, чтобы не пропустить события во время обхода
+        if self.duplicate_index is not None:
+            try:
+                self.duplicate_index.build(self.path_to_watch)
+            except Exception as e:
+                self.logger.error(f"Ошибка построения индекса дубликатов: {e}", exc_info=True)
+
         try:
             while self._is_running:
-                time.sleep(1)
+                time.sleep(SETTLE_DELAY / 2)
+                event_handler.process_settled()
         except Exception as e:
             self.logger.error(f"Ошибка в потоке наблюдателя: {e}")
         finally:
             self.observer.stop()
             self.observer.join()
+            if self.duplicate_index is not None:
+                self.duplicate_index.flush()
             self.logger.info("Наблюдение остановлено.")
 
     def stop(self):
-        """Сигнализирует потоку о необходимости завершения."""
-        self._is_running = False
\ No newline at end of file
+        """Сигнализирует потоку о необходимости завершения; начатое построение индекса прерывается."""
+        self._is_running = False
+        if self.duplicate_index is not None:
+            self.duplicate_index.cancel()
@@ -19,6 +19,7 @@ from core.box_manager import BoxManager
 from core.hotkey_manager import HotkeyManager
 from core.organizer import DesktopOrganizer
 from core.watcher import DesktopWatcher
+from core.duplicate_index import DuplicateIndex
 from core.wallpaper_manager import WallpaperManager
 from ui.themes import DARK_THEME_QSS, LIGHT_THEME_QSS
 
@@ -53,14 +54,18 @@ def main():
     box_manager = BoxManager(config)
     hotkey_manager = HotkeyManager(config)
     organizer = DesktopOrganizer(config)
+    organizer.auto_organize = config.get("auto_organize_enabled", True)
     wallpaper_manager = WallpaperManager(config)
 
+    duplicate_index = DuplicateIndex()
+
     desktop_paths = get_all_desktop_paths()
     watcher = None
     if desktop_paths:
-        watcher = DesktopWatcher(organizer, desktop_paths[0])
-        if config.get("auto_organize_enabled", True):
-            watcher.start()
+        # Наблюдатель запускается всегда: он поддерживает индекс дубликатов, а новые файлы
+        # раскладывает, только если включена автоорганизация (organizer.auto_organize)
+        watcher = DesktopWatcher(organizer, desktop_paths[0], duplicate_index)
+        watcher.start()
 
     hotkey_manager.listener.toggle_boxes_visibility.connect(box_manager.toggle_visibility)
     organizer.shortcut_assigned_to_box.connect(box_manager.add_shortcut_to_box)
@@ -82,13 +87,18 @@ def main():
         box_manager=box_manager,
         hotkey_manager=hotkey_manager,
         wallpaper_manager=wallpaper_manager,
-        version=__version__
+        version=__version__,
+        duplicate_index=duplicate_index,
+        organizer=organizer
     )
+    window.rules_changed.connect(organizer.classifier.reload_rules)
+    organizer.operation_logged.connect(window.undo_manager.add_operation)
     window.show()
 
     if config.get("run_initial_organization", True):
         logger.info("Запуск первоначальной организации рабочего стола...")
-        organizer.organize_all_desktops()
+        # В фоне: окно сразу отвечает, ход организации виден в строке состояния
+        window.start_organization()
 
     def on_quit():
         hotkey_manager.stop()
@@ -0,0 +1,85 @@
+# tests/test_duplicate_jobs.py
+"""
+Фоновые операции окна дубликатов проходят целиком в настоящем цикле событий Qt:
+итог показывается, поток завершается, интерфейс не зависает.
+"""
+import os
+import sys
+
+import pytest
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+QtWidgets = pytest.importorskip("PyQt5.QtWidgets")
+from PyQt5.QtCore import QEventLoop, QTimer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.duplicate_linking import LinkJob  # noqa: E402
+from ui import duplicates_dialog  # noqa: E402
+from ui.duplicates_dialog import DuplicatesDialog  # noqa: E402
+
+# Сколько ждать завершения операции, прежде чем считать интерфейс зависшим
+JOB_TIMEOUT_MS = 10000
+
+
+@pytest.fixture(scope="module")
+def app():
+    return QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+
+
+@pytest.fixture
+def summaries(monkeypatch):
+    shown = []
+    monkeypatch.setattr(duplicates_dialog.QMessageBox, "information",
+                        staticmethod(lambda parent, title, text: shown.append(text)))
+    return shown
+
+
+def _duplicate_pair(tmp_path):
+    paths = []
+    for name in ("a.bin", "b.bin"):
+        path = tmp_path / name
+        path.write_bytes(b"x" * 10000)
+        paths.append(str(path))
+    return paths
+
+
+def _run_until_finished(dialog, start):
+    loop = QEventLoop()
+    dialog.finished.connect(loop.quit)
+    timer = QTimer()
+    timer.setSingleShot(True)
+    timer.timeout.connect(loop.quit)
+    timer.start(JOB_TIMEOUT_MS)
+    QTimer.singleShot(0, start)
+    loop.exec_()
+    return timer.isActive()
+
+
+def test_link_job_finishes_and_shows_summary(app, summaries, tmp_path):
+    canonical, copy = _duplicate_pair(tmp_path)
+    dialog = DuplicatesDialog({"blake2b:test": [canonical, copy]})
+    job = LinkJob([(canonical, [copy])])
+
+    finished_in_time = _run_until_finished(dialog, lambda: dialog._start_job(
+        job, job.linking_finished, "Замена", "Замена...", dialog._on_linking_finished))
+
+    assert finished_in_time, "операция не завершилась: интерфейс завис"
+    assert dialog._job_thread is None
+    assert len(summaries) == 1 and "Заменено ссылками 1" in summaries[0]
+    assert os.path.samefile(canonical, copy)
+
+
+def test_deletion_job_finishes_and_shows_summary(app, summaries, tmp_path, monkeypatch):
+    canonical, copy = _duplicate_pair(tmp_path)
+    trashed = []
+    monkeypatch.setattr("core.duplicate_deletion.send2trash",
+                        lambda paths: trashed.extend(paths if isinstance(paths, list) else [paths]))
+    dialog = DuplicatesDialog({"blake2b:test": [canonical, copy]})
+
+    finished_in_time = _run_until_finished(dialog, lambda: dialog._start_deletion([copy]))
+
+    assert finished_in_time, "операция не завершилась: интерфейс завис"
+    assert dialog._job_thread is None
+    assert trashed == [copy]
+    assert len(summaries) == 1 and "Перемещено в корзину 1" in summaries[0]
@@ -0,0 +1,126 @@
+# tests/test_duplicate_scan.py
+"""
+Пауза и отмена поиска дубликатов: рабочие потоки останавливаются, очередь хеширования
+не дорабатывается, окно поиска закрывается, а состояние сохраняется для продолжения.
+"""
+import os
+import sys
+import time
+
+import pytest
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+QtWidgets = pytest.importorskip("PyQt5.QtWidgets")
+from PyQt5.QtCore import Qt, QEventLoop, QTimer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.duplicates import DuplicateFinder  # noqa: E402
+from core.hash_cache import HashCache  # noqa: E402
+from core.hash_io import compare_files_lockstep, hash_file  # noqa: E402
+from core.hashers import get_hasher  # noqa: E402
+from core.scan_checkpoint import ScanCancelled, ScanCheckpoint, ScanControl  # noqa: E402
+from ui import duplicate_scan_dialog  # noqa: E402
+from ui.duplicate_scan_dialog import DuplicateScanDialog  # noqa: E402
+
+SCAN_TIMEOUT_MS = 10000
+
+
+@pytest.fixture(scope="module")
+def app():
+    return QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+
+
+@pytest.fixture
+def finder(tmp_path, monkeypatch):
+    monkeypatch.setattr(ScanCheckpoint.__init__, "__defaults__", (tmp_path / "checkpoints",))
+    return DuplicateFinder(hash_cache=HashCache(tmp_path / "hashes.sqlite"), workers=2)
+
+
+def _same_size_files(folder, count=20, size=50000):
+    folder.mkdir()
+    for i in range(count):
+        (folder / f"{i}.bin").write_bytes(bytes([i]) * size)
+    return str(folder)
+
+
+def test_hashing_stops_on_cancelled_control(tmp_path):
+    path = tmp_path / "a.bin"
+    path.write_bytes(b"x" * 300000)
+    control = ScanControl()
+    control.cancel()
+    with pytest.raises(ScanCancelled):
+        hash_file(str(path), get_hasher("blake2b"), control=control)
+    with pytest.raises(ScanCancelled):
+        compare_files_lockstep([str(path), str(path)], 300000, control=control)
+
+
+def test_cancel_drops_queued_hashes(finder):
+    finder._active_workers = 2
+    calls = []
+
+    def slow(item):
+        calls.append(item)
+        time.sleep(0.01)
+        return item
+
+    def consume():
+        for i, _ in enumerate(finder._map_ordered(slow, range(200))):
+            if i == 2:
+                finder.cancel()
+            finder._hashing_tick()
+
+    with pytest.raises(ScanCancelled):
+        consume()
+    started = len(calls)
+    time.sleep(0.2)
+    assert len(calls) == started < 20
+
+
+def test_scan_dialog_cancel_while_paused_saves_state(app, finder, tmp_path, monkeypatch):
+    shown = []
+    monkeypatch.setattr(duplicate_scan_dialog.QMessageBox, "information",
+                        staticmethod(lambda parent, title, text: shown.append(text)))
+    folder = _same_size_files(tmp_path / "files")
+    # Пауза с первым сообщением о ходе поиска — как будто пользователь нажал «Пауза» сразу
+    paused = []
+
+    def pause_once(_text):
+        if not paused:
+            paused.append(True)
+            finder.pause()
+
+    finder.status_updated.connect(pause_once, Qt.DirectConnection)
+
+    dialog = DuplicateScanDialog(folder, finder=finder)
+    loop = QEventLoop()
+    dialog.finished.connect(loop.quit)
+    timer = QTimer()
+    timer.setSingleShot(True)
+    timer.timeout.connect(loop.quit)
+    timer.start(SCAN_TIMEOUT_MS)
+    QTimer.singleShot(200, dialog.reject)
+    loop.exec_()
+
+    assert timer.isActive(), "окно поиска не закрылось после отмены"
+    assert dialog.result() == QtWidgets.QDialog.Rejected
+    assert dialog.cancelled and shown
+    assert finder.has_checkpoint(folder)
+
+
+def test_scan_dialog_reports_duplicates(app, finder, tmp_path):
+    folder = tmp_path / "files"
+    folder.mkdir()
+    for name in ("a.bin", "b.bin"):
+        (folder / name).write_bytes(b"y" * 50000)
+    (folder / "c.bin").write_bytes(b"z" * 50000)
+
+    dialog = DuplicateScanDialog(str(folder), finder=finder)
+    loop = QEventLoop()
+    dialog.finished.connect(loop.quit)
+    QTimer.singleShot(SCAN_TIMEOUT_MS, loop.quit)
+    loop.exec_()
+
+    assert dialog.result() == QtWidgets.QDialog.Accepted
+    assert [sorted(os.path.basename(p) for p in paths) for paths in dialog.duplicates.values()] == [["a.bin", "b.bin"]]
+    assert not finder.has_checkpoint(str(folder))
@@ -0,0 +1,86 @@
+# tests/test_hash_cache.py
+"""
+Постоянный кеш хешей: запись находится, пока файл не изменился, и перестает совпадать
+при изменении размера или времени изменения.
+"""
+import os
+import sys
+
+import pytest
+
+pytest.importorskip("PyQt5.QtCore")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.duplicates import DuplicateFinder, FileRecord  # noqa: E402
+from core.hash_cache import HashCache  # noqa: E402
+
+KIND = "full:blake2b"
+
+
+def _record(path) -> FileRecord:
+    st = os.stat(path)
+    return FileRecord(str(path), st.st_size, st.st_dev, st.st_ino, st.st_mtime_ns)
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = HashCache(tmp_path / "hashes.sqlite")
+    assert cache.open()
+    yield cache
+    cache.close()
+
+
+def test_hash_survives_reopen(tmp_path, cache):
+    path = tmp_path / "a.bin"
+    path.write_bytes(b"a" * 1000)
+    cache.put(_record(path), KIND, "abc")
+    cache.close()
+
+    reopened = HashCache(tmp_path / "hashes.sqlite")
+    reopened.open()
+    try:
+        assert reopened.get(_record(path), KIND) == "abc"
+        assert reopened.get(_record(path), "partial:blake2b_128") is None
+    finally:
+        reopened.close()
+
+
+def test_mtime_change_invalidates(tmp_path, cache):
+    path = tmp_path / "a.bin"
+    path.write_bytes(b"a" * 1000)
+    cache.put(_record(path), KIND, "abc")
+    cache.flush()
+
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 5 * 10 ** 9))
+    assert cache.get(_record(path), KIND) is None
+
+
+def test_size_change_invalidates(tmp_path, cache):
+    path = tmp_path / "a.bin"
+    path.write_bytes(b"a" * 1000)
+    st = os.stat(path)
+    cache.put(_record(path), KIND, "abc")
+    cache.flush()
+
+    path.write_bytes(b"a" * 1001)
+    # Время изменения то же, отличается только размер
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns))
+    assert cache.get(_record(path), KIND) is None
+
+
+def test_finder_rehashes_changed_file(tmp_path, cache):
+    finder = DuplicateFinder(hash_cache=cache)
+    path = tmp_path / "a.bin"
+    path.write_bytes(b"a" * 1000)
+    first = finder.hash_record(_record(path))
+    cache.flush()
+    assert finder.hash_record(_record(path)) == first
+    assert finder.tier_stats['cache_hits'] == 1
+
+    path.write_bytes(b"b" * 1000)
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 5 * 10 ** 9))
+    assert finder.hash_record(_record(path)) != first
+    assert finder.tier_stats['cache_hits'] == 1
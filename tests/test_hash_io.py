@@ -0,0 +1,67 @@
+# tests/test_hash_io.py
+"""
+Побайтное сравнение (compare_files_lockstep) делит файлы на группы с одинаковым содержимым,
+а попутно вычисленный хеш группы совпадает с полным хешем файла (hash_file).
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.hash_io import compare_files_lockstep, hash_file  # noqa: E402
+from core.hashers import get_hasher  # noqa: E402
+
+SIZE = 300000
+FIRST_CHUNK = 4096
+MAX_CHUNK = 65536
+
+
+def _write(tmp_path, name: str, data: bytes) -> str:
+    path = tmp_path / name
+    path.write_bytes(data)
+    return str(path)
+
+
+def _full_hash(path: str) -> str:
+    return hash_file(path, get_hasher("blake2b")).hexdigest()
+
+
+def _compare(paths: list, new_hasher=None) -> list:
+    return compare_files_lockstep(paths, SIZE, new_hasher, first_chunk=FIRST_CHUNK, max_chunk=MAX_CHUNK)
+
+
+def test_digests_match_full_hash(tmp_path):
+    base = bytes(range(256)) * (SIZE // 256) + b"\0" * (SIZE % 256)
+    late = base[:-1] + b"\1"
+    paths = [_write(tmp_path, "a", base), _write(tmp_path, "b", late), _write(tmp_path, "c", base),
+             _write(tmp_path, "d", late)]
+
+    groups = _compare(paths, lambda: get_hasher("blake2b"))
+    assert sorted(indices for indices, _ in groups) == [[0, 2], [1, 3]]
+    for indices, digest in groups:
+        assert digest == _full_hash(paths[indices[0]])
+
+
+def test_split_after_common_prefix_hashes_each_part(tmp_path):
+    # Группа делится на две пары посреди файла, когда общий префикс уже захеширован
+    prefix = b"p" * (SIZE // 2)
+    tails = [b"x" * (SIZE - len(prefix)), b"y" * (SIZE - len(prefix))]
+    paths = [_write(tmp_path, str(i), prefix + tails[i % 2]) for i in range(4)]
+
+    groups = _compare(paths, lambda: get_hasher("blake2b"))
+    assert sorted(indices for indices, _ in groups) == [[0, 2], [1, 3]]
+    for indices, digest in groups:
+        assert digest == _full_hash(paths[indices[0]])
+
+
+def test_without_hasher_returns_groups_only(tmp_path):
+    data = b"z" * SIZE
+    paths = [_write(tmp_path, "a", data), _write(tmp_path, "b", data), _write(tmp_path, "c", b"q" * SIZE)]
+    assert _compare(paths) == [([0, 1], None)]
+
+
+def test_truncated_file_drops_out(tmp_path):
+    data = b"z" * SIZE
+    paths = [_write(tmp_path, "a", data), _write(tmp_path, "b", data), _write(tmp_path, "c", data[:-10])]
+    groups = _compare(paths, lambda: get_hasher("blake2b"))
+    assert groups == [([0, 1], _full_hash(paths[0]))]
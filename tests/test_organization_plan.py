@@ -0,0 +1,90 @@
+# tests/test_organization_plan.py
+"""
+План организации: группы по цели сохраняют порядок плана, а журнал выполнения
+восстанавливает состояние операций при загрузке прерванного плана.
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core import organization_plan  # noqa: E402
+from core.organization_plan import (OrganizationPlan, PlanJournal, PlannedOperation,  # noqa: E402
+                                    OP_DONE, OP_FAILED, OP_PENDING, OP_SKIPPED)
+
+MOVE = {"type": "move_to", "path": "Docs"}
+
+
+@pytest.fixture(autouse=True)
+def plans_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(organization_plan, "PLANS_DIR", tmp_path / "plans")
+    return tmp_path / "plans"
+
+
+def _plan(targets: list) -> OrganizationPlan:
+    return OrganizationPlan("C:/Desktop", [PlannedOperation(f"C:/Desktop/{i}.txt", MOVE, "r", target)
+                                           for i, target in enumerate(targets)])
+
+
+def test_groups_by_target_keep_plan_order():
+    plan = _plan(["X/a.lnk", None, "x/A.lnk", "X/b.lnk", None, "X/a.lnk"])
+    # Одна цель без учета регистра — одна группа в порядке плана; без цели — по одной операции
+    assert plan.groups_by_target() == [[0, 2, 5], [1], [3], [4]]
+
+
+def test_groups_by_target_skip_done_operations():
+    plan = _plan(["X/a.lnk", "X/a.lnk", "X/b.lnk"])
+    plan.operations[0].status = OP_DONE
+    plan.operations[2].status = OP_DONE
+    plan.operations[1].status = OP_FAILED
+    # Неудачные операции остаются в плане и повторяются при продолжении
+    assert plan.groups_by_target() == [[1]]
+
+
+def test_load_replays_journal():
+    plan = _plan(["X/a.lnk", "X/b.lnk", None, None])
+    plan.save()
+    journal = PlanJournal(plan.journal_path)
+    for index, status in ((1, OP_DONE), (2, OP_SKIPPED), (0, OP_FAILED)):
+        op = plan.operations[index]
+        op.status = status
+        op.result = {'original': op.source} if status == OP_DONE else None
+        op.error = "нет доступа" if status == OP_FAILED else None
+        journal.record(index, op)
+    journal.close()
+
+    loaded = OrganizationPlan.load(plan.path)
+    assert [op.status for op in loaded.operations] == [OP_FAILED, OP_DONE, OP_SKIPPED, OP_PENDING]
+    assert loaded.operations[1].result == {'original': "C:/Desktop/1.txt"}
+    assert loaded.operations[0].error == "нет доступа"
+    assert loaded.undo_record(range(4))['moved_files'] == [{'original': "C:/Desktop/1.txt"}]
+    assert loaded.groups_by_target() == [[0], [2], [3]]
+
+
+def test_truncated_journal_line_is_ignored():
+    plan = _plan([None, None])
+    plan.save()
+    journal = PlanJournal(plan.journal_path)
+    plan.operations[0].status = OP_DONE
+    journal.record(0, plan.operations[0])
+    journal.close()
+    # Аварийное завершение посреди записи второй строки
+    with open(plan.journal_path, 'a', encoding='utf-8') as f:
+        f.write('{"index": 1, "sta')
+
+    loaded = OrganizationPlan.load(plan.path)
+    assert [op.status for op in loaded.operations] == [OP_DONE, OP_PENDING]
+
+
+def test_unfinished_lists_only_plans_with_pending_operations():
+    finished = _plan([None])
+    finished.operations[0].status = OP_DONE
+    finished.save()
+    pending = _plan([None, None])
+    pending.save()
+
+    assert [plan.plan_id for plan in OrganizationPlan.unfinished()] == [pending.plan_id]
+    pending.discard()
+    assert OrganizationPlan.unfinished() == []
@@ -0,0 +1,102 @@
+# tests/test_rule_engine.py
+"""
+Скомпилированные правила (CompiledRules) выбирают то же правило, что прежний перебор
+check_advanced_rules: первое включенное правило, все условия которого выполняются.
+"""
+import os
+import random
+import sys
+from pathlib import Path
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.rule_engine import CompiledRules, FileContext  # noqa: E402
+
+NAMES = ["Report.PDF", "report_final.pdf", "photo.JPG", "holiday photo.png", "archive.tar.gz",
+         "notes.txt", "TODO", ".bashrc", "name.", "scan0001.pdf", "invoice-2024.docx", "Отчет за май.pdf"]
+
+RULES = [
+    {"name": "выключено", "enabled": False, "conditions": [{"type": "extension_is", "value": ".pdf"}],
+     "action": {"type": "move_to", "path": "disabled"}},
+    {"name": "без условий", "enabled": True, "conditions": [], "action": {"type": "move_to", "path": "empty"}},
+    {"name": "неизвестное условие", "enabled": True,
+     "conditions": [{"type": "extension_is", "value": ".txt"}, {"type": "magic", "value": "x"}],
+     "action": {"type": "move_to", "path": "unknown"}},
+    {"name": "два расширения", "enabled": True,
+     "conditions": [{"type": "extension_is", "value": ".pdf"}, {"type": "extension_is", "value": ".png"}],
+     "action": {"type": "move_to", "path": "never"}},
+    {"name": "отчеты", "enabled": True,
+     "conditions": [{"type": "name_contains", "value": "REPORT"}, {"type": "extension_is", "value": ".Pdf"}],
+     "action": {"type": "move_to", "path": "reports"}},
+    {"name": "pdf", "enabled": True, "conditions": [{"type": "extension_is", "value": ".pdf"}],
+     "action": {"type": "move_to", "path": "pdf"}},
+    {"name": "фото", "enabled": True, "conditions": [{"type": "name_contains", "value": "photo"}],
+     "action": {"type": "assign_to_box", "box_id": "photos"}},
+    {"name": "gz", "enabled": True, "conditions": [{"type": "extension_is", "value": ".gz"}],
+     "action": {"type": "move_to", "path": "archives"}},
+    {"name": "без точки", "enabled": True, "conditions": [{"type": "extension_is", "value": "txt"}],
+     "action": {"type": "move_to", "path": "never"}},
+]
+
+
+def _old_condition(file_path: Path, condition: dict) -> bool:
+    cond_type, value = condition.get("type"), condition.get("value")
+    if cond_type == "name_contains":
+        return value.lower() in file_path.name.lower()
+    if cond_type == "extension_is":
+        return file_path.suffix.lower() == value.lower()
+    return False
+
+
+def old_check_advanced_rules(rules: list, file_path: Path):
+    """Прежняя реализация FileClassifier.check_advanced_rules: перебор правил по порядку."""
+    for rule in rules:
+        if not rule.get("enabled", False):
+            continue
+        conditions = rule.get("conditions", [])
+        if not conditions:
+            continue
+        if all(_old_condition(file_path, condition) for condition in conditions):
+            return rule.get("action")
+    return None
+
+
+def _compiled_action(compiled: CompiledRules, file_path: Path):
+    rule = compiled.match(FileContext(file_path))
+    return rule.action if rule is not None else None
+
+
+def test_compiled_rules_match_old_semantics(tmp_path):
+    compiled = CompiledRules(RULES)
+    for name in NAMES:
+        path = tmp_path / name
+        assert _compiled_action(compiled, path) == old_check_advanced_rules(RULES, path), name
+
+
+def test_match_many_agrees_with_match(tmp_path):
+    compiled = CompiledRules(RULES)
+    paths = [tmp_path / name for name in NAMES]
+    batch = compiled.match_many([FileContext(path) for path in paths])
+    single = [compiled.match(FileContext(path)) for path in paths]
+    assert [rule.name if rule else None for rule in batch] == [rule.name if rule else None for rule in single]
+
+
+def test_random_rule_sets_match_old_semantics(tmp_path):
+    rnd = random.Random(13)
+    substrings = ["a", "re", "photo", "PORT", "001", "x", ""]
+    extensions = [".pdf", ".PNG", ".gz", ".txt", ".docx", ""]
+    for _ in range(200):
+        rules = []
+        for i in range(rnd.randint(1, 8)):
+            conditions = []
+            for _ in range(rnd.randint(0, 3)):
+                if rnd.random() < 0.5:
+                    conditions.append({"type": "name_contains", "value": rnd.choice(substrings)})
+                else:
+                    conditions.append({"type": "extension_is", "value": rnd.choice(extensions)})
+            rules.append({"name": f"r{i}", "enabled": rnd.random() < 0.8, "conditions": conditions,
+                          "action": {"type": "move_to", "path": f"r{i}"}})
+        compiled = CompiledRules(rules)
+        for name in NAMES:
+            path = tmp_path / name
+            assert _compiled_action(compiled, path) == old_check_advanced_rules(rules, path), (name, rules)
@@ -0,0 +1,102 @@
+# tests/test_scan_checkpoint.py
+"""
+Отмена поиска дубликатов сохраняет состояние (ScanCheckpoint), а следующий поиск
+в той же папке продолжает его и находит те же дубликаты, что и поиск без перерыва.
+"""
+import os
+import sys
+
+import pytest
+
+pytest.importorskip("PyQt5.QtCore")
+from PyQt5.QtCore import Qt
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core import duplicates as duplicates_module  # noqa: E402
+from core.duplicates import DuplicateFinder  # noqa: E402
+from core.hash_cache import HashCache  # noqa: E402
+from core.scan_checkpoint import ScanCheckpoint  # noqa: E402
+
+
+@pytest.fixture
+def checkpoint_dir(tmp_path, monkeypatch):
+    directory = tmp_path / "checkpoints"
+    monkeypatch.setattr(ScanCheckpoint.__init__, "__defaults__", (directory,))
+    return directory
+
+
+def _finder(tmp_path) -> DuplicateFinder:
+    return DuplicateFinder(hash_cache=HashCache(tmp_path / "hashes.sqlite"), workers=2)
+
+
+def _run(finder, folder) -> dict:
+    """Запускает поиск в текущем потоке; возвращает {'duplicates': ...} или {'cancelled': ...}."""
+    outcome = {}
+    finder.duplicates_found.connect(lambda found: outcome.setdefault('duplicates', found))
+    finder.scan_cancelled.connect(lambda label: outcome.setdefault('cancelled', label))
+    finder.find_duplicates(folder)
+    return outcome
+
+
+def _groups(duplicates: dict) -> list:
+    return sorted(sorted(os.path.relpath(p) for p in paths) for paths in duplicates.values())
+
+
+@pytest.fixture
+def tree(tmp_path, monkeypatch):
+    """Две папки: в каждой по уникальному по размеру файлу на каждый номер и общие дубликаты."""
+    root = tmp_path / "tree"
+    for folder in ("a", "b"):
+        (root / folder).mkdir(parents=True)
+        for i in range(30):
+            (root / folder / f"unique_{i}.bin").write_bytes(b"u" * (i + 1 + (100 if folder == "b" else 0)))
+        for i in range(6):
+            (root / folder / f"dup_{i}.bin").write_bytes(bytes([i]) * 20000)
+    monkeypatch.chdir(root)
+    return str(root)
+
+
+def test_cancel_during_hashing_resumes(tmp_path, checkpoint_dir, tree):
+    expected = _groups(_run(_finder(tmp_path / "reference"), tree)['duplicates'])
+    assert len(expected) == 6
+
+    finder = _finder(tmp_path)
+    finder.status_updated.connect(
+        lambda text: text.startswith("Быстрая проверка") and finder.cancel(), Qt.DirectConnection)
+    assert 'cancelled' in _run(finder, tree)
+    state = finder._make_checkpoint(tree).load()
+    assert state['phase'] == 'hash'
+    assert state['total_files'] == 72
+
+    resumed = _finder(tmp_path)
+    outcome = _run(resumed, tree)
+    assert _groups(outcome['duplicates']) == expected
+    assert resumed.tier_stats['files'] == 72
+    assert not resumed.has_checkpoint(tree)
+
+
+def test_cancel_during_walk_resumes(tmp_path, checkpoint_dir, tree, monkeypatch):
+    expected = _groups(_run(_finder(tmp_path / "reference"), tree)['duplicates'])
+
+    # Сообщение о ходе обхода приходит посреди первой папки; отмена срабатывает на ее границе
+    monkeypatch.setattr(duplicates_module, "WALK_STATUS_EVERY", 10)
+    finder = _finder(tmp_path)
+    finder.status_updated.connect(
+        lambda text: text.startswith("Анализ размера") and finder.cancel(), Qt.DirectConnection)
+    assert 'cancelled' in _run(finder, tree)
+    state = finder._make_checkpoint(tree).load()
+    assert state['phase'] == 'walk'
+    assert state['pending_dirs']
+
+    resumed = _finder(tmp_path)
+    outcome = _run(resumed, tree)
+    assert _groups(outcome['duplicates']) == expected
+    assert resumed.tier_stats['files'] == 72
+    assert not resumed.has_checkpoint(tree)
+
+
+def test_checkpoint_from_other_algorithms_is_ignored(tmp_path, checkpoint_dir):
+    ScanCheckpoint(str(tmp_path), {'full': 'blake2b'}).save({'phase': 'walk'})
+    assert ScanCheckpoint(str(tmp_path), {'full': 'blake2b'}).load()['phase'] == 'walk'
+    assert ScanCheckpoint(str(tmp_path), {'full': 'sha256'}).load() is None
@@ -0,0 +1,76 @@
+# tests/test_similar_images.py
+"""
+Поиск похожих изображений: уменьшенная и пережатая копия попадает в один кластер
+с оригиналом, а непохожее изображение — нет; результат доходит до окна дубликатов.
+"""
+import os
+import random
+import sys
+
+import pytest
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+QtWidgets = pytest.importorskip("PyQt5.QtWidgets")
+Image = pytest.importorskip("PIL.Image")
+from PyQt5.QtCore import QEventLoop, QTimer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.duplicates import DuplicateFinder  # noqa: E402
+from core.hash_cache import HashCache  # noqa: E402
+from core.image_similarity import similarity_to_distance  # noqa: E402
+from ui.duplicate_scan_dialog import DuplicateScanDialog  # noqa: E402
+from ui.duplicates_dialog import DEFAULT_SIMILARITY  # noqa: E402
+
+SCAN_TIMEOUT_MS = 10000
+
+
+@pytest.fixture(scope="module")
+def app():
+    return QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+
+
+def _blocks_image(seed: int, size: int = 256) -> "Image.Image":
+    """Крупные случайные клетки: картинка устойчива к уменьшению, а разные seed непохожи."""
+    rnd = random.Random(seed)
+    cells = 16
+    small = Image.new('L', (cells, cells))
+    small.putdata([rnd.randrange(256) for _ in range(cells * cells)])
+    return small.resize((size, size), Image.NEAREST).convert('RGB')
+
+
+@pytest.fixture
+def images(tmp_path):
+    folder = tmp_path / "images"
+    folder.mkdir()
+    original = _blocks_image(1)
+    original.save(folder / "original.png")
+    original.resize((96, 96), Image.LANCZOS).save(folder / "resized.jpg", quality=70)
+    _blocks_image(2).save(folder / "other.png")
+    return folder
+
+
+def test_resized_copy_clusters_with_original(tmp_path, images):
+    finder = DuplicateFinder(hash_cache=HashCache(tmp_path / "hashes.sqlite"), workers=2)
+    found = []
+    finder.similar_images_found.connect(found.append)
+    finder.find_similar_images(str(images))
+
+    index, = found
+    assert len(index.hashes) == 3
+    clusters = index.clusters(similarity_to_distance(DEFAULT_SIMILARITY))
+    assert [sorted(os.path.basename(p) for p in paths) for paths in clusters] == [["original.png", "resized.jpg"]]
+
+
+def test_scan_dialog_opens_similar_images(app, tmp_path, images):
+    finder = DuplicateFinder(hash_cache=HashCache(tmp_path / "hashes.sqlite"), workers=2)
+    dialog = DuplicateScanDialog(str(images), finder=finder, image_method='dhash')
+    loop = QEventLoop()
+    dialog.finished.connect(loop.quit)
+    QTimer.singleShot(SCAN_TIMEOUT_MS, loop.quit)
+    loop.exec_()
+
+    assert dialog.result() == QtWidgets.QDialog.Accepted
+    assert dialog.has_results()
+    results = dialog.results_dialog()
+    assert results.model.rowCount() == 1
@@ -0,0 +1,135 @@
+# ui/duplicate_scan_dialog.py
+from PyQt5.QtWidgets import QDialog, QVBoxLayout, QHBoxLayout, QPushButton, QLabel, QProgressBar, QMessageBox
+from PyQt5.QtCore import Qt, QThread
+
+from core.duplicates import DuplicateFinder, DuplicateScanJob
+from ui.duplicates_dialog import DuplicatesDialog
+
+
+class DuplicateScanDialog(QDialog):
+    """
+    Ход поиска дубликатов в папке с кнопками паузы и отмены.
+    Поиск идет в отдельном потоке; после успешного завершения диалог принимается (accept),
+    а результат открывается через results_dialog(). Отмененный поиск сохраняет состояние,
+    и следующий поиск в той же папке продолжается с места остановки.
+    С image_method ищутся похожие изображения; их хеши остаются в кеше и после отмены.
+    """
+
+    def __init__(self, folder_path, parent=None, finder: DuplicateFinder = None,
+                 resume_from_checkpoint: bool = True, image_method: str = None):
+        super().__init__(parent)
+        self.setWindowTitle("Поиск похожих изображений" if image_method else "Поиск дубликатов")
+        self.setMinimumWidth(500)
+        self.finder = finder if finder is not None else DuplicateFinder()
+        self.folder_path = folder_path
+        self.image_method = image_method
+        self.duplicates = {}
+        self.hardlinks = {}
+        self.stats = {}
+        self.image_index = None
+        self.cancelled = False
+        self._thread = None
+
+        layout = QVBoxLayout(self)
+        self.status_label = QLabel("Подготовка...")
+        # Длинные пути не должны растягивать окно
+        self.status_label.setMinimumWidth(1)
+        layout.addWidget(self.status_label)
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setRange(0, 100)
+        layout.addWidget(self.progress_bar)
+        btn_layout = QHBoxLayout()
+        btn_layout.addStretch()
+        self.pause_button = QPushButton("Пауза")
+        self.cancel_button = QPushButton("Отмена")
+        btn_layout.addWidget(self.pause_button)
+        btn_layout.addWidget(self.cancel_button)
+        layout.addLayout(btn_layout)
+
+        self.pause_button.clicked.connect(self._toggle_pause)
+        self.cancel_button.clicked.connect(self.reject)
+        self._start(resume_from_checkpoint)
+
+    def _start(self, resume_from_checkpoint: bool):
+        self._thread = QThread(self)
+        self._job = DuplicateScanJob(self.finder, self.folder_path, resume_from_checkpoint, self.image_method)
+        self._job.moveToThread(self._thread)
+        self._thread.started.connect(self._job.run)
+        self.finder.status_updated.connect(self.status_label.setText)
+        self.finder.progress_updated.connect(self.progress_bar.setValue)
+        # Результаты сохраняются прямо в потоке поиска, а читаются только после его завершения
+        self.finder.duplicates_found.connect(self._store_duplicates, Qt.DirectConnection)
+        self.finder.hardlinks_found.connect(self._store_hardlinks, Qt.DirectConnection)
+        self.finder.tier_stats_updated.connect(self._store_stats, Qt.DirectConnection)
+        self.finder.similar_images_found.connect(self._store_image_index, Qt.DirectConnection)
+        self.finder.scan_cancelled.connect(self._store_cancelled, Qt.DirectConnection)
+        self._job.finished.connect(self._thread.quit, Qt.DirectConnection)
+        self._thread.finished.connect(self._on_thread_finished)
+        self._thread.start()
+
+    def _store_duplicates(self, duplicates: dict):
+        self.duplicates = duplicates
+
+    def _store_hardlinks(self, hardlinks: dict):
+        self.hardlinks = hardlinks
+
+    def _store_stats(self, stats: dict):
+        self.stats = stats
+
+    def _store_image_index(self, image_index):
+        self.image_index = image_index
+
+    def _store_cancelled(self, _label: str):
+        self.cancelled = True
+
+    def _toggle_pause(self):
+        if self.finder.control.is_paused:
+            self.finder.resume()
+            self.pause_button.setText("Пауза")
+        else:
+            self.finder.pause()
+            self.pause_button.setText("Продолжить")
+            self.status_label.setText("Поиск приостановлен.")
+
+    def reject(self):
+        """Отмена (кнопка, Esc, закрытие окна): поиск останавливается, окно закрывается по его завершении."""
+        if self._thread is None:
+            super().reject()
+            return
+        self.pause_button.setEnabled(False)
+        self.cancel_button.setEnabled(False)
+        self.status_label.setText("Остановка поиска...")
+        self.finder.cancel()
+
+    def _on_thread_finished(self):
+        # finished приходит, пока поток еще завершается: дожидаемся его (wait отпускает GIL),
+        # иначе удаление объекта потока вместе с окном ждало бы поток, которому нужен GIL
+        self._thread.wait()
+        self._thread.deleteLater()
+        self._thread = None
+        self._job = None
+        if self.cancelled:
+            if self.image_method:
+                text = "Поиск остановлен. Уже вычисленные хеши изображений сохранены в кеше."
+            else:
+                text = ("Поиск остановлен. Состояние сохранено: следующий поиск в этой папке\n"
+                        "продолжится с места остановки.")
+            QMessageBox.information(self, self.windowTitle(), text)
+            super().reject()
+        else:
+            self.accept()
+
+    def has_results(self) -> bool:
+        if self.image_method:
+            # Кластеры зависят от порога схожести, который выбирается уже в окне результатов
+            return self.image_index is not None and len(self.image_index.hashes) > 1
+        return bool(self.duplicates or self.hardlinks)
+
+    def results_dialog(self, parent=None, undo_manager=None) -> DuplicatesDialog:
+        """Диалог с найденными дубликатами; вызывается после успешного завершения поиска."""
+        if self.image_method:
+            return DuplicatesDialog({}, parent, stats=self.finder.tier_stats, image_index=self.image_index,
+                                    undo_manager=undo_manager)
+        return DuplicatesDialog(self.duplicates, parent, hardlinks_data=self.hardlinks, stats=self.stats,
+                                group_sizes=self.finder.group_sizes, file_meta=self.finder.file_meta,
+                                undo_manager=undo_manager)
@@ -1,24 +1,295 @@
 # ui/duplicates_dialog.py
 import os
-from pathlib import Path
-from send2trash import send2trash
 from PyQt5.QtWidgets import (
     QDialog, QVBoxLayout, QHBoxLayout, QPushButton, QMessageBox,
-    QTreeWidget, QTreeWidgetItem, QLabel, QHeaderView, QTreeWidgetItemIterator
+    QTreeView, QLabel, QHeaderView, QSlider, QLineEdit, QProgressDialog
 )
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, QAbstractItemModel, QModelIndex, QTimer, QThread
 
+from core.duplicate_deletion import DeletionJob
+from core.duplicate_linking import LinkJob
+from core.image_similarity import similarity_to_distance
+
+DEFAULT_SIMILARITY = 90
+# Больше групп не разворачиваем автоматически: expandAll обходит каждую строку
+EXPAND_LIMIT = 500
+FILTER_DELAY_MS = 200
+# Сколько ошибок и пропусков перечислять в итоговом сообщении
+SUMMARY_LIMIT = 20
+
+COL_NAME, COL_PATH, COL_SIZE, COL_RECLAIM = range(4)
+KIND_DUPLICATE, KIND_HARDLINK, KIND_SIMILAR = range(3)
+
+
+def format_size(num_bytes: int) -> str:
+    for unit in ("Б", "КБ", "МБ", "ГБ"):
+        if num_bytes < 1024:
+            return f"{num_bytes:.0f} {unit}" if unit == "Б" else f"{num_bytes:.1f} {unit}"
+        num_bytes /= 1024
+    return f"{num_bytes:.1f} ТБ"
+
+
+class DuplicateGroup:
+    """Одна группа результата. Отмеченные файлы хранятся множеством индексов в paths."""
+    __slots__ = ('kind', 'number', 'paths', 'size', 'checked', '_search_text')
+
+    def __init__(self, kind: int, number: int, paths: list, size: int = None, checked=()):
+        self.kind = kind
+        self.number = number
+        self.paths = paths
+        self.size = size
+        self.checked = set(checked)
+        self._search_text = None
+
+    @property
+    def checkable(self) -> bool:
+        # Жесткие ссылки указывают на одни данные, их удаление места не освобождает
+        return self.kind != KIND_HARDLINK
+
+    def file_size(self) -> int:
+        if self.size is None:
+            try:
+                self.size = os.path.getsize(self.paths[0])
+            except OSError:
+                self.size = 0
+        return self.size
+
+    def reclaimable(self) -> int:
+        return self.file_size() * (len(self.paths) - 1) if self.kind == KIND_DUPLICATE else 0
+
+    def search_text(self) -> str:
+        if self._search_text is None:
+            self._search_text = "\n".join(self.paths).lower()
+        return self._search_text
+
+    def title(self) -> str:
+        if self.kind == KIND_HARDLINK:
+            return f"Жесткие ссылки {self.number} ({len(self.paths)} ссылки, место не занимают)"
+        if self.kind == KIND_SIMILAR:
+            return f"Похожие изображения {self.number} ({len(self.paths)} файла)"
+        return f"Группа {self.number} ({len(self.paths)} файла)"
+
+
+class DuplicatesModel(QAbstractItemModel):
+    """
+    Ленивая двухуровневая модель (группы и их файлы) поверх списков путей из результата поиска.
+    Элементы Qt заранее не создаются: представление запрашивает только видимые строки.
+    internalId индекса: 0 у строки группы, номер группы + 1 у строки файла.
+    """
+    HEADERS = ["Файл", "Путь", "Размер", "Можно освободить"]
+
+    def __init__(self, groups: list, parent=None):
+        super().__init__(parent)
+        self._base_groups = groups
+        self._groups = list(groups)
+        self._filter = ""
+        self._sort = None
+        self._order = []
+        self._row_of = []
+        self._rebuild_order(reset=False)
+
+    # --- Структура ---
+    def index(self, row, column, parent=QModelIndex()):
+        if not parent.isValid():
+            if 0 <= row < len(self._order):
+                return self.createIndex(row, column, 0)
+            return QModelIndex()
+        if parent.internalId() != 0:
+            return QModelIndex()
+        group_idx = self._order[parent.row()]
+        if 0 <= row < len(self._groups[group_idx].paths):
+            return self.createIndex(row, column, group_idx + 1)
+        return QModelIndex()
+
+    def parent(self, index):
+        if not index.isValid() or index.internalId() == 0:
+            return QModelIndex()
+        return self.createIndex(self._row_of[index.internalId() - 1], 0, 0)
+
+    def rowCount(self, parent=QModelIndex()):
+        if not parent.isValid():
+            return len(self._order)
+        if parent.internalId() == 0 and parent.column() == 0:
+            return len(self._groups[self._order[parent.row()]].paths)
+        return 0
+
+    def columnCount(self, parent=QModelIndex()):
+        return len(self.HEADERS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return self.HEADERS[section]
+        return None
+
+    def _group_for(self, index):
+        """Возвращает (группа, номер файла в группе или None для строки группы)."""
+        if index.internalId() == 0:
+            return self._groups[self._order[index.row()]], None
+        return self._groups[index.internalId() - 1], index.row()
+
+    # --- Данные ---
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        group, file_row = self._group_for(index)
+        column = index.column()
+
+        if role == Qt.DisplayRole:
+            if file_row is None:
+                if column == COL_NAME:
+                    return group.title()
+                if column == COL_SIZE:
+                    return format_size(group.file_size())
+                if column == COL_RECLAIM and group.kind == KIND_DUPLICATE:
+                    return format_size(group.reclaimable())
+                return None
+            path = group.paths[file_row]
+            if column == COL_NAME:
+                return os.path.basename(path)
+            if column == COL_PATH:
+                return os.path.dirname(path)
+            return None
+
+        if role == Qt.CheckStateRole and column == COL_NAME and group.checkable:
+            if file_row is not None:
+                return Qt.Checked if file_row in group.checked else Qt.Unchecked
+            if not group.checked:
+                return Qt.Unchecked
+            return Qt.Checked if len(group.checked) >= len(group.paths) - 1 else Qt.PartiallyChecked
+
+        if role in (Qt.UserRole, Qt.ToolTipRole) and file_row is not None:
+            return group.paths[file_row]
+        return None
+
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.NoItemFlags
+        group, file_row = self._group_for(index)
+        flags = Qt.ItemIsEnabled
+        if file_row is not None:
+            flags |= Qt.ItemIsSelectable
+        if group.checkable and index.column() == COL_NAME:
+            flags |= Qt.ItemIsUserCheckable
+        return flags
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if role != Qt.CheckStateRole or not index.isValid():
+            return False
+        group, file_row = self._group_for(index)
+        if not group.checkable:
+            return False
+        checked = (value == Qt.Checked)
+        if file_row is None:
+            # Отметка группы выбирает все файлы, кроме первого: одна копия всегда остается
+            group.checked = set(range(1, len(group.paths))) if checked else set()
+            self.dataChanged.emit(index, index, [Qt.CheckStateRole])
+            self.dataChanged.emit(self.index(0, COL_NAME, index),
+                                  self.index(len(group.paths) - 1, COL_NAME, index), [Qt.CheckStateRole])
+        else:
+            if checked:
+                group.checked.add(file_row)
+            else:
+                group.checked.discard(file_row)
+            group_index = self.parent(index)
+            self.dataChanged.emit(index, index, [Qt.CheckStateRole])
+            self.dataChanged.emit(group_index, group_index, [Qt.CheckStateRole])
+        return True
+
+    # --- Сортировка и фильтр ---
+    def sort(self, column, order=Qt.AscendingOrder):
+        self._sort = (column, order)
+        self._rebuild_order()
+
+    def set_filter(self, text: str) -> None:
+        self._filter = text.strip().lower()
+        self._rebuild_order()
+
+    def set_similar_groups(self, groups: list) -> None:
+        """Заменяет группы похожих изображений, не трогая отметки в группах дубликатов."""
+        self._groups = self._base_groups + groups
+        self._rebuild_order()
+
+    def _rebuild_order(self, reset: bool = True):
+        """Пересчитывает видимый порядок групп. Сами группы и отметки в них не копируются."""
+        if reset:
+            self.beginResetModel()
+        order = list(range(len(self._groups)))
+        if self._filter:
+            order = [i for i in order if self._filter in self._groups[i].search_text()]
+        if self._sort is not None:
+            column, sort_order = self._sort
+            groups = self._groups
+            sort_keys = {
+                COL_NAME: lambda i: len(groups[i].paths),
+                COL_PATH: lambda i: groups[i].paths[0].lower(),
+                COL_SIZE: lambda i: groups[i].file_size(),
+                COL_RECLAIM: lambda i: groups[i].reclaimable(),
+            }
+            order.sort(key=sort_keys[column], reverse=(sort_order == Qt.DescendingOrder))
+        self._order = order
+        self._row_of = [0] * len(self._groups)
+        for row, group_idx in enumerate(order):
+            self._row_of[group_idx] = row
+        if reset:
+            self.endResetModel()
+
+    def checked_paths(self) -> list:
+        return [group.paths[i] for group in self._groups for i in sorted(group.checked)]
+
+    def link_groups(self) -> list:
+        """
+        [(канонический путь, [отмеченные пути])] для групп точных дубликатов.
+        Каноническим становится первый неотмеченный файл группы, а если отмечены все — первый.
+        """
+        result = []
+        for group in self._groups:
+            if group.kind != KIND_DUPLICATE or not group.checked:
+                continue
+            keep = next((i for i in range(len(group.paths)) if i not in group.checked), 0)
+            targets = [group.paths[i] for i in sorted(group.checked) if i != keep]
+            if targets:
+                result.append((group.paths[keep], targets))
+        return result
+
+    def fully_checked_groups(self) -> int:
+        """Количество групп, где отмечены все файлы и не останется ни одной копии."""
+        return sum(1 for group in self._groups
+                   if group.kind == KIND_DUPLICATE and len(group.checked) == len(group.paths))
 
 
 class DuplicatesDialog(QDialog):
-    def __init__(self, duplicates_data: dict, parent=None):
+    def __init__(self, duplicates_data: dict, parent=None, hardlinks_data: dict = None, stats: dict = None,
+                 image_index=None, group_sizes: dict = None, file_meta: dict = None, undo_manager=None):
         super().__init__(parent)
         self.duplicates_data = duplicates_data
+        # Жесткие ссылки показываются отдельно: их удаление не освобождает место
+        self.hardlinks_data = hardlinks_data or {}
+        self.stats = stats or {}
+        # ImageHashIndex с перцептивными хешами; кластеры пересчитываются при смене порога
+        self.image_index = image_index
+        # Размеры групп из результата поиска; без них размер читается с диска при первом показе
+        self.group_sizes = group_sizes or {}
+        # (размер, mtime_ns) файлов на момент поиска: измененные после него файлы не удаляются
+        self.file_meta = file_meta or {}
+        # Замена ссылками записывается в историю отмены, если она передана
+        self.undo_manager = undo_manager
+        self._job_thread = None
+        self._job = None
+        self._job_result = None
         self.setWindowTitle("Найденные дубликаты файлов")
-        self.setGeometry(150, 150, 700, 500)
+        self.setGeometry(150, 150, 800, 550)
         self._init_ui()
         self._populate_tree()
 
+    @staticmethod
+    def from_index(duplicate_index, parent=None, undo_manager=None):
+        """Создает диалог по живому индексу, без повторного сканирования папки."""
+        return DuplicatesDialog(duplicate_index.duplicates(), parent, undo_manager=undo_manager,
+                                hardlinks_data=duplicate_index.hardlink_sets(),
+                                stats=duplicate_index.stats(),
+                                group_sizes=duplicate_index.group_sizes(),
+                                file_meta=duplicate_index.file_meta())
+
     def _init_ui(self):
         layout = QVBoxLayout(self)
 
@@ -28,81 +299,203 @@ class DuplicatesDialog(QDialog):
         )
         layout.addWidget(info_label)
 
-        self.tree = QTreeWidget()
-        self.tree.setHeaderLabels(["Файл", "Путь"])
-        self.tree.header().setSectionResizeMode(0, QHeaderView.Stretch)
-        self.tree.header().setSectionResizeMode(1, QHeaderView.ResizeToContents)
+        if 'reclaimable_bytes' in self.stats:
+            layout.addWidget(QLabel(f"Можно освободить: {format_size(self.stats['reclaimable_bytes'])}"))
+
+        self.filter_edit = QLineEdit()
+        self.filter_edit.setPlaceholderText("Фильтр по пути...")
+        self.filter_edit.setClearButtonEnabled(True)
+        layout.addWidget(self.filter_edit)
+
+        self.tree = QTreeView()
+        # Одинаковая высота строк позволяет представлению не измерять каждую строку
+        self.tree.setUniformRowHeights(True)
+        self.tree.setSortingEnabled(True)
         layout.addWidget(self.tree)
 
+        if self.image_index is not None:
+            threshold_layout = QHBoxLayout()
+            self.similarity_label = QLabel()
+            self.similarity_slider = QSlider(Qt.Horizontal)
+            self.similarity_slider.setRange(70, 100)
+            self.similarity_slider.setValue(DEFAULT_SIMILARITY)
+            threshold_layout.addWidget(QLabel("Схожесть изображений:"))
+            threshold_layout.addWidget(self.similarity_slider)
+            threshold_layout.addWidget(self.similarity_label)
+            layout.addLayout(threshold_layout)
+            self.similarity_slider.valueChanged.connect(self._populate_similar_images)
+
         button_layout = QHBoxLayout()
+        self.link_button = QPushButton("Заменить ссылками")
+        self.link_button.setToolTip("Отмеченные копии заменяются ссылками на оставленный файл:\n"
+                                    "все пути сохраняются, а место на диске освобождается.")
         self.delete_button = QPushButton("Переместить в корзину")
         self.close_button = QPushButton("Закрыть")
         button_layout.addStretch()
+        button_layout.addWidget(self.link_button)
         button_layout.addWidget(self.delete_button)
         button_layout.addWidget(self.close_button)
         layout.addLayout(button_layout)
 
+        # Фильтр применяется с задержкой, а не на каждую введенную букву
+        self._filter_timer = QTimer(self)
+        self._filter_timer.setSingleShot(True)
+        self._filter_timer.setInterval(FILTER_DELAY_MS)
+        self._filter_timer.timeout.connect(self._apply_filter)
+        self.filter_edit.textChanged.connect(self._filter_timer.start)
+
         self.delete_button.clicked.connect(self._delete_selected)
+        self.link_button.clicked.connect(self._link_selected)
         self.close_button.clicked.connect(self.accept)
 
     def _populate_tree(self):
-        """Заполняет дерево данными о дубликатах."""
+        """Создает модель по данным о дубликатах."""
+        groups = []
         for i, (file_hash, files) in enumerate(self.duplicates_data.items()):
-            # Родительский элемент для группы
-            group_item = QTreeWidgetItem(self.tree, [f"Группа {i + 1} ({len(files)} файла)"])
-            group_item.setFlags(group_item.flags() & ~Qt.ItemIsSelectable)  # Нельзя выбрать саму группу
+            # Первый файл в группе оставляем неотмеченным, остальные отмечаем для удаления
+            groups.append(DuplicateGroup(KIND_DUPLICATE, i + 1, files, self.group_sizes.get(file_hash),
+                                         checked=range(1, len(files))))
+        for i, links in enumerate(self.hardlinks_data.values()):
+            groups.append(DuplicateGroup(KIND_HARDLINK, i + 1, links))
+
+        self.model = DuplicatesModel(groups, self)
+        self.tree.setModel(self.model)
+        header = self.tree.header()
+        header.setSectionResizeMode(COL_NAME, QHeaderView.Stretch)
+        header.setSectionResizeMode(COL_PATH, QHeaderView.Interactive)
+        header.setSectionResizeMode(COL_SIZE, QHeaderView.ResizeToContents)
+        header.setSectionResizeMode(COL_RECLAIM, QHeaderView.ResizeToContents)
+        # Сначала группы, удаление которых освободит больше всего места
+        self.tree.sortByColumn(COL_RECLAIM, Qt.DescendingOrder)
 
-            # Дочерние элементы - файлы
-            for filepath_str in files:
-                filepath = Path(filepath_str)
-                file_item = QTreeWidgetItem(group_item, [filepath.name, str(filepath.parent)])
-                file_item.setFlags(file_item.flags() | Qt.ItemIsUserCheckable)
-                # Первый файл в группе оставляем неотмеченным по умолчанию
-                if files.index(filepath_str) == 0:
-                    file_item.setCheckState(0, Qt.Unchecked)
-                else:
-                    file_item.setCheckState(0, Qt.Checked)  # Остальные отмечаем для удаления
+        if self.image_index is not None:
+            self._populate_similar_images(self.similarity_slider.value())
+        self._expand_if_small()
 
-                file_item.setData(0, Qt.UserRole, filepath_str)  # Сохраняем полный путь
+    def _expand_if_small(self):
+        if self.model.rowCount() <= EXPAND_LIMIT:
+            self.tree.expandAll()
 
-        self.tree.expandAll()
+    def _apply_filter(self):
+        self.model.set_filter(self.filter_edit.text())
+        self._expand_if_small()
+
+    def _populate_similar_images(self, similarity: int):
+        """Перестраивает группы похожих изображений для текущего порога схожести."""
+        self.similarity_label.setText(f"{similarity}%")
+        clusters = self.image_index.clusters(similarity_to_distance(similarity))
+        # Похожие файлы не идентичны, поэтому по умолчанию ничего не отмечаем
+        self.model.set_similar_groups([DuplicateGroup(KIND_SIMILAR, i + 1, paths)
+                                       for i, paths in enumerate(clusters)])
+        self._expand_if_small()
 
     def _delete_selected(self):
         """Собирает отмеченные файлы и предлагает их удалить."""
-        files_to_delete = []
-        iterator = QTreeWidgetItemIterator(self.tree)
-        while iterator.value():
-            item = iterator.value()
-            if item.checkState(0) == Qt.Checked:
-                full_path = item.data(0, Qt.UserRole)
-                if full_path:
-                    files_to_delete.append(full_path)
-            iterator += 1
+        files_to_delete = self.model.checked_paths()
 
         if not files_to_delete:
             QMessageBox.warning(self, "Ничего не выбрано", "Пожалуйста, отметьте файлы для удаления.")
             return
 
-        reply = QMessageBox.question(
-            self,
-            "Подтверждение",
-            f"Вы уверены, что хотите переместить {len(files_to_delete)} файлов в Корзину?",
-            QMessageBox.Yes | QMessageBox.No
-        )
+        question = f"Вы уверены, что хотите переместить {len(files_to_delete)} файлов в Корзину?"
+        fully_checked = self.model.fully_checked_groups()
+        if fully_checked:
+            question += f"\n\nВнимание: в {fully_checked} группах отмечены все файлы, ни одной копии не останется."
+        reply = QMessageBox.question(self, "Подтверждение", question, QMessageBox.Yes | QMessageBox.No)
 
         if reply == QMessageBox.Yes:
-            deleted_count = 0
-            errors = []
-            for f in files_to_delete:
-                try:
-                    send2trash(f)
-                    deleted_count += 1
-                except Exception as e:  # send2trash может вызвать разные ошибки
-                    errors.append(f"{Path(f).name}: {e}")
-
-            summary_message = f"Перемещено в корзину {deleted_count} из {len(files_to_delete)} файлов."
-            if errors:
-                summary_message += "\n\nПроизошли следующие ошибки:\n" + "\n".join(errors)
-
-            QMessageBox.information(self, "Результат", summary_message)
-            self.accept()
\ No newline at end of file
+            self._start_deletion(files_to_delete)
+
+    def _link_selected(self):
+        """Заменяет отмеченные копии ссылками на оставленный в группе файл."""
+        groups = self.model.link_groups()
+        if not groups:
+            QMessageBox.warning(self, "Ничего не выбрано", "Пожалуйста, отметьте копии в группах дубликатов.")
+            return
+        count = sum(len(targets) for _, targets in groups)
+        reply = QMessageBox.question(
+            self, "Подтверждение",
+            f"Заменить {count} файлов ссылками на оставленные копии?\n"
+            "Где файловая система позволяет, создается reflink-копия, иначе — жесткая ссылка.",
+            QMessageBox.Yes | QMessageBox.No)
+        if reply != QMessageBox.Yes:
+            return
+        job = LinkJob(groups, self.file_meta)
+        if self.undo_manager is not None:
+            job.operation_logged.connect(self.undo_manager.add_operation)
+        self._start_job(job, job.linking_finished, "Замена дубликатов ссылками", "Замена файлов ссылками...",
+                        self._on_linking_finished)
+
+    def _start_deletion(self, files_to_delete: list):
+        job = DeletionJob(files_to_delete, self.file_meta)
+        self._start_job(job, job.deletion_finished, "Удаление дубликатов", "Перемещение файлов в корзину...",
+                        self._on_deletion_finished)
+
+    def _start_job(self, job, finished_signal, title: str, label: str, on_finished):
+        """Запускает фоновую операцию над файлами в отдельном потоке с индикатором прогресса."""
+        self.delete_button.setEnabled(False)
+        self.link_button.setEnabled(False)
+        self._progress = QProgressDialog(label, "Отмена", 0, 100, self)
+        self._progress.setWindowTitle(title)
+        self._progress.setWindowModality(Qt.WindowModal)
+        self._progress.setMinimumDuration(0)
+        self._progress.setAutoClose(False)
+        self._progress.setAutoReset(False)
+
+        self._job_thread = QThread(self)
+        self._job = job
+        self._job_result = None
+        job.moveToThread(self._job_thread)
+        self._job_thread.started.connect(job.run)
+        job.progress_updated.connect(self._progress.setValue)
+        job.status_updated.connect(self._progress.setLabelText)
+        # Итог запоминается и поток останавливается прямо в рабочем потоке; окно с итогом
+        # показывается уже по QThread.finished, когда ждать потока не нужно
+        finished_signal.connect(self._store_job_result, Qt.DirectConnection)
+        finished_signal.connect(self._job_thread.quit, Qt.DirectConnection)
+        self._job_thread.finished.connect(lambda: self._finish_job(on_finished))
+        # Отмена срабатывает между файлами: уже начатая операция с файлом не прерывается
+        self._progress.canceled.connect(job.cancel, Qt.DirectConnection)
+        self._job_thread.start()
+
+    def _store_job_result(self, result: dict):
+        self._job_result = result
+
+    def _finish_job(self, on_finished):
+        self._progress.close()
+        self._job_thread.deleteLater()
+        self._job_thread = None
+        self._job = None
+        on_finished(self._job_result)
+
+    def _summary_details(self, result: dict) -> str:
+        details = ""
+        if result['cancelled']:
+            details += "\nОперация отменена, остальные файлы не тронуты."
+        if result['skipped']:
+            details += "\n\nПропущены:\n" + "\n".join(
+                f"{os.path.basename(path)}: {reason}" for path, reason in result['skipped'][:SUMMARY_LIMIT])
+        if result['errors']:
+            details += "\n\nПроизошли следующие ошибки:\n" + "\n".join(
+                f"{os.path.basename(path)}: {error}" for path, error in result['errors'][:SUMMARY_LIMIT])
+        if len(result['skipped']) > SUMMARY_LIMIT or len(result['errors']) > SUMMARY_LIMIT:
+            details += "\n\nПодробности записаны в журнал."
+        return details
+
+    def _on_deletion_finished(self, result: dict):
+        summary_message = f"Перемещено в корзину {len(result['deleted'])} файлов." + self._summary_details(result)
+        QMessageBox.information(self, "Результат", summary_message)
+        self.accept()
+
+    def _on_linking_finished(self, result: dict):
+        summary_message = (f"Заменено ссылками {len(result['linked'])} файлов, "
+                           f"освобождено {format_size(result['reclaimed_bytes'])}." + self._summary_details(result))
+        QMessageBox.information(self, "Результат", summary_message)
+        self.accept()
+
+    def reject(self):
+        # Закрытие окна во время операции только отменяет ее; окно закроется по ее завершении
+        if self._job_thread is not None and self._job_thread.isRunning():
+            self._job.cancel()
+            return
+        super().reject()
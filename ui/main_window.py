@@ -2,7 +2,7 @@
 import logging
 from datetime import datetime
 
-from PyQt5.QtCore import Qt, QSize, pyqtSignal
+from PyQt5.QtCore import Qt, QSize, QThread, pyqtSignal
 from PyQt5.QtGui import QIcon, QColor, QKeySequence, QFont
 from PyQt5.QtWidgets import (QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
                              QStackedWidget, QPushButton, QListWidget, QCheckBox,
@@ -11,11 +11,18 @@ from PyQt5.QtWidgets import (QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
                              QLineEdit, QListWidgetItem, QTableWidgetItem,
                              QHeaderView, QAbstractItemView, QMessageBox, QFrame,
                              QRadioButton, QButtonGroup, QFileDialog, QFontDialog, QSizePolicy,
-                             QSpinBox)
+                             QSpinBox, QProgressBar, QDialog)
 
+from core.duplicates import DuplicateFinder
+from core.image_similarity import PIL_AVAILABLE
+from core.organization_plan import OrganizationPlan, OP_PENDING
+from core.organizer import OrganizationJob
 from core.snapshot_manager import SnapshotManager
+from core.undo_manager import UndoManager
 from core.utils import save_config
-from ui.rules_dialog import RulesDialog
+from ui.rules_dialog import RulesDialog, CONDITION_DISPLAY
+from ui.duplicates_dialog import DuplicatesDialog
+from ui.duplicate_scan_dialog import DuplicateScanDialog
 
 
 class HotkeyLineEdit(QLineEdit):
@@ -43,7 +50,11 @@ class HotkeyLineEdit(QLineEdit):
 
 
 class MainWindow(QMainWindow):
-    def __init__(self, config, box_manager, hotkey_manager, wallpaper_manager, version, parent=None):
+    # Продвинутые правила изменены: классификатор должен перекомпилировать их
+    rules_changed = pyqtSignal()
+
+    def __init__(self, config, box_manager, hotkey_manager, wallpaper_manager, version,
+                 duplicate_index=None, organizer=None, parent=None):
         super().__init__(parent)
         self.logger = logging.getLogger(__name__)
         self.config = config
@@ -51,7 +62,12 @@ class MainWindow(QMainWindow):
         self.hotkey_manager = hotkey_manager
         self.wallpaper_manager = wallpaper_manager
         self.version = version
+        self.duplicate_index = duplicate_index
+        self.organizer = organizer
         self.snapshot_manager = SnapshotManager(self.box_manager)
+        self.undo_manager = UndoManager()
+        self._organization_thread = None
+        self._organization_job = None
 
         self.setWindowTitle(f"iTop Easy Desktop v{self.version}")
         self.setMinimumSize(850, 650)
@@ -87,6 +103,12 @@ class MainWindow(QMainWindow):
         for page in self.pages.values():
             self.stacked_widget.addWidget(page)
 
+        # Строка состояния показывает ход фоновой организации рабочего стола
+        self.organization_progress = QProgressBar()
+        self.organization_progress.setMaximumWidth(200)
+        self.organization_progress.setVisible(False)
+        self.statusBar().addPermanentWidget(self.organization_progress)
+
     def _create_side_menu(self):
         menu_list = QListWidget()
         menu_list.setObjectName("SideMenu")
@@ -196,6 +218,38 @@ class MainWindow(QMainWindow):
         btn_layout.addWidget(self.edit_rule_btn)
         btn_layout.addWidget(self.delete_rule_btn)
         layout.addLayout(btn_layout)
+        self.show_duplicates_btn = QPushButton(QIcon(":/icons/copy.png"), "Дубликаты на рабочем столе")
+        layout.addWidget(self.show_duplicates_btn)
+        self.scan_duplicates_btn = QPushButton(QIcon(":/icons/search.png"), "Найти дубликаты в папке...")
+        layout.addWidget(self.scan_duplicates_btn)
+        self.scan_similar_images_btn = QPushButton(QIcon(":/icons/search.png"), "Похожие изображения в папке...")
+        layout.addWidget(self.scan_similar_images_btn)
+
+        self.show_plan_btn = QPushButton(QIcon(":/icons/rules.png"), "План организации...")
+        layout.addWidget(self.show_plan_btn)
+        # Виден, только если есть прерванный план (например, приложение закрыли во время организации)
+        self.resume_plan_btn = QPushButton(QIcon(":/icons/rules.png"), "Продолжить прерванный план...")
+        self.resume_plan_btn.setVisible(False)
+        layout.addWidget(self.resume_plan_btn)
+        self.undo_btn = QPushButton("Отменить последнюю операцию")
+        self.undo_btn.setShortcut(QKeySequence.Undo)
+        layout.addWidget(self.undo_btn)
+
+        # Пробный прогон: какие правила срабатывают на текущем рабочем столе и сколько стоят
+        self.simulate_rules_btn = QPushButton(QIcon(":/icons/rules.png"), "Пробный прогон правил")
+        layout.addWidget(self.simulate_rules_btn)
+        self.simulation_summary_label = QLabel()
+        self.simulation_summary_label.setWordWrap(True)
+        self.simulation_summary_label.setVisible(False)
+        layout.addWidget(self.simulation_summary_label)
+        self.simulation_table = QTableWidget(0, 5)
+        self.simulation_table.setHorizontalHeaderLabels(["Правило", "Получило файлов", "Подходит файлов",
+                                                         "Время, мс", "Замечание"])
+        self.simulation_table.horizontalHeader().setSectionResizeMode(0, QHeaderView.Stretch)
+        self.simulation_table.horizontalHeader().setSectionResizeMode(4, QHeaderView.Stretch)
+        self.simulation_table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.simulation_table.setVisible(False)
+        layout.addWidget(self.simulation_table)
         return page
 
     def _create_snapshots_page(self):
@@ -255,6 +309,13 @@ class MainWindow(QMainWindow):
         self.add_rule_btn.clicked.connect(self._add_rule)
         self.edit_rule_btn.clicked.connect(self._edit_rule)
         self.delete_rule_btn.clicked.connect(self._delete_rule)
+        self.show_duplicates_btn.clicked.connect(self._show_duplicates)
+        self.scan_duplicates_btn.clicked.connect(self._scan_folder_duplicates)
+        self.scan_similar_images_btn.clicked.connect(self._scan_similar_images)
+        self.simulate_rules_btn.clicked.connect(self._simulate_rules)
+        self.show_plan_btn.clicked.connect(self._show_organization_plan)
+        self.resume_plan_btn.clicked.connect(self._resume_organization_plan)
+        self.undo_btn.clicked.connect(self._undo_last_operation)
         self.create_snapshot_btn.clicked.connect(self._create_new_snapshot)
         self.static_wallpaper_btn.clicked.connect(self._select_static_wallpaper)
         self.solid_color_btn.clicked.connect(self._select_solid_color)
@@ -285,6 +346,7 @@ class MainWindow(QMainWindow):
         self._load_hotkeys()
         self._load_global_settings()
         self.box_manager.load_boxes()
+        self._update_resume_plan_button()
         self.side_menu.setCurrentRow(0)
 
     def open_settings_for_box(self, box_id: str):
@@ -490,6 +552,7 @@ class MainWindow(QMainWindow):
             self.config["advanced_rules"].append(new_rule)
             save_config(self.config)
             self._populate_rules_list()
+            self.rules_changed.emit()
 
     def _edit_rule(self):
         selected = self.rules_list_widget.currentItem()
@@ -501,6 +564,7 @@ class MainWindow(QMainWindow):
             self.config["advanced_rules"][rule_index] = updated_rule
             save_config(self.config)
             self._populate_rules_list()
+            self.rules_changed.emit()
 
     def _delete_rule(self):
         selected = self.rules_list_widget.currentItem()
@@ -509,6 +573,186 @@ class MainWindow(QMainWindow):
             self.config["advanced_rules"].pop(selected.data(Qt.UserRole))
             save_config(self.config)
             self._populate_rules_list()
+            self.rules_changed.emit()
+
+    def _show_duplicates(self):
+        if self.duplicate_index is None or not self.duplicate_index.ready:
+            QMessageBox.information(self, "Дубликаты", "Индекс дубликатов еще не построен: он строится при запуске\n"
+                                    "наблюдения за рабочим столом. Попробуйте чуть позже.")
+            return
+        DuplicatesDialog.from_index(self.duplicate_index, parent=self, undo_manager=self.undo_manager).exec_()
+
+    def _scan_folder_duplicates(self):
+        """Поиск дубликатов в выбранной папке с возможностью паузы, отмены и продолжения."""
+        folder = QFileDialog.getExistingDirectory(self, "Папка для поиска дубликатов")
+        if not folder:
+            return
+        finder = DuplicateFinder()
+        resume = True
+        if finder.has_checkpoint(folder):
+            answer = QMessageBox.question(
+                self, "Поиск дубликатов", "Поиск в этой папке был прерван. Продолжить с места остановки?\n"
+                "«Нет» — начать заново.", QMessageBox.Yes | QMessageBox.No, QMessageBox.Yes)
+            resume = answer == QMessageBox.Yes
+        scan = DuplicateScanDialog(folder, self, finder=finder, resume_from_checkpoint=resume)
+        if scan.exec_() != QDialog.Accepted:
+            return
+        if not scan.has_results():
+            QMessageBox.information(self, "Поиск дубликатов", "Дубликаты не найдены.")
+            return
+        scan.results_dialog(self, undo_manager=self.undo_manager).exec_()
+
+    def _scan_similar_images(self):
+        """Поиск уменьшенных и пережатых копий изображений; порог схожести выбирается в окне результатов."""
+        if not PIL_AVAILABLE:
+            QMessageBox.warning(self, "Похожие изображения", "Поиск похожих изображений недоступен:\n"
+                                "не установлена библиотека Pillow.")
+            return
+        folder = QFileDialog.getExistingDirectory(self, "Папка для поиска похожих изображений")
+        if not folder:
+            return
+        scan = DuplicateScanDialog(folder, self, image_method='dhash')
+        if scan.exec_() != QDialog.Accepted:
+            return
+        if not scan.has_results():
+            QMessageBox.information(self, "Похожие изображения", "В папке не найдено изображений для сравнения.")
+            return
+        scan.results_dialog(self, undo_manager=self.undo_manager).exec_()
+
+    def _show_organization_plan(self):
+        """Показывает план организации рабочего стола и выполняет его после подтверждения."""
+        if self.organizer is None or self.organizer.desktop_path is None:
+            QMessageBox.warning(self, "План организации", "Рабочий стол не найден.")
+            return
+        plan = self.organizer.plan_desktop()
+        if not len(plan):
+            QMessageBox.information(self, "План организации", "Ни одно правило не срабатывает: делать нечего.")
+            return
+        box = QMessageBox(QMessageBox.Question, "План организации",
+                          f"Операций в плане: {len(plan)}. Выполнить?", QMessageBox.Yes | QMessageBox.No, self)
+        box.setDetailedText("\n".join(plan.describe()))
+        if box.exec_() != QMessageBox.Yes:
+            return
+        self.start_organization(plan)
+
+    def start_organization(self, plan=None):
+        """
+        Запускает организацию рабочего стола (или выполнение плана) в фоновом потоке;
+        ход и итог отображаются в строке состояния.
+        """
+        if self.organizer is None:
+            return
+        if self._organization_thread is not None:
+            self.statusBar().showMessage("Организация рабочего стола уже выполняется.", 5000)
+            return
+        self.show_plan_btn.setEnabled(False)
+        self.resume_plan_btn.setEnabled(False)
+        self.undo_btn.setEnabled(False)
+        self.organization_progress.setValue(0)
+        self.organization_progress.setVisible(True)
+        self.statusBar().showMessage("Организация рабочего стола...")
+
+        self._organization_thread = QThread(self)
+        self._organization_job = OrganizationJob(self.organizer, plan)
+        self._organization_job.moveToThread(self._organization_thread)
+        self._organization_thread.started.connect(self._organization_job.run)
+        self.organizer.progress_updated.connect(self.organization_progress.setValue)
+        self.organizer.organization_completed.connect(self._on_organization_completed)
+        # Поток останавливается прямо из рабочего потока: через очередь интерфейса quit не дошел бы,
+        # пока closeEvent ждет поток
+        self._organization_job.finished.connect(self._organization_thread.quit, Qt.DirectConnection)
+        self._organization_thread.finished.connect(self._on_organization_thread_finished)
+        self._organization_thread.start()
+
+    def _on_organization_completed(self, message: str):
+        self.statusBar().showMessage(message, 10000)
+
+    def _on_organization_thread_finished(self):
+        self.organizer.progress_updated.disconnect(self.organization_progress.setValue)
+        self.organizer.organization_completed.disconnect(self._on_organization_completed)
+        self.organization_progress.setVisible(False)
+        self.show_plan_btn.setEnabled(True)
+        self.resume_plan_btn.setEnabled(True)
+        self.undo_btn.setEnabled(True)
+        self._organization_thread.deleteLater()
+        self._organization_thread = None
+        self._organization_job = None
+        # Остановленная организация оставляет невыполненные операции в плане
+        self._update_resume_plan_button()
+
+    def _update_resume_plan_button(self):
+        if self.organizer is None:
+            return
+        plans = OrganizationPlan.unfinished()
+        self.resume_plan_btn.setVisible(bool(plans))
+        if plans:
+            self.resume_plan_btn.setText(
+                f"Продолжить прерванный план ({plans[0].counts()[OP_PENDING]} операций)...")
+
+    def _resume_organization_plan(self):
+        """Предлагает довыполнить последний прерванный план; выполненные по журналу операции не повторяются."""
+        plans = OrganizationPlan.unfinished()
+        if not plans:
+            self._update_resume_plan_button()
+            return
+        plan = plans[0]
+        box = QMessageBox(QMessageBox.Question, "Прерванный план",
+                          f"План от {plan.created.replace('T', ' ')} выполнен не до конца: "
+                          f"осталось операций {plan.counts()[OP_PENDING]}. Продолжить?",
+                          QMessageBox.Yes | QMessageBox.No | QMessageBox.Discard, self)
+        box.button(QMessageBox.Discard).setText("Удалить план")
+        box.setDetailedText("\n".join(op.describe() for op in plan.operations if op.status == OP_PENDING))
+        answer = box.exec_()
+        if answer == QMessageBox.Yes:
+            self.start_organization(plan)
+        elif answer == QMessageBox.Discard:
+            plan.discard()
+            self._update_resume_plan_button()
+
+    def _undo_last_operation(self):
+        success, message = self.undo_manager.undo_last()
+        if success:
+            self.statusBar().showMessage(message, 10000)
+        else:
+            QMessageBox.warning(self, "Отмена операции", message)
+
+    def _simulate_rules(self):
+        if self.organizer is None:
+            return
+        profile = self.organizer.simulate_desktop()
+        if profile is None:
+            QMessageBox.warning(self, "Пробный прогон", "Рабочий стол не найден.")
+            return
+
+        self.simulation_table.setRowCount(0)
+        for stats in profile.rules:
+            if not stats.active:
+                note = "Выключено или не может сработать"
+            elif stats.never_fires:
+                note = "Не срабатывает"
+            elif stats.shadowed_by:
+                # Правило, которое чаще всего забирает подходящие файлы
+                winner = max(stats.shadowed_by, key=stats.shadowed_by.get)
+                prefix = "Полностью перекрыто" if stats.shadowed else "Частично перекрыто"
+                note = f"{prefix} правилом '{profile.rules[winner].name}' ({stats.shadowed_by[winner]})"
+            else:
+                note = ""
+            row = self.simulation_table.rowCount()
+            self.simulation_table.insertRow(row)
+            values = [stats.name, str(stats.matched), str(stats.would_match), f"{stats.seconds * 1000:.2f}", note]
+            for column, value in enumerate(values):
+                self.simulation_table.setItem(row, column, QTableWidgetItem(value))
+
+        conditions = ", ".join(
+            f"{CONDITION_DISPLAY.get(cond_type, cond_type)}: {calls} пров., {seconds * 1000:.2f} мс"
+            for cond_type, (calls, seconds) in sorted(profile.conditions.items(), key=lambda item: -item[1][1]))
+        summary = (f"Файлов: {profile.files}, без правила: {profile.unmatched}, "
+                   f"время: {profile.seconds * 1000:.1f} мс. Ничего не перемещено.")
+        if conditions:
+            summary += f"\nПо типам условий: {conditions}."
+        self.simulation_summary_label.setText(summary)
+        self.simulation_summary_label.setVisible(True)
+        self.simulation_table.setVisible(True)
 
     def populate_snapshots_table(self):
         self.snapshots_table.setRowCount(0)
@@ -571,6 +815,12 @@ class MainWindow(QMainWindow):
         self.hotkey_manager.start()
 
     def closeEvent(self, event):
+        # Организация останавливается после текущих операций (они короткие, а план должен дописаться
+        # в журнал); невыполненные операции остаются в плане
+        if self._organization_thread is not None:
+            self._organization_job.cancel()
+            self._organization_thread.quit()
+            self._organization_thread.wait()
         save_config(self.config)
         self.logger.info("Конфигурация сохранена. Приложение закрывается.")
         super().closeEvent(event)
\ No newline at end of file
@@ -1,12 +1,37 @@
 # Файл: ui/rules_dialog.py
 import os
 from PyQt5.QtWidgets import (QDialog, QVBoxLayout, QFormLayout, QLineEdit,
-                             QCheckBox, QDialogButtonBox, QListWidget,
+                             QCheckBox, QDialogButtonBox, QTreeWidget,
                              QHBoxLayout, QPushButton, QComboBox, QFileDialog,
-                             QInputDialog, QMessageBox, QListWidgetItem, QWidget)
+                             QInputDialog, QMessageBox, QTreeWidgetItem, QWidget)
 from PyQt5.QtGui import QIcon
 from PyQt5.QtCore import Qt
 
+from core.rule_engine import CONDITION_COMPILERS, GROUP_TYPES, RuleCompileError
+
+# Типы условий: подпись в списке выбора -> (тип в конфигурации, подсказка для значения)
+CONDITION_TYPES = {
+    "Имя содержит": ("name_contains", "Введите часть имени файла:"),
+    "Расширение файла": ("extension_is", "Введите расширение (например, .pdf):"),
+    "Имя по шаблону": ("name_matches", "Введите шаблон имени (например, отчет*.docx):"),
+    "Имя по регулярному выражению": ("name_regex", "Введите регулярное выражение:"),
+    "Размер больше": ("size_greater_than", "Введите размер (например, 10 МБ):"),
+    "Размер меньше": ("size_less_than", "Введите размер (например, 500 КБ):"),
+    "Старше (дней)": ("older_than", "Введите число дней:"),
+    "Новее (дней)": ("newer_than", "Введите число дней:"),
+    "Тип по содержимому": ("content_type_is", "Введите тип (например, pdf, zip, ooxml, png, jpeg, exe, mp4):"),
+}
+CONDITION_DISPLAY = {
+    "name_contains": "Имя содержит", "extension_is": "Расширение", "name_matches": "Имя по шаблону",
+    "name_regex": "Имя по выражению", "size_greater_than": "Размер больше", "size_less_than": "Размер меньше",
+    "older_than": "Старше, дней", "newer_than": "Новее, дней", "content_type_is": "Тип содержимого",
+}
+# Группы условий: подпись -> тип в конфигурации
+GROUP_KINDS = {"Все условия (И)": "all", "Любое из условий (ИЛИ)": "any", "Не выполняются (НЕ)": "not"}
+GROUP_DISPLAY = {type_id: label for label, type_id in GROUP_KINDS.items()}
+# Какое время файла сравнивается в условиях возраста
+TIME_FIELD_NAMES = {"Изменения": "mtime", "Создания (изменения метаданных)": "ctime", "Последнего доступа": "atime"}
+
 
 class RulesDialog(QDialog):
     def __init__(self, config, rule=None, parent=None):
@@ -33,12 +58,17 @@ class RulesDialog(QDialog):
         self.form_layout.addRow(self.enabled_check)
 
         conditions_layout = QVBoxLayout()
-        self.conditions_list = QListWidget()
-        conditions_layout.addWidget(self.conditions_list)
+        # Условия верхнего уровня объединяются по «И»; вложенные группы задают «ИЛИ» и «НЕ».
+        # Новое условие добавляется в выбранную группу (или в группу выбранного условия)
+        self.conditions_tree = QTreeWidget()
+        self.conditions_tree.setHeaderHidden(True)
+        conditions_layout.addWidget(self.conditions_tree)
         cond_btn_layout = QHBoxLayout()
         add_cond_btn = QPushButton(QIcon(":/icons/add.png"), "Добавить условие")
+        add_group_btn = QPushButton(QIcon(":/icons/add.png"), "Добавить группу")
         del_cond_btn = QPushButton(QIcon(":/icons/delete.png"), "Удалить условие")
         cond_btn_layout.addWidget(add_cond_btn)
+        cond_btn_layout.addWidget(add_group_btn)
         cond_btn_layout.addWidget(del_cond_btn)
         conditions_layout.addLayout(cond_btn_layout)
         self.form_layout.addRow("Условия (должны выполняться все):", conditions_layout)
@@ -68,6 +98,7 @@ class RulesDialog(QDialog):
         self.button_box.accepted.connect(self.accept)
         self.button_box.rejected.connect(self.reject)
         add_cond_btn.clicked.connect(self._add_condition)
+        add_group_btn.clicked.connect(self._add_group)
         del_cond_btn.clicked.connect(self._delete_condition)
         self.action_type_combo.currentIndexChanged.connect(self._on_action_type_changed)
         browse_btn.clicked.connect(self._browse_folder)
@@ -85,6 +116,7 @@ class RulesDialog(QDialog):
 
         for cond in self.rule_data.get("conditions", []):
             self._add_condition_item(cond)
+        self.conditions_tree.expandAll()
 
         action = self.rule_data.get("action", {})
         if action.get("type") == "assign_to_box":
@@ -110,27 +142,90 @@ class RulesDialog(QDialog):
 
     def _add_condition(self):
         cond_type, ok = QInputDialog.getItem(self, "Добавить условие", "Выберите тип условия:",
-                                             ["Имя содержит", "Расширение файла"], 0, False)
+                                             list(CONDITION_TYPES), 0, False)
         if not ok: return
+        type_id, prompt = CONDITION_TYPES[cond_type]
 
-        text, ok = QInputDialog.getText(self, "Значение", "Введите значение для условия:")
+        text, ok = QInputDialog.getText(self, "Значение", prompt)
         if not ok or not text: return
 
-        condition_map = {"Имя содержит": "name_contains", "Расширение файла": "extension_is"}
-        condition = {"type": condition_map[cond_type], "value": text}
-        self._add_condition_item(condition)
+        condition = {"type": type_id, "value": text}
+        if type_id in ("older_than", "newer_than"):
+            field, ok = QInputDialog.getItem(self, "Время файла", "Сравнивать время:",
+                                             list(TIME_FIELD_NAMES), 0, False)
+            if not ok: return
+            condition["field"] = TIME_FIELD_NAMES[field]
+
+        # Значение проверяется сразу, чтобы правило с ошибкой не отключилось молча при компиляции
+        if type_id in CONDITION_COMPILERS:
+            try:
+                CONDITION_COMPILERS[type_id](condition)
+            except RuleCompileError as e:
+                QMessageBox.warning(self, "Ошибка", f"Неверное значение условия: {e}")
+                return
+        self._add_condition_item(condition, self._target_group())
+
+    def _add_group(self):
+        kind, ok = QInputDialog.getItem(self, "Добавить группу", "Как объединять условия группы:",
+                                        list(GROUP_KINDS), 1, False)
+        if not ok: return
+        item = self._add_condition_item({"type": GROUP_KINDS[kind], "conditions": []}, self._target_group())
+        self.conditions_tree.setCurrentItem(item)
 
-    def _add_condition_item(self, condition):
-        display_map = {"name_contains": "Имя содержит", "extension_is": "Расширение"}
-        display_text = f"{display_map.get(condition['type'], '???')} '{condition['value']}'"
-        item = QListWidgetItem(display_text)
-        item.setData(Qt.UserRole, condition)
-        self.conditions_list.addItem(item)
+    def _target_group(self):
+        """Группа, в которую добавляется новое условие; None — верхний уровень."""
+        item = self.conditions_tree.currentItem()
+        if item is None:
+            return None
+        if item.data(0, Qt.UserRole).get("type") in GROUP_TYPES:
+            return item
+        return item.parent()
+
+    def _add_condition_item(self, condition, parent=None):
+        is_group = condition.get("type") in GROUP_TYPES
+        if is_group:
+            # Дочерние условия группы хранятся в дереве, в данных элемента — только тип
+            display_text = GROUP_DISPLAY[condition["type"]]
+            data = {"type": condition["type"]}
+        else:
+            display_text = f"{CONDITION_DISPLAY.get(condition['type'], '???')} '{condition.get('value')}'"
+            if condition.get("field", "mtime") != "mtime":
+                display_text += f" ({condition['field']})"
+            data = condition
+        item = QTreeWidgetItem([display_text])
+        item.setData(0, Qt.UserRole, data)
+        if parent is None:
+            self.conditions_tree.addTopLevelItem(item)
+        else:
+            parent.addChild(item)
+            parent.setExpanded(True)
+        if is_group:
+            for child in condition.get("conditions", []):
+                self._add_condition_item(child, item)
+        return item
 
     def _delete_condition(self):
-        selected_item = self.conditions_list.currentItem()
-        if selected_item:
-            self.conditions_list.takeItem(self.conditions_list.row(selected_item))
+        selected_item = self.conditions_tree.currentItem()
+        if selected_item is None:
+            return
+        parent = selected_item.parent()
+        if parent is None:
+            self.conditions_tree.takeTopLevelItem(self.conditions_tree.indexOfTopLevelItem(selected_item))
+        else:
+            parent.removeChild(selected_item)
+
+    def _item_condition(self, item):
+        data = item.data(0, Qt.UserRole)
+        if data.get("type") not in GROUP_TYPES:
+            return data
+        return {"type": data["type"],
+                "conditions": [self._item_condition(item.child(i)) for i in range(item.childCount())]}
+
+    @classmethod
+    def _has_empty_group(cls, conditions):
+        return any(cond.get("type") in GROUP_TYPES and
+                   (not cond["conditions"] or cls._has_empty_group(cond["conditions"]))
+                   for cond in conditions)
 
     def _browse_folder(self):
         folder = QFileDialog.getExistingDirectory(self, "Выберите папку", os.path.expanduser("~"))
@@ -142,14 +237,15 @@ class RulesDialog(QDialog):
             QMessageBox.warning(self, "Ошибка", "Название правила не может быть пустым.")
             return None
 
-        conditions = []
-        for i in range(self.conditions_list.count()):
-            item = self.conditions_list.item(i)
-            conditions.append(item.data(Qt.UserRole))
+        conditions = [self._item_condition(self.conditions_tree.topLevelItem(i))
+                      for i in range(self.conditions_tree.topLevelItemCount())]
 
         if not conditions:
             QMessageBox.warning(self, "Ошибка", "Нужно добавить хотя бы одно условие.")
             return None
+        if self._has_empty_group(conditions):
+            QMessageBox.warning(self, "Ошибка", "В группе условий нет ни одного условия.")
+            return None
 
         action = {}
         if self.action_type_combo.currentIndex() == 0: